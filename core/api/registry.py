@@ -0,0 +1,271 @@
+"""
+Registry of per-workspace indexing engines and orchestrators.
+
+Developers keep several repositories open at once; switching between them
+should not rebuild the engines. The registry keeps one ``IndexingEngine`` and
+one ``AgentOrchestrator`` per workspace, evicts the least recently used idle
+workspaces beyond ``max_workspaces`` (or idle longer than ``idle_seconds``),
+and gives every engine the same ``EmbeddingBackend`` so the embedding batching
+queue and cache are shared across workspaces.
+
+Engines are imported on first use to keep server startup fast.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from core.indexer import IndexingEngine
+    from core.indexer.embeddings import EmbeddingBackend
+    from core.indexer.rerank import RerankStage
+    from core.orchestrator import AgentOrchestrator
+
+
+@dataclass
+class WorkspaceEngines:
+    """Engines of one workspace and their usage bookkeeping."""
+    workspace_path: str
+    indexer: Optional["IndexingEngine"] = None
+    orchestrator: Optional["AgentOrchestrator"] = None
+    last_used: float = field(default_factory=time.monotonic)
+    active: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class EngineRegistry:
+    """
+    LRU registry of workspace engines.
+
+    Args:
+        max_workspaces: Number of workspaces kept loaded
+        idle_seconds: Evict workspaces unused for this long (None keeps them)
+        embedder: Embedding backend shared by all indexers (process default if None)
+        reranker: Rerank stage shared by all indexers (no reranking if None)
+        search_backend: "auto", "flat" or "lancedb" (see IndexingEngine)
+    """
+
+    def __init__(
+        self,
+        max_workspaces: int = 4,
+        idle_seconds: Optional[float] = None,
+        embedder: Optional["EmbeddingBackend"] = None,
+        reranker: Optional["RerankStage"] = None,
+        search_backend: str = "auto",
+    ):
+        self.max_workspaces = max(1, max_workspaces)
+        self.idle_seconds = idle_seconds
+        self._embedder = embedder
+        self.reranker = reranker
+        self.search_backend = search_backend
+        self._entries: "OrderedDict[str, WorkspaceEngines]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._maintenance = None
+
+    @staticmethod
+    def _key(workspace_path) -> str:
+        return str(Path(workspace_path).resolve())
+
+    @property
+    def embedder(self) -> "EmbeddingBackend":
+        if self._embedder is None:
+            from core.indexer.embeddings import get_embedding_backend
+            self._embedder = get_embedding_backend()
+        return self._embedder
+
+    def _entry(self, workspace_path, lease: bool = False) -> WorkspaceEngines:
+        # ``lease`` marks the entry active under the same lock as the eviction
+        # check, so no concurrent caller can evict it first
+        key = self._key(workspace_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = WorkspaceEngines(workspace_path=str(workspace_path))
+            self._entries.move_to_end(key)
+            entry.last_used = time.monotonic()
+            if lease:
+                entry.active += 1
+            evicted = self._collect_evictions(keep=key)
+        for old in evicted:
+            self._close(old)
+        return entry
+
+    def _collect_evictions(self, keep: str) -> List[WorkspaceEngines]:
+        # Caller holds self._lock
+        now = time.monotonic()
+        evicted = []
+        for key, entry in list(self._entries.items()):
+            if key == keep or entry.active:
+                continue
+            expired = self.idle_seconds is not None and now - entry.last_used > self.idle_seconds
+            if expired or len(self._entries) > self.max_workspaces:
+                evicted.append(self._entries.pop(key))
+        return evicted
+
+    @staticmethod
+    def _close(entry: WorkspaceEngines):
+        if entry.indexer is not None and entry.indexer.migration is not None:
+            # Resumed when the workspace is loaded again
+            entry.indexer.migration.stop(wait=False)
+        if entry.orchestrator is not None:
+            try:
+                entry.orchestrator.close()
+            except Exception as e:
+                print(f"Warning: Could not clean up orchestrator for {entry.workspace_path}: {e}")
+
+    def get(self, workspace_path) -> Optional[WorkspaceEngines]:
+        """Return the loaded engines of a workspace without creating them."""
+        with self._lock:
+            return self._entries.get(self._key(workspace_path))
+
+    def most_recent(self) -> Optional[WorkspaceEngines]:
+        """The most recently used workspace, if any."""
+        with self._lock:
+            return next(reversed(self._entries.values()), None)
+
+    def indexer(self, workspace_path, embedding_model: Optional[str] = None) -> "IndexingEngine":
+        """
+        Return the indexer of a workspace, creating it on first use.
+
+        A different ``embedding_model`` than the index's starts a background
+        migration to it (see IndexingEngine.migrate_embedding_model); searches
+        keep using the current model until it completes. An interrupted
+        migration is resumed when the indexer is created.
+        """
+        from core.indexer import IndexingEngine
+
+        entry = self._entry(workspace_path)
+        with entry.lock:
+            indexer = entry.indexer
+            if indexer is None:
+                workspace = Path(workspace_path)
+                indexer = IndexingEngine(
+                    workspace_path=str(workspace),
+                    vector_db_path=str(workspace / ".opencode" / "index"),
+                    embedding_model=embedding_model,
+                    embedder=self.embedder,
+                    reranker=self.reranker,
+                    search_backend=self.search_backend
+                )
+                entry.indexer = indexer
+                if entry.orchestrator is not None:
+                    entry.orchestrator.attach_indexer(indexer)
+                embedding_model = embedding_model or indexer.pending_model
+            if embedding_model and embedding_model != indexer.embedding_model:
+                indexer.migrate_embedding_model(embedding_model)
+            return indexer
+
+    def orchestrator(self, workspace_path, model_config: Dict) -> "AgentOrchestrator":
+        """Return the orchestrator of a workspace, creating it on first use."""
+        from core.orchestrator import AgentOrchestrator
+
+        entry = self._entry(workspace_path)
+        with entry.lock:
+            if entry.orchestrator is None:
+                entry.orchestrator = AgentOrchestrator(
+                    workspace_path=str(workspace_path),
+                    model_config=model_config,
+                    indexer=entry.indexer
+                )
+            return entry.orchestrator
+
+    @contextmanager
+    def lease(self, workspace_path):
+        """Keep a workspace from being evicted while a request uses it."""
+        entry = self._entry(workspace_path, lease=True)
+        try:
+            yield entry
+        finally:
+            with self._lock:
+                entry.active -= 1
+                entry.last_used = time.monotonic()
+
+    @contextmanager
+    def lease_all(self, workspace_paths):
+        """
+        Keep several workspaces loaded while one request uses them all.
+
+        The workspaces are leased together, before any eviction, so a request
+        spanning more workspaces than ``max_workspaces`` (a federated search)
+        does not evict its own engines while resolving them. The surplus stays
+        loaded until a later request for another workspace evicts it.
+        """
+        keys = list(dict.fromkeys(self._key(path) for path in workspace_paths))
+        paths = {self._key(path): path for path in workspace_paths}
+        with self._lock:
+            entries = []
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._entries[key] = WorkspaceEngines(workspace_path=str(paths[key]))
+                self._entries.move_to_end(key)
+                entry.active += 1
+                entries.append(entry)
+            evicted = self._collect_evictions(keep=None)
+        for old in evicted:
+            self._close(old)
+        try:
+            yield entries
+        finally:
+            with self._lock:
+                now = time.monotonic()
+                for entry in entries:
+                    entry.active -= 1
+                    entry.last_used = now
+
+    def evict(self, workspace_path) -> bool:
+        """Drop the engines of a workspace; returns False if it was not loaded."""
+        with self._lock:
+            entry = self._entries.pop(self._key(workspace_path), None)
+        if entry is None:
+            return False
+        self._close(entry)
+        return True
+
+    def close(self):
+        """Drop every workspace."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def maintain(self) -> List[str]:
+        """Run due index maintenance on every loaded indexer; returns the optimized workspaces."""
+        with self._lock:
+            indexers = [entry.indexer for entry in self._entries.values() if entry.indexer is not None]
+        return [str(indexer.workspace_path) for indexer in indexers if indexer.maybe_optimize()]
+
+    def start_maintenance(self, interval_seconds: float = 300.0):
+        """Check the loaded indexes for due maintenance every ``interval_seconds``."""
+        if self._maintenance is not None:
+            return
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval_seconds):
+                try:
+                    self.maintain()
+                except Exception as e:
+                    print(f"Warning: Index maintenance failed: {e}")
+
+        self._maintenance = (threading.Thread(target=run, name="opencode-maintenance", daemon=True), stop)
+        self._maintenance[0].start()
+
+    def status(self) -> List[Dict]:
+        """Loaded workspaces, most recently used last."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "workspace": entry.workspace_path,
+                    "indexer": entry.indexer is not None,
+                    "orchestrator": entry.orchestrator is not None,
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "active_requests": entry.active,
+                }
+                for entry in self._entries.values()
+            ]
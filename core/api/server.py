@@ -1,16 +1,26 @@
 """
 FastAPI backend server for OpenCode.
 Provides REST API for indexing, search, and agent orchestration.
+
+The indexer and orchestrator (and with them tree-sitter, LanceDB, PyArrow,
+NumPy and the LLM clients) are imported lazily, so the server answers its
+health check immediately; they are pre-loaded in the background after startup.
 """
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 import os
 from pathlib import Path
 
-from core.indexer import IndexingEngine
-from core.orchestrator import AgentOrchestrator, TaskPlan, TaskStatus
+from core.api.registry import EngineRegistry
+from core.api.warmup import start_warmup, warmup_state
+from core.indexer.filters import SearchFilters
+from core.indexer.rerank import create_rerank_stage
+from core.scheduling import SchedulerOverloaded, get_scheduler
+from core.telemetry import REGISTRY, configure_opentelemetry
 
 
 app = FastAPI(title="OpenCode API", version="0.1.0")
@@ -24,9 +34,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global instances (initialized on startup)
-indexer: Optional[IndexingEngine] = None
-orchestrator: Optional[AgentOrchestrator] = None
+# Per-workspace engines, sharing one embedding backend and reranker
+_idle_seconds = os.getenv("OPENCODE_WORKSPACE_IDLE_SECONDS")
+engines = EngineRegistry(
+    max_workspaces=int(os.getenv("OPENCODE_MAX_WORKSPACES", "4")),
+    idle_seconds=float(_idle_seconds) if _idle_seconds else None,
+    search_backend=os.getenv("OPENCODE_SEARCH_BACKEND", "auto"),
+    reranker=create_rerank_stage({
+        "rerank": os.getenv("OPENCODE_RERANK", "off"),
+        "rerank_model": os.getenv("OPENCODE_RERANK_MODEL"),
+        "rerank_budget_ms": os.getenv("OPENCODE_RERANK_BUDGET_MS", "300"),
+        "planning_model": os.getenv("OPENCODE_PLANNING_MODEL", "llama3.1:8b"),
+        "llm_provider": os.getenv("OPENCODE_LLM_PROVIDER", "ollama"),
+        "llm_host": os.getenv("OPENCODE_LLM_HOST"),
+    }),
+)
 
 
 # Request/Response models
@@ -36,15 +58,57 @@ class IndexRequest(BaseModel):
     embedding_model: Optional[str] = None
 
 
-class SearchRequest(BaseModel):
+class SearchFilterFields(BaseModel):
+    # Metadata pre-filters shared by the search endpoints
+    language: Optional[Union[str, List[str]]] = None
+    node_type: Optional[Union[str, List[str]]] = None
+    path_prefix: Optional[str] = None  # Workspace-relative, e.g. "src/payments"
+    path_glob: Optional[str] = None  # Workspace-relative, e.g. "src/**/*.ts"
+    modified_since: Optional[float] = None  # Unix timestamp
+    
+    def filters(self) -> Optional[SearchFilters]:
+        filters = SearchFilters(
+            language=self.language,
+            node_type=self.node_type,
+            path_prefix=self.path_prefix,
+            path_glob=self.path_glob,
+            modified_since=self.modified_since,
+        )
+        return None if filters.is_empty() else filters
+
+
+class SearchRequest(SearchFilterFields):
+    query: str
+    top_k: int = 10
+    workspace_path: Optional[str] = None  # Most recently used workspace if omitted
+    hierarchical: Optional[bool] = None  # Narrow to the best files first; auto if omitted
+
+
+class BatchSearchRequest(SearchFilterFields):
+    queries: List[str]
+    top_k: int = 10
+    workspace_path: Optional[str] = None  # Most recently used workspace if omitted
+    hierarchical: Optional[bool] = None  # Narrow to the best files first; auto if omitted
+
+
+class FederatedSearchRequest(SearchFilterFields):
     query: str
     top_k: int = 10
+    workspace_paths: Optional[List[str]] = None  # All loaded workspaces if omitted
+    normalize: Optional[str] = None  # "distance" or "minmax"
+    shared: bool = False  # Search the shared multi-repo table instead
+    embedding_model: Optional[str] = None  # Query model for the shared table
+
+
+class SharedIndexRequest(BaseModel):
+    workspace_paths: List[str]
 
 
 class AgentRequest(BaseModel):
     goal: str
     workspace_path: str
     max_iterations: int = 5
+    candidates: Optional[int] = None
 
 
 class AgentResponse(BaseModel):
@@ -52,13 +116,20 @@ class AgentResponse(BaseModel):
     message: str
     iterations: Optional[int] = None
     plan: Optional[Dict] = None
+    diff: Optional[str] = None
+    promoted_files: Optional[List[str]] = None
+    conflicts: Optional[List[str]] = None
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize global services."""
-    global indexer, orchestrator
-    # These will be initialized per-request with workspace paths
+    # Engines are created per workspace on first use
+    if os.getenv("OPENCODE_OTEL_EXPORT", "").lower() in ("1", "true", "on"):
+        configure_opentelemetry()
+    if os.getenv("OPENCODE_WARMUP", "1").lower() not in ("0", "false", "off"):
+        start_warmup()
+    engines.start_maintenance(float(os.getenv("OPENCODE_MAINTENANCE_INTERVAL_SECONDS", "300")))
     print("OpenCode API server started")
 
 
@@ -68,50 +139,170 @@ async def root():
     return {"status": "ok", "service": "OpenCode API"}
 
 
+def _index_workspace(workspace_path: Path, indexer, use_ollama: bool):
+    # Keep the workspace loaded while it is being indexed
+    with engines.lease(workspace_path):
+        indexer.index(use_ollama=use_ollama)
+
+
 @app.post("/api/index")
 async def index_codebase(request: IndexRequest, background_tasks: BackgroundTasks):
     """
     Index a codebase using Tree-sitter and vector embeddings.
     """
-    global indexer
-    
     try:
         workspace_path = Path(request.workspace_path)
         if not workspace_path.exists():
             raise HTTPException(status_code=400, detail="Workspace path does not exist")
         
-        vector_db_path = workspace_path / ".opencode" / "index"
+        if get_scheduler().overloaded("bulk"):
+            raise HTTPException(status_code=503, detail="Too much indexing queued, retry later")
         
-        indexer = IndexingEngine(
-            workspace_path=str(workspace_path),
-            vector_db_path=str(vector_db_path),
-            embedding_model=request.embedding_model
-        )
+        indexer = await run_in_threadpool(engines.indexer, workspace_path, request.embedding_model)
         
         # Run indexing in background
-        background_tasks.add_task(indexer.index, use_ollama=request.use_ollama)
+        background_tasks.add_task(_index_workspace, workspace_path, indexer, request.use_ollama)
         
         return {
             "status": "started",
             "message": "Indexing started in background",
             "workspace": str(workspace_path)
         }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class ExportIndexRequest(BaseModel):
+    workspace_path: Optional[str] = None  # Most recently used workspace if omitted
+    artifact_path: Optional[str] = None  # .opencode/artifacts/index-<commit>.tar if omitted
+    commit: Optional[str] = None  # HEAD if omitted
+
+
+class ImportIndexRequest(BaseModel):
+    workspace_path: str
+    artifact_path: str
+    use_ollama: bool = True
+    embedding_model: Optional[str] = None
+
+
+@app.post("/api/index/export")
+async def export_index_artifact(request: ExportIndexRequest):
+    """
+    Export a workspace index as a portable artifact tied to a git commit.
+    """
+    workspace_path = _search_workspace(request.workspace_path)
+    
+    def export():
+        indexer = engines.indexer(workspace_path)
+        path = request.artifact_path
+        if not path:
+            from core.indexer.artifacts import git_commit
+            commit = request.commit or git_commit(Path(workspace_path)) or "workspace"
+            path = str(Path(workspace_path) / ".opencode" / "artifacts" / f"index-{commit[:12]}.tar")
+        manifest = indexer.export_artifact(path, commit=request.commit)
+        summary = {key: value for key, value in manifest.items() if key != "files"}
+        summary.update(artifact_path=path, files=len(manifest["files"]))
+        return summary
+    
+    try:
+        with engines.lease(workspace_path):
+            return await run_in_threadpool(export)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/index/import")
+async def import_index_artifact(request: ImportIndexRequest):
+    """
+    Load a prebuilt index artifact, then index only the files that differ
+    from the artifact's commit.
+    """
+    workspace_path = _search_workspace(request.workspace_path)
+    if not Path(request.artifact_path).is_file():
+        raise HTTPException(status_code=400, detail="Artifact path does not exist")
+    try:
+        with engines.lease(workspace_path):
+            indexer = await run_in_threadpool(engines.indexer, workspace_path, request.embedding_model)
+            result = await run_in_threadpool(indexer.import_artifact, request.artifact_path, request.use_ollama)
+        return {"status": "ok", **result}
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class MaintenanceRequest(BaseModel):
+    workspace_path: Optional[str] = None  # Most recently used workspace if omitted
+    cleanup_older_than_seconds: Optional[float] = None
+
+
+@app.get("/api/index/stats")
+async def index_statistics(workspace_path: Optional[str] = None):
+    """
+    Fragment count, versions and scalar index coverage of a workspace index.
+    """
+    workspace_path = _search_workspace(workspace_path)
+    try:
+        indexer = await run_in_threadpool(engines.indexer, workspace_path)
+        return await run_in_threadpool(indexer.index_stats)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/index/optimize")
+async def optimize_index(request: MaintenanceRequest):
+    """
+    Compact a workspace index and clean up old versions now.
+    """
+    from datetime import timedelta
+    
+    workspace_path = _search_workspace(request.workspace_path)
+    cleanup = request.cleanup_older_than_seconds
+    try:
+        with engines.lease(workspace_path):
+            indexer = await run_in_threadpool(engines.indexer, workspace_path)
+            return await run_in_threadpool(
+                indexer.optimize, timedelta(seconds=cleanup) if cleanup is not None else None
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _search_workspace(workspace_path: Optional[str]) -> str:
+    # Explicit workspace, or the most recently used one
+    if not workspace_path:
+        entry = engines.most_recent()
+        if entry is None:
+            raise HTTPException(status_code=400, detail="Indexer not initialized. Run /api/index first.")
+        return entry.workspace_path
+    if not Path(workspace_path).exists():
+        raise HTTPException(status_code=400, detail="Workspace path does not exist")
+    return workspace_path
+
+
 @app.post("/api/search")
 async def search_codebase(request: SearchRequest):
     """
     Search the indexed codebase for similar code chunks.
     """
-    global indexer
-    
-    if indexer is None:
-        raise HTTPException(status_code=400, detail="Indexer not initialized. Run /api/index first.")
-    
+    workspace_path = _search_workspace(request.workspace_path)
     try:
-        results = indexer.search(request.query, top_k=request.top_k)
+        # Searches run in the thread pool so different workspaces are served concurrently
+        with engines.lease(workspace_path):
+            indexer = await run_in_threadpool(engines.indexer, workspace_path)
+            results = await run_in_threadpool(
+                indexer.search, request.query, request.top_k, request.filters(), hierarchical=request.hierarchical
+            )
         return {
             "query": request.query,
             "results": results,
@@ -121,43 +312,142 @@ async def search_codebase(request: SearchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/search/batch")
+async def batch_search_codebase(request: BatchSearchRequest):
+    """
+    Search the indexed codebase for several queries in one round-trip.
+    
+    The queries are embedded in one batched call and searched together;
+    results are grouped per query, in request order.
+    """
+    workspace_path = _search_workspace(request.workspace_path)
+    try:
+        with engines.lease(workspace_path):
+            indexer = await run_in_threadpool(engines.indexer, workspace_path)
+            grouped = await run_in_threadpool(
+                indexer.search_many, request.queries, request.top_k, request.filters(),
+                hierarchical=request.hierarchical
+            )
+        return {
+            "results": [
+                {"query": query, "results": results, "count": len(results)}
+                for query, results in zip(request.queries, grouped)
+            ],
+            "count": len(grouped)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _shared_index():
+    from core.indexer.federated import SharedIndex
+    default = Path.home() / ".opencode" / "shared_index"
+    return SharedIndex(os.getenv("OPENCODE_SHARED_INDEX", str(default)))
+
+
+@app.post("/api/search/federated")
+async def federated_search_codebases(request: FederatedSearchRequest):
+    """
+    Search many workspace indexes with one query and merge the results.
+    
+    Each result is tagged with the workspace ("repo") it came from.
+    """
+    workspace_paths = request.workspace_paths
+    if workspace_paths is None:
+        workspace_paths = [w["workspace"] for w in engines.status() if w["indexer"]]
+    
+    try:
+        if request.shared:
+            model = request.embedding_model or "nomic-embed-text"
+            vector = (await run_in_threadpool(engines.embedder.embed, [request.query], model))[0]
+            shared = _shared_index()
+            results = await run_in_threadpool(
+                shared.search, vector, request.top_k, request.workspace_paths, request.filters(), model
+            )
+            return {"query": request.query, "results": results, "count": len(results), "errors": {}}
+        
+        if not workspace_paths:
+            raise HTTPException(status_code=400, detail="No workspaces given or indexed. Run /api/index first.")
+        missing = [path for path in workspace_paths if not Path(path).exists()]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Workspace path does not exist: {missing[0]}")
+        
+        from core.indexer.federated import federated_search
+        
+        def search():
+            # Leased together so that more workspaces than max_workspaces
+            # do not evict each other's engines on every query
+            with engines.lease_all(workspace_paths):
+                indexers = {path: engines.indexer(path) for path in workspace_paths}
+                return federated_search(
+                    indexers, request.query, top_k=request.top_k,
+                    normalize=request.normalize, filters=request.filters()
+                )
+        
+        result = await run_in_threadpool(search)
+        return {
+            "query": request.query,
+            "results": result["results"],
+            "count": len(result["results"]),
+            "errors": result["errors"],
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/index/shared")
+async def sync_shared_index(request: SharedIndexRequest):
+    """
+    Copy workspace indexes into the shared multi-repo table, one partition per workspace.
+    """
+    def sync():
+        shared = _shared_index()
+        with engines.lease_all(request.workspace_paths):
+            return {path: shared.sync(path, engines.indexer(path)) for path in request.workspace_paths}
+    
+    try:
+        rows = await run_in_threadpool(sync)
+        return {"status": "ok", "rows": rows}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/agent/execute", response_model=AgentResponse)
 async def execute_agent_task(request: AgentRequest):
     """
     Execute an agent task with plan-execute-verify loop.
     """
-    global indexer, orchestrator
-    
     try:
         workspace_path = Path(request.workspace_path)
         if not workspace_path.exists():
             raise HTTPException(status_code=400, detail="Workspace path does not exist")
         
-        # Initialize orchestrator if needed
-        if orchestrator is None or str(orchestrator.workspace_path) != str(workspace_path):
-            model_config = {
-                "planning_model": os.getenv("OPENCODE_PLANNING_MODEL", "llama3.1:8b"),
-                "editing_model": os.getenv("OPENCODE_EDITING_MODEL", "llama3.1:8b"),
-                "verification_model": os.getenv("OPENCODE_VERIFICATION_MODEL", "llama3.1:8b"),
-                "use_shadow_branch": True,
-            }
-            
-            # Try to reuse existing indexer if workspace matches
-            if indexer and str(indexer.workspace_path) == str(workspace_path):
-                orchestrator = AgentOrchestrator(
-                    workspace_path=str(workspace_path),
-                    model_config=model_config,
-                    indexer=indexer
-                )
-            else:
-                orchestrator = AgentOrchestrator(
-                    workspace_path=str(workspace_path),
-                    model_config=model_config,
-                    indexer=None
-                )
+        model_config = {
+            "planning_model": os.getenv("OPENCODE_PLANNING_MODEL", "llama3.1:8b"),
+            "editing_model": os.getenv("OPENCODE_EDITING_MODEL", "llama3.1:8b"),
+            "verification_model": os.getenv("OPENCODE_VERIFICATION_MODEL", "llama3.1:8b"),
+            "llm_provider": os.getenv("OPENCODE_LLM_PROVIDER", "ollama"),
+            "llm_host": os.getenv("OPENCODE_LLM_HOST"),
+            "llm_keep_alive": os.getenv("OPENCODE_LLM_KEEP_ALIVE", "30m"),
+            "use_shadow_branch": True,
+            "speculative_candidates": int(os.getenv("OPENCODE_SPECULATIVE_CANDIDATES", "1")),
+        }
         
-        # Execute the task
-        result = orchestrator.run_loop(request.goal, max_iterations=request.max_iterations)
+        # Execute the task (reusing the workspace's orchestrator and indexer)
+        with engines.lease(workspace_path):
+            orchestrator = await run_in_threadpool(engines.orchestrator, workspace_path, model_config)
+            result = await run_in_threadpool(
+                orchestrator.run_loop,
+                request.goal,
+                max_iterations=request.max_iterations,
+                candidates=request.candidates
+            )
         
         # Serialize plan properly
         plan_dict = None
@@ -173,6 +463,7 @@ async def execute_agent_task(request: AgentRequest):
                         "start_line": step.start_line,
                         "end_line": step.end_line,
                         "replacement": step.replacement,
+                        "search": step.search,
                         "metadata": step.metadata or {},
                     }
                     for step in plan.steps
@@ -185,20 +476,36 @@ async def execute_agent_task(request: AgentRequest):
             status=result["status"],
             message=result["message"],
             iterations=result.get("iterations"),
-            plan=plan_dict
+            plan=plan_dict,
+            diff=result.get("diff"),
+            promoted_files=result.get("promoted_files"),
+            conflicts=result.get("conflicts")
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for indexing, search and agent runs."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/status")
 async def get_status():
     """Get current status of services."""
+    workspaces = engines.status()
+    indexed = [w["workspace"] for w in workspaces if w["indexer"]]
+    orchestrated = [w["workspace"] for w in workspaces if w["orchestrator"]]
     return {
-        "indexer_initialized": indexer is not None,
-        "orchestrator_initialized": orchestrator is not None,
-        "indexer_workspace": str(indexer.workspace_path) if indexer else None,
-        "orchestrator_workspace": str(orchestrator.workspace_path) if orchestrator else None,
+        "indexer_initialized": bool(indexed),
+        "orchestrator_initialized": bool(orchestrated),
+        "indexer_workspace": indexed[-1] if indexed else None,
+        "orchestrator_workspace": orchestrated[-1] if orchestrated else None,
+        "workspaces": workspaces,
+        "embedding_cache": engines.embedder.cache_info() if indexed else None,
+        "scheduler": get_scheduler().stats(),
+        "warmup": warmup_state(),
     }
 
 
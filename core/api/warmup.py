@@ -0,0 +1,62 @@
+"""
+Background warm-up for the API server.
+
+The server module only imports FastAPI so the health endpoint answers right
+away. After startup, a daemon thread imports the indexer and orchestrator
+(tree-sitter, LanceDB, PyArrow, NumPy, Ollama), loads the tree-sitter
+grammars and asks the model server to load the embedding model, so the first
+index or search request does not pay for any of it.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+_state: Dict = {"status": "pending", "seconds": None, "error": None}
+_thread: Optional[threading.Thread] = None
+
+
+def _warm_up():
+    start = time.perf_counter()
+    _state["status"] = "running"
+    try:
+        from core.indexer.engine import load_languages
+        import core.orchestrator.agent  # noqa: F401
+
+        load_languages()
+
+        model = os.getenv("OPENCODE_WARMUP_EMBEDDING_MODEL", "nomic-embed-text")
+        if model and os.getenv("OPENCODE_WARMUP_MODELS", "1").lower() not in ("0", "false", "off"):
+            try:
+                import ollama
+                ollama.embeddings(model=model, prompt="warm-up", keep_alive="10m")
+            except Exception as e:
+                # The model server may not be running yet; indexing will report it
+                print(f"Warning: Could not warm up embedding model {model}: {e}")
+        _state["status"] = "done"
+    except Exception as e:
+        _state["status"] = "failed"
+        _state["error"] = str(e)
+        print(f"Warning: Warm-up failed: {e}")
+    finally:
+        _state["seconds"] = round(time.perf_counter() - start, 3)
+
+
+def start_warmup():
+    """Start the warm-up thread once per process."""
+    global _thread
+    if _thread is None:
+        _thread = threading.Thread(target=_warm_up, name="opencode-warmup", daemon=True)
+        _thread.start()
+
+
+def wait_for_warmup(timeout: Optional[float] = None) -> bool:
+    """Block until warm-up finished; returns False on timeout."""
+    if _thread is None:
+        return False
+    _thread.join(timeout)
+    return not _thread.is_alive()
+
+
+def warmup_state() -> Dict:
+    return dict(_state)
@@ -0,0 +1,23 @@
+from .mock_ollama import (
+    Latency,
+    MockOllamaServer,
+    Reply,
+)
+from .load import (
+    run_load_test,
+)
+from .agent_replay import (
+    Recording,
+    record,
+    replay,
+)
+
+__all__ = [
+    "Latency",
+    "MockOllamaServer",
+    "Reply",
+    "Recording",
+    "record",
+    "replay",
+    "run_load_test",
+]
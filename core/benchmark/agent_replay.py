@@ -0,0 +1,327 @@
+"""
+Record and replay agent runs to benchmark ``AgentOrchestrator.run_loop``.
+
+``record`` runs a goal with a real model and captures what the loop
+exchanged with the outside world: the chat requests and answers (with their
+timings), the edits applied, the original text of every edited file and the
+verification results. ``replay`` rebuilds the edited files in a scratch
+workspace and runs the same goal again against a ``MockOllamaServer`` that
+answers with the recorded chats, with verification answered from the
+recording. The agent loop itself, the LLM client, edits and syntax checks run
+for real, so the report measures the loop's own overhead:
+
+- wall-clock seconds, iterations and final status per run
+- seconds per phase, from the ``agent.*`` and ``llm.chat`` spans
+- ``overhead_seconds``: wall-clock time outside chat calls and verification
+- ``llm_client_overhead_seconds``: chat time beyond the injected latency
+
+Reports are JSON with the repository commit, for regression tracking.
+"""
+import hashlib
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from core.benchmark.mock_ollama import Latency, MockOllamaServer, Reply
+from core.orchestrator.llm import ChatResponse, LLMClient
+from core.telemetry import set_enabled, telemetry_enabled
+from core.telemetry.tracing import SPAN_SECONDS
+
+if TYPE_CHECKING:
+    from core.orchestrator.agent import AgentOrchestrator
+
+RECORDING_FORMAT = 1
+REPORT_FORMAT = 1
+PHASES = ("agent.context", "agent.plan", "agent.apply", "agent.syntax", "agent.verify", "agent.fix", "llm.chat")
+# model_config keys that change the replayed loop's behaviour
+REPLAYED_SETTINGS = ("planning_model", "editing_model", "syntax_check", "llm_num_ctx", "context_token_budget")
+
+
+def messages_digest(messages: List[Dict]) -> str:
+    canonical = [{"role": m.get("role"), "content": m.get("content")} for m in messages]
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class Recording:
+    """
+    What an agent run exchanged with the model, the files and the verifier.
+
+    Attributes:
+        goal: The run's goal
+        max_iterations: Iteration limit of the run
+        model_config: Settings of the run that affect the loop
+        files: Workspace-relative path -> text before the run (None: absent)
+        exchanges: Chat calls in order: model, messages digest, response and timings
+        edits: Per applied batch: applied and failed counts, seconds
+        verifications: Per verification: success, output, seconds
+        result: Final status, iterations and wall-clock seconds
+    """
+    goal: str
+    max_iterations: int = 5
+    model_config: Dict = field(default_factory=dict)
+    files: Dict[str, Optional[str]] = field(default_factory=dict)
+    exchanges: List[Dict] = field(default_factory=list)
+    edits: List[Dict] = field(default_factory=list)
+    verifications: List[Dict] = field(default_factory=list)
+    result: Dict = field(default_factory=dict)
+    format: int = RECORDING_FORMAT
+
+    def save(self, path: str):
+        Path(path).write_text(json.dumps(asdict(self), indent=2))
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        """Read a recording, raising ValueError if it is invalid."""
+        try:
+            data = json.loads(Path(path).read_text())
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Invalid recording {path}: {e}")
+        if data.get("format") != RECORDING_FORMAT:
+            raise ValueError(f"Unsupported recording format: {data.get('format')}")
+        return cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+
+
+class RecordingClient(LLMClient):
+    """Passes chats to another client and records them."""
+
+    def __init__(self, inner: LLMClient, recording: Recording):
+        super().__init__()
+        self.inner = inner
+        self.provider = inner.provider
+        self.recording = recording
+        self._lock = threading.Lock()
+
+    def chat(self, model, messages, format_json=False, options=None, on_token=None, use_cache=True, priority="agent") -> ChatResponse:
+        response = self.inner.chat(
+            model, messages, format_json=format_json, options=options,
+            on_token=on_token, use_cache=use_cache, priority=priority
+        )
+        with self._lock:
+            self.recording.exchanges.append({
+                "model": model,
+                "messages_digest": messages_digest(messages),
+                "format_json": format_json,
+                "content": response.content,
+                "time_to_first_token": response.time_to_first_token,
+                "duration": response.duration,
+                "prompt_tokens": response.prompt_tokens,
+                "completion_tokens": response.completion_tokens,
+                "cached": response.cached,
+            })
+        return response
+
+
+def record(orchestrator: "AgentOrchestrator", goal: str, max_iterations: int = 5) -> Recording:
+    """
+    Run ``goal`` with ``orchestrator`` and record the run.
+
+    Runs a single candidate: concurrent candidates would interleave their
+    chats and verifications nondeterministically.
+    """
+    recording = Recording(
+        goal=goal,
+        max_iterations=max_iterations,
+        model_config={key: orchestrator.model_config[key] for key in REPLAYED_SETTINGS if key in orchestrator.model_config},
+    )
+    client = orchestrator.llm
+    apply_edits, verify_changes = orchestrator.apply_edits, orchestrator.verify_changes
+    # Instance attributes shadowing the methods, restored afterwards
+    overridden = {name: vars(orchestrator)[name] for name in ("apply_edits", "verify_changes") if name in vars(orchestrator)}
+
+    def recording_apply_edits(edits, dry_run=False, shadow=None):
+        started = time.perf_counter()
+        result = apply_edits(edits, dry_run=dry_run, shadow=shadow)
+        for path, text in result.original.items():
+            recording.files.setdefault(path, text)
+        recording.edits.append({
+            "applied": len(result.applied),
+            "failed": len(result.failed),
+            "seconds": time.perf_counter() - started,
+        })
+        return result
+
+    def recording_verify_changes(test_command=None, verification_commands=None, cwd=None, cancel=None):
+        started = time.perf_counter()
+        success, output = verify_changes(test_command, verification_commands, cwd=cwd, cancel=cancel)
+        recording.verifications.append({
+            "success": success,
+            "output": output,
+            "seconds": time.perf_counter() - started,
+        })
+        return success, output
+
+    orchestrator._llm = RecordingClient(client, recording)
+    orchestrator.apply_edits = recording_apply_edits
+    orchestrator.verify_changes = recording_verify_changes
+    started = time.perf_counter()
+    try:
+        result = orchestrator.run_loop(goal, max_iterations=max_iterations, candidates=1)
+    finally:
+        orchestrator._llm = client
+        del orchestrator.apply_edits, orchestrator.verify_changes
+        vars(orchestrator).update(overridden)
+    recording.result = {
+        "status": result["status"],
+        "iterations": result.get("iterations"),
+        "seconds": time.perf_counter() - started,
+    }
+    return recording
+
+
+class _Replayer:
+    """Answers chat requests with the recorded exchanges, in order."""
+
+    def __init__(self, exchanges: List[Dict]):
+        self.exchanges = exchanges
+        self.served = 0
+        self.prompt_changes = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request: Dict) -> Reply:
+        with self._lock:
+            if self.served >= len(self.exchanges):
+                raise LookupError(f"Only {len(self.exchanges)} chat exchanges were recorded")
+            exchange = self.exchanges[self.served]
+            self.served += 1
+            # Prompts differ when the templates changed since the recording
+            if messages_digest(request.get("messages", [])) != exchange["messages_digest"]:
+                self.prompt_changes += 1
+        return Reply(
+            content=exchange["content"],
+            time_to_first_token=exchange.get("time_to_first_token"),
+            duration=exchange.get("duration"),
+            prompt_tokens=exchange.get("prompt_tokens"),
+            completion_tokens=exchange.get("completion_tokens"),
+        )
+
+
+def _write_files(root: Path, files: Dict[str, Optional[str]]):
+    for name, text in files.items():
+        if text is None:
+            continue
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def _span_sums() -> Dict[str, float]:
+    return {name: SPAN_SECONDS.sum(span=name) for name in PHASES}
+
+
+def replay_once(recording: Recording, latency: Latency, verify_scale: float = 0.0) -> Dict:
+    """
+    Replay ``recording`` once in a scratch workspace and measure it.
+
+    Args:
+        recording: Recorded run
+        latency: Delays of the mock model server
+        verify_scale: Multiplier for the recorded verification times
+            (0 leaves verification out of the wall-clock time)
+
+    Returns:
+        Status, iterations, wall-clock seconds and time per phase of the run
+    """
+    from core.orchestrator.agent import AgentOrchestrator
+
+    replayer = _Replayer(recording.exchanges)
+    verifications = list(recording.verifications)
+
+    def replayed_verify_changes(test_command=None, verification_commands=None, cwd=None, cancel=None):
+        if not verifications:
+            return False, "No recorded verification left"
+        verification = verifications.pop(0)
+        if verify_scale:
+            time.sleep(verification["seconds"] * verify_scale)
+        return verification["success"], verification["output"]
+
+    with tempfile.TemporaryDirectory(prefix="opencode-replay-") as workspace, \
+            MockOllamaServer(replayer, latency) as server:
+        _write_files(Path(workspace), recording.files)
+        orchestrator = AgentOrchestrator(workspace, {
+            **recording.model_config,
+            "llm_provider": "ollama",
+            "llm_host": server.url,
+            "llm_cache": False,
+            "use_shadow_branch": False,
+        })
+        orchestrator.verify_changes = replayed_verify_changes
+        before = _span_sums()
+        started = time.perf_counter()
+        try:
+            result = orchestrator.run_loop(recording.goal, max_iterations=recording.max_iterations, candidates=1)
+        finally:
+            wall = time.perf_counter() - started
+            orchestrator.close()
+        phases = {name: round(value - before[name], 6) for name, value in _span_sums().items()}
+        injected = server.stats()["injected_seconds"]
+
+    llm = phases["llm.chat"]
+    verify = phases["agent.verify"]
+    return {
+        "status": result["status"],
+        "iterations": result.get("iterations"),
+        "wall_seconds": round(wall, 6),
+        "phases": phases,
+        "llm_calls": replayer.served,
+        "llm_seconds": llm,
+        "llm_injected_seconds": injected,
+        "llm_client_overhead_seconds": round(llm - injected, 6),
+        "verify_seconds": verify,
+        "overhead_seconds": round(wall - llm - verify, 6),
+        "prompt_changes": replayer.prompt_changes,
+    }
+
+
+def _median(values: List[float]) -> Optional[float]:
+    values = [value for value in values if value is not None]
+    return round(statistics.median(values), 6) if values else None
+
+
+def replay(
+    recording: Recording,
+    runs: int = 3,
+    latency: Optional[Latency] = None,
+    verify_scale: float = 0.0,
+    name: Optional[str] = None,
+) -> Dict:
+    """
+    Replay ``recording`` ``runs`` times and build the benchmark report.
+
+    Returns:
+        Report with the commit, settings, every run and the medians
+    """
+    from core.indexer.artifacts import git_commit
+
+    latency = latency or Latency()
+    enabled = telemetry_enabled()
+    # Phase times come from the span histograms
+    set_enabled(True)
+    try:
+        results = [replay_once(recording, latency, verify_scale) for _ in range(max(1, runs))]
+    finally:
+        set_enabled(enabled)
+
+    numeric = ("wall_seconds", "llm_seconds", "llm_injected_seconds", "llm_client_overhead_seconds",
+               "verify_seconds", "overhead_seconds", "iterations", "llm_calls")
+    summary = {key: _median([run[key] for run in results]) for key in numeric}
+    summary["phases"] = {phase: _median([run["phases"][phase] for run in results]) for phase in PHASES}
+    summary["statuses"] = sorted({run["status"] for run in results})
+    return {
+        "format": REPORT_FORMAT,
+        "recording": name,
+        "goal": recording.goal,
+        "commit": git_commit(Path(__file__).resolve().parent),
+        "created_at": time.time(),
+        "python": sys.version.split()[0],
+        "settings": {"runs": len(results), "latency": asdict(latency), "verify_scale": verify_scale},
+        "recorded": recording.result,
+        "summary": summary,
+        "runs": results,
+    }
@@ -0,0 +1,434 @@
+"""
+Load test of the FastAPI backend.
+
+``run_load_test`` seeds a synthetic workspace, indexes it, and starts
+``core.api.server:app`` under uvicorn once per worker count, with Ollama
+pointed at a ``MockOllamaServer`` (embeddings and agent chats answer after a
+configurable delay). For each concurrency level, that many client threads
+send a weighted mix of ``/api/search``, ``/api/status``, ``/api/index`` and
+``/api/agent/execute`` requests back to back for a fixed duration. The
+report lists, per worker count, concurrency level and endpoint, the
+requests/s, the p50/p95/p99 latency and the status codes, so changes to the
+server's concurrency model can be compared across commits.
+"""
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from core.benchmark.mock_ollama import Latency, MockOllamaServer, Reply
+
+REPORT_FORMAT = 1
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_MIX = {"search": 8, "status": 4, "index": 1, "agent": 1}
+
+QUERIES = [
+    "parse the configuration file",
+    "retry failed requests with backoff",
+    "compute the checksum of a record",
+    "validate user input",
+    "serialize the report to JSON",
+    "merge overlapping intervals",
+    "cache lookup with expiry",
+    "format a duration for display",
+]
+
+MODULE_TEMPLATE = '''"""Module {module} of the load-test workspace."""
+import json
+
+
+class {cls}:
+    """Keeps {noun} records and their totals."""
+
+    def __init__(self, limit={module}):
+        self.limit = limit
+        self.items = []
+
+    def add(self, value):
+        """Add a {noun} value, dropping the oldest past the limit."""
+        self.items.append(value)
+        if len(self.items) > self.limit:
+            self.items.pop(0)
+        return len(self.items)
+
+    def total(self):
+        return sum(self.items)
+
+
+def parse_{noun}(text):
+    """Parse {noun} records from a JSON document."""
+    data = json.loads(text)
+    return [{cls}(limit=item.get("limit", 10)) for item in data.get("{noun}", [])]
+
+
+def retry_{noun}(operation, attempts=3, delay=0.1):
+    """Call operation, retrying with exponential backoff."""
+    for attempt in range(attempts):
+        try:
+            return operation()
+        except OSError:
+            if attempt == attempts - 1:
+                raise
+    return None
+
+
+def checksum_{noun}(values):
+    """Checksum of {noun} values."""
+    total = {module}
+    for value in values:
+        total = (total * 31 + hash(value)) % 1000003
+    return total
+'''
+
+NOUNS = ["order", "invoice", "session", "metric", "ticket", "account", "shipment", "report", "event", "quota"]
+
+# Indexes the workspace in a fresh interpreter, so the ollama client reads OLLAMA_HOST
+SEED_PROBE = """
+import sys
+from pathlib import Path
+from core.indexer import IndexingEngine
+workspace = Path(sys.argv[1])
+IndexingEngine(str(workspace), str(workspace / ".opencode" / "index")).index(use_ollama=True)
+"""
+
+
+@dataclass
+class Endpoint:
+    """
+    A request of the load mix.
+
+    Attributes:
+        name: Name in the report
+        method: HTTP method
+        path: Request path
+        body: Builds the JSON body of the n-th request (None: no body)
+    """
+    name: str
+    method: str
+    path: str
+    body: Optional[Callable[[int], Dict]] = None
+
+
+def default_endpoints(workspace: Path) -> Dict[str, Endpoint]:
+    workspace = str(workspace)
+    return {
+        "search": Endpoint("search", "POST", "/api/search", lambda n: {
+            "query": QUERIES[n % len(QUERIES)], "top_k": 10, "workspace_path": workspace,
+        }),
+        "status": Endpoint("status", "GET", "/api/status"),
+        "index": Endpoint("index", "POST", "/api/index", lambda n: {"workspace_path": workspace}),
+        "agent": Endpoint("agent", "POST", "/api/agent/execute", lambda n: {
+            "goal": f"Add helper number {n}", "workspace_path": workspace, "max_iterations": 1,
+        }),
+    }
+
+
+def seed_workspace(root: Path, files: int = 100):
+    """Write ``files`` small Python modules under ``root``."""
+    for i in range(files):
+        noun = NOUNS[i % len(NOUNS)]
+        path = root / f"pkg{i % 10}" / f"{noun}_{i}.py"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(MODULE_TEMPLATE.format(module=i, cls=f"{noun.title()}Store{i}", noun=noun))
+
+
+class _AgentResponder:
+    """Answers every planning request with a plan creating a new module."""
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def __call__(self, request: Dict) -> Reply:
+        n = next(self._counter)
+        plan = {
+            "steps": [{
+                "file_path": f"generated/helper_{n}.py",
+                "operation": "create",
+                "content": f"def helper_{n}():\n    return {n}\n",
+            }],
+        }
+        return Reply(content=json.dumps(plan), completion_tokens=40)
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+@dataclass
+class _Samples:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, seconds: float, status: str):
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def _summary(samples: _Samples, duration: float) -> Dict:
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    errors = sum(count for status, count in samples.statuses.items() if not status.startswith("2"))
+    return {
+        "requests": len(samples.latencies),
+        "errors": errors,
+        "requests_per_second": round(len(samples.latencies) / duration, 3) if duration else None,
+        "p50_ms": ms(percentile(samples.latencies, 50)),
+        "p95_ms": ms(percentile(samples.latencies, 95)),
+        "p99_ms": ms(percentile(samples.latencies, 99)),
+        "max_ms": ms(max(samples.latencies) if samples.latencies else None),
+        "status": dict(sorted(samples.statuses.items())),
+    }
+
+
+def drive(
+    url: str,
+    endpoints: Dict[str, Endpoint],
+    mix: Dict[str, int],
+    concurrency: int,
+    duration: float,
+    requests: Optional[int] = None,
+    timeout: float = 120.0,
+    seed: int = 0,
+) -> Dict:
+    """
+    Send the request mix from ``concurrency`` closed-loop clients.
+
+    Every client sends its next request as soon as the previous one is
+    answered, on a keep-alive connection, until ``duration`` seconds passed
+    or ``requests`` requests were sent.
+
+    Returns:
+        Per-endpoint and total requests/s, latency percentiles and status codes
+    """
+    host, port = url.split("://", 1)[-1].rsplit(":", 1)
+    names = [name for name, weight in mix.items() for _ in range(weight)]
+    samples = {name: _Samples() for name in mix}
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    def client(index: int):
+        rng = random.Random(seed * 1000 + index)
+        connection = http.client.HTTPConnection(host, int(port), timeout=timeout)
+        try:
+            while time.perf_counter() < deadline:
+                n = next(counter)
+                if requests is not None and n >= requests:
+                    break
+                endpoint = endpoints[rng.choice(names)]
+                body = json.dumps(endpoint.body(n)).encode() if endpoint.body else None
+                headers = {"Content-Type": "application/json"} if body is not None else {}
+                started = time.perf_counter()
+                try:
+                    connection.request(endpoint.method, endpoint.path, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = str(response.status)
+                except (OSError, http.client.HTTPException) as e:
+                    status = type(e).__name__
+                    connection.close()
+                    connection = http.client.HTTPConnection(host, int(port), timeout=timeout)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    samples[endpoint.name].add(elapsed, status)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests in flight at the deadline finish late; they count against the real elapsed time
+    elapsed = time.perf_counter() - started
+
+    total = _Samples()
+    for sample in samples.values():
+        total.latencies.extend(sample.latencies)
+        for status, count in sample.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "endpoints": {name: _summary(sample, elapsed) for name, sample in samples.items()},
+        "total": _summary(total, elapsed),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerProcess:
+    """
+    ``core.api.server:app`` under uvicorn in a subprocess.
+
+    Args:
+        workers: Number of uvicorn worker processes
+        env: Environment of the server
+        startup_timeout: Seconds to wait until GET / answers
+    """
+
+    def __init__(self, workers: int = 1, env: Optional[Dict[str, str]] = None, startup_timeout: float = 60.0):
+        self.workers = workers
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.port = _free_port()
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "ServerProcess":
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "core.api.server:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=str(REPO_ROOT), env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.perf_counter() + self.startup_timeout
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}")
+            try:
+                with urllib.request.urlopen(self.url + "/", timeout=1) as response:
+                    if response.status == 200:
+                        return self
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError(f"Server did not answer within {self.startup_timeout}s")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def __enter__(self) -> "ServerProcess":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def server_env(mock_url: str) -> Dict[str, str]:
+    """Environment pointing the server's embedding and LLM clients at ``mock_url``."""
+    return dict(
+        os.environ,
+        PYTHONPATH=str(REPO_ROOT),
+        OLLAMA_HOST=mock_url,
+        OPENCODE_LLM_PROVIDER="ollama",
+        OPENCODE_LLM_HOST=mock_url,
+        OPENCODE_WARMUP_MODELS="0",
+        OPENCODE_RERANK="off",
+    )
+
+
+def seed_index(workspace: Path, env: Dict[str, str]):
+    """Index ``workspace`` in a subprocess using the mock embedding server."""
+    subprocess.run(
+        [sys.executable, "-c", SEED_PROBE, str(workspace)],
+        cwd=str(REPO_ROOT), env=env, stdout=subprocess.DEVNULL, check=True,
+    )
+
+
+def run_load_test(
+    concurrency: Sequence[int] = (1, 4, 16),
+    workers: Sequence[int] = (1,),
+    duration: float = 10.0,
+    mix: Optional[Dict[str, int]] = None,
+    files: int = 100,
+    latency: Optional[Latency] = None,
+    warmup_requests: int = 8,
+) -> Dict:
+    """
+    Load-test the backend at every worker count and concurrency level.
+
+    Args:
+        concurrency: Numbers of concurrent clients
+        workers: uvicorn worker counts
+        duration: Seconds per concurrency level
+        mix: Relative weight per endpoint name (default: DEFAULT_MIX)
+        files: Number of modules in the seeded workspace
+        latency: Delays of the mock model server
+        warmup_requests: Search and status requests per worker before
+            measuring, so every worker has loaded the index
+
+    Returns:
+        Report with the commit, settings and one result per worker count and
+        concurrency level
+    """
+    from core.indexer.artifacts import git_commit
+
+    mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if weight > 0}
+    unknown = set(mix) - set(DEFAULT_MIX)
+    if unknown or not mix:
+        raise ValueError(f"Invalid endpoint mix: {', '.join(sorted(unknown)) or 'empty'}")
+    latency = latency or Latency(time_to_first_token=0.2, tokens_per_second=200, embed_seconds=0.005)
+    root = Path(tempfile.mkdtemp(prefix="opencode-load-"))
+    results = []
+    try:
+        workspace = root / "workspace"
+        seed_workspace(workspace, files)
+        endpoints = default_endpoints(workspace)
+
+        with MockOllamaServer(_AgentResponder(), latency) as mock:
+            env = server_env(mock.url)
+            seed_index(workspace, env)
+            for worker_count in workers:
+                with ServerProcess(worker_count, env) as server:
+                    # Load the index in every worker; searches and status only, so the
+                    # workspace is the same for every run
+                    warmup = {name: 1 for name in mix if name in ("search", "status")}
+                    if warmup and warmup_requests:
+                        drive(server.url, endpoints, warmup, worker_count * 2, duration=60.0,
+                              requests=warmup_requests * worker_count)
+                    for level in concurrency:
+                        result = drive(server.url, endpoints, mix, level, duration)
+                        results.append({"workers": worker_count, **result})
+            mock_stats = mock.stats()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "format": REPORT_FORMAT,
+        "commit": git_commit(REPO_ROOT),
+        "created_at": time.time(),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "settings": {
+            "concurrency": list(concurrency),
+            "workers": list(workers),
+            "duration": duration,
+            "mix": mix,
+            "files": files,
+            "latency": asdict(latency),
+        },
+        "mock": mock_stats,
+        "results": results,
+    }
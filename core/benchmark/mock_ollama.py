@@ -0,0 +1,266 @@
+"""
+A local stand-in for the Ollama HTTP API, for benchmarks.
+
+``MockOllamaServer`` answers the endpoints the backend uses: ``/api/chat``
+(streamed as NDJSON like Ollama, or as one JSON object), ``/api/embed`` and
+``/api/embeddings`` (deterministic vectors), and ``/api/version`` and
+``/api/tags``. Chat answers come from a responder callable, for example one
+replaying recorded exchanges, and are delayed according to a ``Latency``, so
+the model's time can be controlled while everything around it runs for real.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+_PIECES = re.compile(r"\s*\S+|\s+")
+
+
+@dataclass
+class Reply:
+    """
+    A chat answer and the timings it was recorded with.
+
+    Attributes:
+        content: Complete answer
+        time_to_first_token: Recorded seconds until the first token
+        duration: Recorded seconds for the whole answer
+        prompt_tokens: Reported prompt token count
+        completion_tokens: Reported completion token count
+    """
+    content: str
+    time_to_first_token: Optional[float] = None
+    duration: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+@dataclass
+class Latency:
+    """
+    Delays injected by the mock server.
+
+    Attributes:
+        time_to_first_token: Seconds before the first token (None: as recorded)
+        tokens_per_second: Streaming rate (None: the recorded rate)
+        scale: Multiplier for recorded timings
+        embed_seconds: Delay of every embedding request
+    """
+    time_to_first_token: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    scale: float = 1.0
+    embed_seconds: float = 0.0
+
+    def schedule(self, reply: Reply, pieces: int) -> Tuple[float, float]:
+        """Seconds before the first piece and between pieces of ``reply``."""
+        recorded_first = (reply.time_to_first_token or 0.0) * self.scale
+        first = self.time_to_first_token if self.time_to_first_token is not None else recorded_first
+        if self.tokens_per_second:
+            return first, 1.0 / self.tokens_per_second
+        if reply.duration is None or not pieces:
+            return first, 0.0
+        generation = max(0.0, reply.duration - (reply.time_to_first_token or 0.0)) * self.scale
+        return first, generation / pieces
+
+
+def _default_responder(request: Dict) -> Reply:
+    return Reply(content=json.dumps({"steps": []}) if request.get("format") == "json" else "ok")
+
+
+def mock_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic unit-range vector for ``text``."""
+    rng = random.Random(zlib.crc32(text.encode()))
+    return [rng.random() for _ in range(dimensions)]
+
+
+class MockOllamaServer:
+    """
+    Serves the Ollama API on a local port from a background thread.
+
+    Args:
+        responder: Returns the Reply for a /api/chat request body; raising
+            LookupError answers with an error (default: an empty plan)
+        latency: Injected delays
+        dimensions: Size of the returned embeddings
+        host: Interface to bind
+        port: Port to bind (0 picks a free one)
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[Dict], Reply]] = None,
+        latency: Optional[Latency] = None,
+        dimensions: int = 384,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.responder = responder or _default_responder
+        self.latency = latency or Latency()
+        self.dimensions = dimensions
+        self.chat_requests = 0
+        self.embed_requests = 0
+        self.injected_seconds = 0.0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllamaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "chat_requests": self.chat_requests,
+                "embed_requests": self.embed_requests,
+                "injected_seconds": round(self.injected_seconds, 6),
+            }
+
+    def _sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+            with self._lock:
+                self.injected_seconds += seconds
+
+    def _chat(self, handler: "_Handler", request: Dict):
+        with self._lock:
+            self.chat_requests += 1
+        try:
+            reply = self.responder(request)
+        except LookupError as e:
+            handler.send_json({"error": str(e)}, status=500)
+            return
+        pieces = _PIECES.findall(reply.content) or [""]
+        first, between = self.latency.schedule(reply, len(pieces))
+        model = request.get("model", "")
+        final = {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": reply.prompt_tokens,
+            "eval_count": reply.completion_tokens if reply.completion_tokens is not None else len(pieces),
+        }
+
+        if not request.get("stream", True):
+            self._sleep(first + between * len(pieces))
+            handler.send_json({**final, "message": {"role": "assistant", "content": reply.content}})
+            return
+
+        handler.start_stream()
+        try:
+            self._sleep(first)
+            for i, piece in enumerate(pieces):
+                if i:
+                    self._sleep(between)
+                handler.write_chunk({
+                    "model": model,
+                    "created_at": final["created_at"],
+                    "message": {"role": "assistant", "content": piece},
+                    "done": False,
+                })
+            handler.write_chunk({**final, "message": {"role": "assistant", "content": ""}})
+            handler.end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. once its JSON answer was complete
+            handler.close_connection = True
+
+    def _embed(self, handler: "_Handler", request: Dict, legacy: bool):
+        with self._lock:
+            self.embed_requests += 1
+        self._sleep(self.latency.embed_seconds)
+        if legacy:
+            handler.send_json({"embedding": mock_embedding(request.get("prompt", ""), self.dimensions)})
+            return
+        texts = request.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        handler.send_json({
+            "model": request.get("model", ""),
+            "embeddings": [mock_embedding(text, self.dimensions) for text in texts],
+        })
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mock(self) -> MockOllamaServer:
+        return self.server.mock
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self.send_json({"version": "0.0.0-mock"})
+        elif self.path == "/api/tags":
+            self.send_json({"models": []})
+        elif self.path == "/":
+            self.send_json({"status": "Ollama is running"})
+        else:
+            self.send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json({"error": "invalid JSON"}, status=400)
+            return
+        if self.path == "/api/chat":
+            self.mock._chat(self, request)
+        elif self.path == "/api/embed":
+            self.mock._embed(self, request, legacy=False)
+        elif self.path == "/api/embeddings":
+            self.mock._embed(self, request, legacy=True)
+        else:
+            self.send_json({"error": "not found"}, status=404)
+
+    def send_json(self, payload: Dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, payload: Dict):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
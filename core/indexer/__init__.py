@@ -1,3 +1,28 @@
-from .engine import IndexingEngine, CodeChunk
+"""
+Indexing engine package.
+
+Exports are resolved lazily so that importing the package (for example from
+the API server) does not load tree-sitter, LanceDB, PyArrow and NumPy until
+an engine is actually needed.
+"""
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+_EXPORTS = {
+    "IndexingEngine": ".engine",
+    "CodeChunk": ".engine",
+}
 
 __all__ = ["IndexingEngine", "CodeChunk"]
+
+if TYPE_CHECKING:
+    from .engine import IndexingEngine, CodeChunk
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,219 @@
+"""
+Portable prebuilt index artifacts.
+
+A CI job indexes a repository once and exports the result; developers import
+it and only re-index the files that differ from the artifact's commit, instead
+of embedding the whole repository again.
+
+An artifact is an uncompressed tar file holding:
+
+- ``manifest.json``: format version, git commit, embedding model and
+  dimensions, and the SHA-256 of every indexed file (workspace-relative,
+  ``/``-separated), with ``null`` for files changed after they were indexed
+- ``index.arrow``: the ``code_index`` table as a zstd-compressed Arrow IPC file
+
+Imports never extract to disk, so member names cannot escape the index.
+"""
+import hashlib
+import io
+import json
+import os
+import subprocess
+import tarfile
+import time
+from pathlib import Path, PurePath
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+
+if TYPE_CHECKING:
+    from core.indexer.engine import IndexingEngine
+
+# Bump whenever the code_index schema changes
+ARTIFACT_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+DATA_NAME = "index.arrow"
+
+
+def _git(workspace: Path, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", *args], cwd=str(workspace), capture_output=True)
+    except FileNotFoundError:
+        return None
+    return result.stdout.decode("utf-8", errors="replace") if result.returncode == 0 else None
+
+
+def git_commit(workspace: Path) -> Optional[str]:
+    """HEAD commit of the repository containing ``workspace``, or None outside git."""
+    out = _git(workspace, "rev-parse", "HEAD")
+    return out.strip() if out else None
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_manifest(engine: "IndexingEngine") -> Dict[str, Optional[str]]:
+    """
+    Content hash of every indexable file of the workspace.
+
+    Files modified after their rows were written map to None, so importers
+    re-index them rather than trusting stale rows.
+    """
+    table = engine.open_table().to_arrow().select(["file_path", "mtime"])
+    indexed_mtimes: Dict[str, float] = {}
+    for path, mtime in zip(table.column("file_path").to_pylist(), table.column("mtime").to_pylist()):
+        if mtime is not None:
+            indexed_mtimes[path] = max(mtime, indexed_mtimes.get(path, mtime))
+
+    manifest = {}
+    for file_path in engine.scan_workspace():
+        relative = file_path.relative_to(engine.workspace_path)
+        indexed = indexed_mtimes.get(str(relative))
+        stale = indexed is not None and os.path.getmtime(file_path) > indexed
+        manifest[relative.as_posix()] = None if stale else _hash_file(file_path)
+    return manifest
+
+
+def export_index(engine: "IndexingEngine", path: str, commit: Optional[str] = None) -> Dict:
+    """
+    Write the read snapshot of ``engine``'s index to an artifact.
+
+    Args:
+        engine: Indexed engine
+        path: Artifact file to write
+        commit: Commit the index reflects (HEAD of the workspace if None)
+
+    Returns:
+        The artifact manifest
+    """
+    snapshot = engine.open_table()
+    data = snapshot.to_arrow()
+    vector_type = data.schema.field("vector").type
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "commit": commit or git_commit(engine.workspace_path),
+        "embedding_model": engine.embedding_model,
+        "dimensions": vector_type.list_size if pa.types.is_fixed_size_list(vector_type) else None,
+        "rows": data.num_rows,
+        "table_version": snapshot.version,
+        "created_at": time.time(),
+        "files": file_manifest(engine),
+    }
+
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_file(sink, data.schema, options=options) as writer:
+        writer.write_table(data)
+    members = [
+        (MANIFEST_NAME, json.dumps(manifest, indent=2).encode()),
+        (DATA_NAME, sink.getvalue().to_pybytes()),
+    ]
+
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    with tarfile.open(staging, "w") as tar:
+        for name, payload in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(payload)
+            info.mtime = int(manifest["created_at"])
+            tar.addfile(info, io.BytesIO(payload))
+    os.replace(staging, target)
+    return manifest
+
+
+def read_artifact(path: str) -> Tuple[Dict, pa.Table]:
+    """Read the manifest and table of an artifact, raising ValueError if it is invalid."""
+    try:
+        with tarfile.open(path, "r") as tar:
+            manifest = json.loads(tar.extractfile(MANIFEST_NAME).read())
+            if manifest.get("format") != ARTIFACT_FORMAT:
+                raise ValueError(f"Unsupported index artifact format: {manifest.get('format')}")
+            payload = tar.extractfile(DATA_NAME).read()
+    except (OSError, KeyError, tarfile.TarError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid index artifact {path}: {e}")
+    return manifest, pa.ipc.open_file(pa.py_buffer(payload)).read_all()
+
+
+def _git_delta(engine: "IndexingEngine", commit: Optional[str]) -> Optional[List[str]]:
+    # Workspace-relative paths changed since ``commit`` (tracked or untracked),
+    # or None if git cannot tell
+    if not commit:
+        return None
+    diff = _git(engine.workspace_path, "diff", "--name-only", "--relative", "-z", commit)
+    untracked = _git(engine.workspace_path, "ls-files", "--others", "--exclude-standard", "-z")
+    if diff is None or untracked is None:
+        return None
+    return sorted({name for name in (diff + untracked).split("\0") if name})
+
+
+def local_delta(engine: "IndexingEngine", manifest: Dict) -> Tuple[List[Path], List[str]]:
+    """
+    Files to re-index and to drop so an imported index matches the working tree.
+
+    Uses ``git diff`` against the artifact's commit when the workspace has it,
+    and otherwise compares content hashes with the manifest.
+
+    Returns:
+        (changed or new files, workspace-relative paths of removed files)
+    """
+    files = manifest.get("files", {})
+    candidates = _git_delta(engine, manifest.get("commit"))
+    if candidates is not None:
+        # Files the artifact could not vouch for are re-indexed as well
+        candidates = set(candidates) | {name for name, digest in files.items() if digest is None}
+    else:
+        candidates = set(files) | {
+            path.relative_to(engine.workspace_path).as_posix() for path in engine.scan_workspace()
+        }
+
+    changed, removed = [], []
+    for name in sorted(candidates):
+        path = engine.workspace_path / PurePath(name)
+        indexable = path.is_file() and engine._should_index_file(path) and engine._get_language(path)
+        if not indexable:
+            if name in files:
+                removed.append(str(PurePath(name)))
+        elif files.get(name) is None or _hash_file(path) != files[name]:
+            changed.append(path)
+    return changed, removed
+
+
+def import_index(engine: "IndexingEngine", path: str, use_ollama: bool = True) -> Dict:
+    """
+    Replace ``engine``'s index with an artifact, then index the local delta.
+
+    Args:
+        engine: Engine whose index is replaced
+        path: Artifact file
+        use_ollama: Embed changed files with Ollama (see IndexingEngine.index)
+
+    Returns:
+        Commit, row count and the changed and removed files of the import
+
+    Raises:
+        ValueError: The artifact is invalid or uses another embedding model
+    """
+    started = time.monotonic()
+    manifest, data = read_artifact(path)
+    if manifest.get("embedding_model") != engine.embedding_model:
+        raise ValueError(
+            f"Index artifact was built with {manifest.get('embedding_model')}, "
+            f"this workspace uses {engine.embedding_model}"
+        )
+    engine.replace_table(data)
+    changed, removed = local_delta(engine, manifest)
+    if changed or removed:
+        engine.update_files(changed, removed, use_ollama=use_ollama)
+    return {
+        "commit": manifest.get("commit"),
+        "rows": engine.open_table().count_rows(),
+        "changed": [str(p.relative_to(engine.workspace_path)) for p in changed],
+        "removed": removed,
+        "seconds": round(time.monotonic() - started, 3),
+    }
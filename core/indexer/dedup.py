@@ -0,0 +1,106 @@
+"""
+Near-duplicate detection for code chunks.
+
+Vendored libraries, copy-pasted handlers and generated variants produce many
+chunks that differ only in a name or a literal. Every chunk gets a MinHash
+signature over its token shingles; locality-sensitive hashing (LSH) over bands
+of the signature finds candidate pairs without comparing every chunk with
+every other, and candidates whose estimated Jaccard similarity reaches the
+threshold are merged into one group. The indexer embeds and stores one
+representative per group, listing the locations of the others.
+"""
+import re
+import zlib
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Largest 32-bit prime: (a * h + b) stays below 2**64 for a, b, h < 2**32
+_PRIME = np.uint64(4294967291)
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def shingles(text: str, size: int = 5) -> np.ndarray:
+    """32-bit hashes of the overlapping ``size``-token windows of ``text``."""
+    tokens = _TOKEN.findall(text)
+    if len(tokens) <= size:
+        windows = [" ".join(tokens)]
+    else:
+        windows = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    return np.unique(np.array([zlib.crc32(window.encode()) for window in windows], dtype=np.uint64))
+
+
+class MinHasher:
+    """
+    MinHash signatures with ``num_perm`` universal hash functions.
+
+    Args:
+        num_perm: Signature length
+        shingle_size: Tokens per shingle
+        seed: Seed of the hash functions (signatures are only comparable
+            between hashers with the same seed)
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text, self.shingle_size)[None, :]
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def group_near_duplicates(
+    texts: Sequence[str],
+    threshold: float = 0.9,
+    num_perm: int = 64,
+    bands: int = 16,
+) -> List[List[int]]:
+    """
+    Group texts whose estimated Jaccard similarity is at least ``threshold``.
+
+    Args:
+        texts: Texts to group
+        threshold: Minimum similarity to a group member
+        num_perm: Signature length
+        bands: LSH bands; more bands find less similar candidates
+
+    Returns:
+        Groups of indices into ``texts``, each in ascending order, so the first
+        index is the group's representative; singletons are included
+    """
+    hasher = MinHasher(num_perm=num_perm)
+    signatures = [hasher.signature(text) for text in texts]
+    rows = num_perm // bands
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: Dict[bytes, int] = {}
+        for i, signature in enumerate(signatures):
+            key = signature[band * rows:(band + 1) * rows].tobytes()
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+            root_first, root_i = find(first), find(i)
+            if root_first != root_i and similarity(signatures[first], signature) >= threshold:
+                parent[max(root_first, root_i)] = min(root_first, root_i)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
@@ -0,0 +1,266 @@
+"""
+Shared embedding backend for all indexing engines of the process.
+
+Every ``IndexingEngine`` embeds through one ``EmbeddingBackend``, so engines
+for different workspaces share:
+  - a batching queue: concurrent ``embed`` calls (indexing in one workspace,
+    searches in others) are coalesced into batched model requests
+  - scheduling: every model request holds a ``ModelScheduler`` slot of its
+    priority class, and queued query embeddings are sent before indexing
+    batches, which are split into ``batch_size`` requests
+  - an LRU cache of embeddings keyed by model and text hash, so repeated
+    queries and unchanged chunks are not embedded twice
+"""
+import hashlib
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from core.scheduling import PRIORITIES, ModelScheduler, get_scheduler
+from core.telemetry import CACHE_REQUESTS, REGISTRY
+
+EMBEDDING_BATCHES = REGISTRY.histogram(
+    "opencode_embedding_batch_size", "Texts per embedding model request", ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+
+def hash_embedding(text: str, dimensions: int = 384) -> np.ndarray:
+    """Deterministic pseudo-embedding used when no embedding model is available."""
+    hash_obj = hashlib.sha256(text.encode())
+    hash_bytes = hash_obj.digest()
+    # Repeat the hash to fill the vector (4 bytes per float32)
+    while len(hash_bytes) < dimensions * 4:
+        hash_bytes += hash_obj.digest()
+    return np.frombuffer(hash_bytes[:dimensions * 4], dtype=np.float32).copy()
+
+
+@dataclass
+class _EmbedRequest:
+    model: str
+    texts: List[str]
+    vectors: Optional[List[np.ndarray]] = None
+    error: Optional[BaseException] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+class EmbeddingBackend:
+    """
+    Batched, cached access to the embedding model.
+
+    Args:
+        batch_size: Maximum number of texts sent in one model request
+        max_wait: Seconds the worker waits for more requests to join a batch
+        cache_entries: Number of embeddings kept in the LRU cache
+        keep_alive: How long Ollama keeps the embedding model loaded
+        scheduler: Scheduler of model-server requests (process default if None)
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 64,
+        max_wait: float = 0.005,
+        cache_entries: int = 20000,
+        keep_alive: Optional[str] = "10m",
+        scheduler: Optional[ModelScheduler] = None,
+    ):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.cache_entries = cache_entries
+        self.keep_alive = keep_alive
+        self._cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._scheduler = scheduler
+        # (priority rank, arrival, request): queries are taken before bulk batches
+        self._queue: "queue.PriorityQueue[Tuple[int, int, _EmbedRequest]]" = queue.PriorityQueue()
+        self._arrivals = itertools.count()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._warned_fallback = False
+
+    @property
+    def scheduler(self) -> ModelScheduler:
+        if self._scheduler is None:
+            self._scheduler = get_scheduler()
+        return self._scheduler
+
+    def embed(
+        self,
+        texts: List[str],
+        model: str,
+        use_ollama: bool = True,
+        priority: str = "interactive",
+        key: Hashable = None,
+    ) -> List[np.ndarray]:
+        """
+        Embed ``texts`` with ``model``, reusing cached vectors.
+
+        Args:
+            texts: Texts to embed
+            model: Embedding model name
+            use_ollama: Use the local Ollama server (cloud APIs are not supported yet)
+            priority: Scheduler class, "interactive" for queries and "bulk" for indexing
+            key: Fair-queuing key within the class (e.g. the workspace)
+
+        Returns:
+            One float32 vector per text, in input order
+
+        Raises:
+            SchedulerOverloaded: Bulk work was shed because too much is queued
+        """
+        if not use_ollama:
+            # TODO: Add cloud API support (e.g. third-party LLM/embedding providers)
+            raise NotImplementedError("Cloud API embeddings not yet implemented")
+
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        misses: "OrderedDict[Tuple[str, str], Tuple[str, List[int]]]" = OrderedDict()
+        for i, text in enumerate(texts):
+            cache_key = (model, hashlib.sha256(text.encode()).hexdigest())
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                results[i] = cached
+            elif cache_key in misses:
+                misses[cache_key][1].append(i)
+            else:
+                misses[cache_key] = (text, [i])
+
+        if texts:
+            CACHE_REQUESTS.inc(len(texts) - sum(len(idx) for _, idx in misses.values()), cache="embedding", result="hit")
+        if not misses:
+            return results
+        CACHE_REQUESTS.inc(sum(len(idx) for _, idx in misses.values()), cache="embedding", result="miss")
+
+        # One batch at a time, so other keys and higher classes get their turn in between
+        missing = list(misses.items())
+        self._ensure_worker()
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            request = _EmbedRequest(model=model, texts=[text for _, (text, _) in batch])
+            with self.scheduler.slot(priority, key):
+                self._queue.put((self._rank(priority), next(self._arrivals), request))
+                request.done.wait()
+            if request.error is not None:
+                raise request.error
+
+            for (cache_key, (_, indices)), vector in zip(batch, request.vectors):
+                self._cache_put(cache_key, vector)
+                for i in indices:
+                    results[i] = vector
+        return results
+
+    @staticmethod
+    def _rank(priority: str) -> int:
+        return PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES)
+
+    def cache_info(self) -> Dict:
+        with self._cache_lock:
+            return {"entries": len(self._cache), "max_entries": self.cache_entries}
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _cache_get(self, key) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key, vector: np.ndarray):
+        if self.cache_entries <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="opencode-embedder", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            pending = [first[2]]
+            deadline = time.monotonic() + self.max_wait
+            while sum(len(r.texts) for r in pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item[0] != first[0]:
+                    # Only requests of one class share a model request
+                    self._queue.put(item)
+                    break
+                pending.append(item[2])
+
+            by_model: Dict[str, List[_EmbedRequest]] = {}
+            for request in pending:
+                by_model.setdefault(request.model, []).append(request)
+            for model, requests in by_model.items():
+                self._process(model, requests)
+
+    def _process(self, model: str, requests: List[_EmbedRequest]):
+        texts = [text for request in requests for text in request.texts]
+        try:
+            vectors = []
+            for start in range(0, len(texts), self.batch_size):
+                batch = texts[start:start + self.batch_size]
+                EMBEDDING_BATCHES.observe(len(batch), model=model)
+                vectors.extend(self._embed_batch(model, batch))
+            offset = 0
+            for request in requests:
+                request.vectors = vectors[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+        except Exception as e:
+            for request in requests:
+                request.error = e
+        finally:
+            for request in requests:
+                request.done.set()
+
+    def _embed_batch(self, model: str, texts: List[str]) -> List[np.ndarray]:
+        """Embed one batch with the model server; overridden in tests."""
+        try:
+            import ollama
+        except ImportError:
+            if not self._warned_fallback:
+                print("Warning: ollama not installed, falling back to simple hash-based embeddings")
+                self._warned_fallback = True
+            return [hash_embedding(text) for text in texts]
+
+        if hasattr(ollama, "embed"):
+            response = ollama.embed(model=model, input=texts, keep_alive=self.keep_alive)
+            return [np.array(vector, dtype=np.float32) for vector in response["embeddings"]]
+
+        # Clients before 0.3 only have the single-prompt endpoint
+        return [
+            np.array(ollama.embeddings(model=model, prompt=text)["embedding"], dtype=np.float32)
+            for text in texts
+        ]
+
+
+_default_backend: Optional[EmbeddingBackend] = None
+_default_lock = threading.Lock()
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Return the process-wide embedding backend shared by all engines."""
+    global _default_backend
+    with _default_lock:
+        if _default_backend is None:
+            _default_backend = EmbeddingBackend()
+        return _default_backend
@@ -1,8 +1,14 @@
 import os
+import time
+import shutil
 import hashlib
+import threading
+import warnings
+from datetime import timedelta
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from functools import lru_cache
 
 try:
     import tree_sitter_python as tspython
@@ -24,6 +30,66 @@ import lancedb
 import pyarrow as pa
 import numpy as np
 
+from core.indexer.artifacts import export_index, import_index
+from core.indexer.dedup import group_near_duplicates
+from core.indexer.embeddings import EmbeddingBackend, get_embedding_backend
+from core.indexer.filters import INDEXED_COLUMNS, SearchFilters
+from core.indexer.flat import FlatIndex
+from core.indexer.hierarchy import HierarchyIndex
+from core.indexer.migration import DEFAULT_TABLE, EmbeddingMigration, IndexState, shadow_table_name
+from core.indexer.parse_cache import ParseCache
+from core.indexer.rerank import RerankStage
+from core.indexer.tokens import count_tokens
+from core.telemetry import REGISTRY, span
+
+INDEXED_FILES = REGISTRY.counter("opencode_index_files_total", "Files parsed by the indexer")
+INDEXED_CHUNKS = REGISTRY.counter("opencode_index_chunks_total", "Chunks stored in the index")
+INDEXED_TOKENS = REGISTRY.counter("opencode_index_tokens_total", "Tokens in chunks stored in the index")
+EMBEDDED_TEXTS = REGISTRY.counter("opencode_embeddings_total", "Texts embedded", ["model"])
+DUPLICATE_CHUNKS = REGISTRY.counter(
+    "opencode_index_duplicate_chunks_total", "Near-duplicate chunks folded into a representative"
+)
+SEARCHES = REGISTRY.counter("opencode_search_requests_total", "Index searches")
+
+
+def _make_parser(language: Language) -> Parser:
+    """Create a parser for ``language`` across tree-sitter API versions."""
+    try:
+        return Parser(language)
+    except TypeError:
+        # tree-sitter < 0.22
+        parser = Parser()
+        parser.set_language(language)
+        return parser
+
+
+@lru_cache(maxsize=None)
+def load_languages() -> Dict[str, Language]:
+    """Load every installed tree-sitter grammar once per process."""
+    languages = {}
+    
+    grammars = [
+        ("python", tspython, "language"),
+        ("javascript", tsjavascript, "language"),
+        ("typescript", tstypescript, "language_typescript"),
+        ("tsx", tstypescript, "language_tsx"),
+    ]
+    for name, module, attr in grammars:
+        if not module:
+            continue
+        try:
+            languages[name] = Language(getattr(module, attr)())
+        except Exception as e:
+            print(f"Warning: Could not load {name} parser: {e}")
+    
+    return languages
+
+
+def load_parsers() -> Dict[str, Parser]:
+    """Create tree-sitter parsers for every installed language grammar."""
+    # Parsers are not thread-safe, so every caller gets its own set
+    return {name: _make_parser(language) for name, language in load_languages().items()}
+
 
 @dataclass
 class CodeChunk:
@@ -65,59 +131,101 @@ class IndexingEngine:
         ".js": "javascript",
         ".jsx": "javascript",
         ".ts": "typescript",
-        ".tsx": "typescript",
+        ".tsx": "tsx",
     }
     
     # Minimum lines for a chunk to be indexed
     MIN_CHUNK_LINES = 4
     
-    def __init__(self, workspace_path: str, vector_db_path: str, embedding_model: Optional[str] = None):
+    # Memory budget for cached parse trees
+    PARSE_CACHE_BYTES = 128 * 1024 * 1024
+    
+    # Chunks of one language at least this similar (estimated Jaccard similarity
+    # of their token shingles) are embedded and stored once; None disables it
+    DEDUP_THRESHOLD = 0.85
+    
+    # Index maintenance: compact once this many small fragments accumulate, or
+    # at least this often after writes; keep old versions this long for readers
+    OPTIMIZE_SMALL_FRAGMENTS = 16
+    OPTIMIZE_INTERVAL_SECONDS = 3600
+    CLEANUP_OLDER_THAN = timedelta(hours=1)
+    
+    # Background re-embedding after an embedding model change
+    MIGRATION_BATCH_SIZE = 256
+    MIGRATION_PAUSE_SECONDS = 0.05
+    
+    # With search_backend="auto", indexes up to this size are searched in memory
+    FLAT_MAX_ROWS = 100_000
+    SEARCH_BACKENDS = ("auto", "flat", "lancedb")
+    
+    # Coarse-to-fine search: by default on for indexes of at least this many
+    # chunks; narrows to the best HIERARCHY_DIRECTORIES directories, then the
+    # best max(HIERARCHY_FILES, top_k) files in them, then their chunks
+    HIERARCHY_MIN_ROWS = 200_000
+    HIERARCHY_DIRECTORIES = 16
+    HIERARCHY_FILES = 64
+    
+    def __init__(
+        self,
+        workspace_path: str,
+        vector_db_path: str,
+        embedding_model: Optional[str] = None,
+        embedder: Optional[EmbeddingBackend] = None,
+        reranker: Optional[RerankStage] = None,
+        search_backend: str = "auto"
+    ):
         self.workspace_path = Path(workspace_path)
         self.vector_db_path = Path(vector_db_path)
         self.embedding_model = embedding_model or "nomic-embed-text"  # Default Ollama model
         
+        # An existing index keeps answering with the model it was built with
+        # until a migration to the requested model completes
+        self.state = IndexState.load(self.vector_db_path) or IndexState()
+        self.table_name = self.state.table
+        self.requested_model = self.embedding_model
+        if self.state.embedding_model:
+            self.embedding_model = self.state.embedding_model
+        self.migration: Optional[EmbeddingMigration] = None
+        
+        # Embedding batching and cache are shared by all engines of the process
+        self.embedder = embedder or get_embedding_backend()
+        # Optional second stage rescoring a larger candidate pool
+        self.reranker = reranker
+        
+        # Unfiltered searches use an in-memory matrix kept in sync with the table
+        if search_backend not in self.SEARCH_BACKENDS:
+            raise ValueError(f"Unknown search backend: {search_backend}")
+        self.search_backend = search_backend
+        self.flat = FlatIndex(self._flat_path(self.table_name))
+        self._hierarchy: Optional[HierarchyIndex] = None
+        # Published (from version, to version, changed files) since the summaries were pooled
+        self._hierarchy_changes: List[Tuple[Optional[int], int, Optional[List[str]]]] = []
+        
         # Initialize tree-sitter parsers
         self.parsers = self._init_parsers()
+        self.parse_cache = ParseCache(self.parsers, max_bytes=self.PARSE_CACHE_BYTES)
         
         # Initialize vector database
         self.db = self._init_vector_db()
-        self.table = None
+        self.table = None  # Write handle at the latest version
+        self._snapshot = None  # Read handle pinned at the last completed write
+        self._write_lock = threading.RLock()
+        self._dirty = False
+        self._last_optimized = time.monotonic()
+        if self.state.embedding_model is None and self._writer() is not None:
+            # Index written before the state file existed
+            recorded = (self.table.schema.metadata or {}).get(b"opencode.embedding_model")
+            if recorded:
+                self.embedding_model = recorded.decode()
         
     def _init_parsers(self) -> Dict[str, Parser]:
         """Initialize tree-sitter parsers for supported languages."""
-        parsers = {}
-        
-        # Python parser
-        if tspython:
-            try:
-                py_lang = Language(tspython.language())
-                parser = Parser()
-                parser.set_language(py_lang)
-                parsers["python"] = parser
-            except Exception as e:
-                print(f"Warning: Could not load Python parser: {e}")
-        
-        # JavaScript parser
-        if tsjavascript:
-            try:
-                js_lang = Language(tsjavascript.language())
-                parser = Parser()
-                parser.set_language(js_lang)
-                parsers["javascript"] = parser
-            except Exception as e:
-                print(f"Warning: Could not load JavaScript parser: {e}")
-        
-        # TypeScript parser
-        if tstypescript:
-            try:
-                ts_lang = Language(tstypescript.language())
-                parser = Parser()
-                parser.set_language(ts_lang)
-                parsers["typescript"] = parser
-            except Exception as e:
-                print(f"Warning: Could not load TypeScript parser: {e}")
-        
-        return parsers
+        return load_parsers()
+    
+    def _flat_path(self, table_name: str) -> str:
+        if table_name == DEFAULT_TABLE:
+            return str(self.vector_db_path / "flat")
+        return str(self.vector_db_path / f"flat-{table_name}")
     
     def _init_vector_db(self):
         """Initialize LanceDB connection."""
@@ -185,6 +293,7 @@ class IndexingEngine:
             "python": ["function_definition", "class_definition", "decorated_definition"],
             "javascript": ["function_declaration", "class_declaration", "method_definition", "arrow_function"],
             "typescript": ["function_declaration", "class_declaration", "method_definition", "arrow_function"],
+            "tsx": ["function_declaration", "class_declaration", "method_definition", "arrow_function"],
         }
         
         node_types = meaningful_types.get(language, [])
@@ -196,6 +305,10 @@ class IndexingEngine:
             # Only include if it's large enough
             if end_point[0] - start_point[0] >= self.MIN_CHUNK_LINES:
                 content = source_code[node.start_byte:node.end_byte].decode("utf-8")
+                name_node = node.child_by_field_name("name")
+                if name_node is None and node.type == "decorated_definition":
+                    definition = node.child_by_field_name("definition")
+                    name_node = definition.child_by_field_name("name") if definition else None
                 
                 chunk = CodeChunk(
                     file_path=str(file_path.relative_to(self.workspace_path)),
@@ -207,6 +320,7 @@ class IndexingEngine:
                     metadata={
                         "start_byte": node.start_byte,
                         "end_byte": node.end_byte,
+                        "symbol": name_node.text.decode("utf-8") if name_node else None,
                     }
                 )
                 chunks.append(chunk)
@@ -217,18 +331,73 @@ class IndexingEngine:
         
         return chunks
     
-    def chunk_file(self, file_path: Path) -> List[CodeChunk]:
+    def _extract_module_chunks(
+        self,
+        root: Node,
+        source_code: bytes,
+        file_path: Path,
+        language: str,
+        chunks: List[CodeChunk]
+    ) -> List[CodeChunk]:
+        """
+        Chunk the top-level code between the extracted definitions.
+        
+        Imports, constants, short helpers and entry points are not covered by
+        definition chunks; each contiguous run of such top-level statements
+        becomes one "module" chunk so it can be found as well.
+        """
+        covered = [(c.metadata["start_byte"], c.metadata["end_byte"]) for c in chunks]
+        
+        def is_covered(node):
+            return any(start < node.end_byte and node.start_byte < end for start, end in covered)
+        
+        runs, run = [], []
+        for child in root.children:
+            if is_covered(child):
+                if run:
+                    runs.append(run)
+                run = []
+            else:
+                run.append(child)
+        if run:
+            runs.append(run)
+        
+        module_chunks = []
+        for run in runs:
+            start, end = run[0], run[-1]
+            content = source_code[start.start_byte:end.end_byte].decode("utf-8", errors="replace")
+            if not content.strip():
+                continue
+            module_chunks.append(CodeChunk(
+                file_path=str(file_path.relative_to(self.workspace_path)),
+                content=content,
+                start_line=start.start_point[0] + 1,
+                end_line=end.end_point[0] + 1,
+                node_type="module",
+                language=language,
+                metadata={
+                    "start_byte": start.start_byte,
+                    "end_byte": end.end_byte,
+                    "symbol": None,
+                }
+            ))
+        return module_chunks
+    
+    def chunk_file(self, file_path: Path, source_code: Optional[bytes] = None) -> List[CodeChunk]:
         """Parse a file and extract semantic chunks using tree-sitter."""
         language = self._get_language(file_path)
         if not language or language not in self.parsers:
             return []
         
         try:
-            with open(file_path, "rb") as f:
-                source_code = f.read()
+            if source_code is None:
+                mtime = os.path.getmtime(file_path)
+                with open(file_path, "rb") as f:
+                    source_code = f.read()
+            else:
+                mtime = time.time()
             
-            parser = self.parsers[language]
-            tree = parser.parse(source_code)
+            tree = self.parse_cache.parse(str(file_path), source_code, language)
             
             if tree.root_node:
                 chunks = self._extract_chunks_from_node(
@@ -237,49 +406,53 @@ class IndexingEngine:
                     file_path,
                     language
                 )
+                chunks.extend(self._extract_module_chunks(tree.root_node, source_code, file_path, language, chunks))
+                for chunk in chunks:
+                    chunk.metadata["mtime"] = mtime
                 return chunks
         except Exception as e:
             print(f"Error parsing {file_path}: {e}")
         
         return []
     
-    def generate_embeddings(self, chunks: List[CodeChunk], use_ollama: bool = True) -> List[np.ndarray]:
-        """Generate embeddings for code chunks using Ollama or cloud API."""
-        embeddings = []
+    def notify_file_changed(self, file_path: Path, source_code: Optional[bytes] = None):
+        """
+        Update the cached parse tree of a file whose contents changed.
         
-        if use_ollama:
-            try:
-                import ollama
-                
-                for chunk in chunks:
-                    # Use Ollama to generate embedding
-                    response = ollama.embeddings(
-                        model=self.embedding_model,
-                        prompt=chunk.content
-                    )
-                    embedding = np.array(response["embedding"], dtype=np.float32)
-                    embeddings.append(embedding)
-            except ImportError:
-                print("Warning: ollama not installed, falling back to simple hash-based embeddings")
-                # Fallback: use hash-based pseudo-embeddings (not ideal, but works)
-                for chunk in chunks:
-                    hash_obj = hashlib.sha256(chunk.content.encode())
-                    # Convert hash to numpy array (take first 128 bytes, convert to float32)
-                    hash_bytes = hash_obj.digest()[:128]
-                    # Pad to 384 bytes if needed (384 * 4 bytes per float32 = 1536 bytes, but we only have 128)
-                    # So we'll repeat the hash to fill
-                    while len(hash_bytes) < 1536:  # 384 floats * 4 bytes
-                        hash_bytes += hash_obj.digest()
-                    embedding = np.frombuffer(hash_bytes[:1536], dtype=np.float32)
-                    embeddings.append(embedding[:384])
-        else:
-            # TODO: Add cloud API support (e.g. third-party LLM/embedding providers)
-            raise NotImplementedError("Cloud API embeddings not yet implemented")
-        
-        return embeddings
-    
-    def _create_table_schema(self):
-        """Create the LanceDB table schema."""
+        Called by file watchers and after agent edits so the next chunk_file
+        (or syntax check) only pays for an incremental reparse.
+        """
+        file_path = Path(file_path)
+        language = self._get_language(file_path)
+        if not language or language not in self.parsers:
+            return
+        if source_code is None:
+            if not file_path.exists():
+                self.parse_cache.invalidate(str(file_path))
+                return
+            source_code = file_path.read_bytes()
+        self.parse_cache.update(str(file_path), source_code, language)
+    
+    def generate_embeddings(self, chunks: List[CodeChunk], use_ollama: bool = True) -> List[np.ndarray]:
+        """Generate embeddings for code chunks using Ollama or cloud API (as bulk work)."""
+        EMBEDDED_TEXTS.inc(len(chunks), model=self.embedding_model)
+        return self.embedder.embed(
+            [chunk.content for chunk in chunks],
+            model=self.embedding_model,
+            use_ollama=use_ollama,
+            priority="bulk",
+            key=str(self.workspace_path)
+        )
+    
+    def _create_table_schema(self, dimensions: int, embedding_model: Optional[str] = None):
+        """
+        Create the LanceDB table schema; chunk metadata is stored as typed columns
+        and the embedding model and dimensions as schema metadata.
+        """
+        metadata = {
+            "opencode.embedding_model": embedding_model or self.embedding_model,
+            "opencode.dimensions": str(dimensions),
+        }
         return pa.schema([
             pa.field("id", pa.string()),
             pa.field("file_path", pa.string()),
@@ -288,50 +461,264 @@ class IndexingEngine:
             pa.field("end_line", pa.int32()),
             pa.field("node_type", pa.string()),
             pa.field("language", pa.string()),
-            pa.field("vector", pa.list_(pa.float32())),
-            pa.field("metadata", pa.string()),  # JSON string
-        ])
+            pa.field("vector", pa.list_(pa.float32(), dimensions)),
+            pa.field("token_count", pa.int32()),
+            pa.field("symbol", pa.string()),
+            pa.field("start_byte", pa.int64()),
+            pa.field("end_byte", pa.int64()),
+            pa.field("mtime", pa.float64()),  # File modification time (Unix seconds)
+            # Other places holding a near-duplicate of this chunk
+            pa.field("locations", pa.list_(pa.struct([
+                pa.field("file_path", pa.string()),
+                pa.field("start_line", pa.int32()),
+                pa.field("end_line", pa.int32()),
+            ]))),
+        ], metadata=metadata)
+    
+    def _create_scalar_indexes(self, table=None):
+        """Index the filterable columns so searches can pre-filter on them."""
+        table = table or self.table
+        for column, index_type in INDEXED_COLUMNS.items():
+            try:
+                with warnings.catch_warnings():
+                    # Deprecated in favour of create_index(config=...), which the
+                    # synchronous table API only offers for vector columns
+                    warnings.simplefilter("ignore", DeprecationWarning)
+                    table.create_scalar_index(column, index_type=index_type, replace=True)
+            except Exception as e:
+                print(f"Warning: Could not create {index_type} index on {column}: {e}")
     
     def index(self, use_ollama: bool = True):
         """Main entry point for indexing the entire codebase."""
+        with span("index", workspace=str(self.workspace_path)) as index_span:
+            self._index(use_ollama, index_span)
+    
+    def _index(self, use_ollama: bool, index_span):
         print(f"Indexing workspace: {self.workspace_path}")
         
         # Scan for files
-        files = self.scan_workspace()
+        with span("index.scan"):
+            files = self.scan_workspace()
         print(f"Found {len(files)} files to index")
+        index_span.set("files", len(files))
         
         all_chunks = []
-        all_embeddings = []
         
         # Process each file
         for i, file_path in enumerate(files):
             if (i + 1) % 10 == 0:
                 print(f"Processing file {i + 1}/{len(files)}...")
             
-            chunks = self.chunk_file(file_path)
-            if chunks:
-                embeddings = self.generate_embeddings(chunks, use_ollama=use_ollama)
-                all_chunks.extend(chunks)
-                all_embeddings.extend(embeddings)
+            with span("index.parse"):
+                chunks = self.chunk_file(file_path)
+            INDEXED_FILES.inc()
+            all_chunks.extend(chunks)
         
         print(f"Extracted {len(all_chunks)} chunks")
+        index_span.set("chunks", len(all_chunks))
+        
+        # Embed and store one representative per group of near-duplicates
+        with span("index.dedup", chunks=len(all_chunks)):
+            unique_chunks = self.deduplicate(all_chunks)
+        if len(unique_chunks) < len(all_chunks):
+            print(f"Folded {len(all_chunks) - len(unique_chunks)} near-duplicate chunks")
+        index_span.set("unique_chunks", len(unique_chunks))
+        
+        if unique_chunks:
+            embedding_model = self.embedding_model
+            with span("index.embed", chunks=len(unique_chunks)):
+                embeddings = self.generate_embeddings(unique_chunks, use_ollama=use_ollama)
+            with span("index.store", chunks=len(unique_chunks)), self._write_lock:
+                embeddings = self._current_embeddings(unique_chunks, embeddings, embedding_model, use_ollama)
+                self._store_in_db(unique_chunks, embeddings, replace=True)
+            print(f"Indexed {len(unique_chunks)} chunks in vector database")
+    
+    def update_files(self, changed: List[Path], removed: List[str] = (), use_ollama: bool = True) -> int:
+        """
+        Re-index some files of an existing index.
+        
+        Files sharing a near-duplicate group with them are re-indexed too, so
+        copies folded into a replaced row stay searchable.
+        
+        Args:
+            changed: Changed or new files to re-chunk and embed
+            removed: Workspace-relative paths whose rows are dropped
+            use_ollama: Embed with Ollama (see index())
+        
+        Returns:
+            Number of chunks written
+        """
+        paths = [str(Path(p).relative_to(self.workspace_path)) for p in changed] + list(removed)
+        # Copies folded into the rows being replaced must be stored again
+        changed = list(changed)
+        for file_path in self._duplicate_group_files(paths):
+            paths.append(file_path)
+            if (self.workspace_path / file_path).is_file():
+                changed.append(self.workspace_path / file_path)
+        chunks = []
+        with span("index.parse", files=len(changed)):
+            for file_path in changed:
+                chunks.extend(self.chunk_file(Path(file_path)))
+                INDEXED_FILES.inc()
+        unique_chunks = self.deduplicate(chunks)
+        embedding_model = self.embedding_model
+        embeddings = []
+        if unique_chunks:
+            with span("index.embed", chunks=len(unique_chunks)):
+                embeddings = self.generate_embeddings(unique_chunks, use_ollama=use_ollama)
+        
+        with self._write_lock:
+            table = self._writer()
+            if table is None:
+                raise ValueError("Index not found. Please run index() first.")
+            try:
+                # Bounded IN lists keep the delete predicates small
+                for start in range(0, len(paths), 500):
+                    table.delete(SearchFilters(file_paths=paths[start:start + 500]).to_where())
+                if unique_chunks:
+                    embeddings = self._current_embeddings(unique_chunks, embeddings, embedding_model, use_ollama)
+                    self._store_in_db(unique_chunks, embeddings, files=paths)
+                else:
+                    self._dirty = True
+                    self._publish(files=paths)
+            except Exception:
+                # Readers must not miss the deletes that did happen
+                self._publish()
+                raise
+        return len(unique_chunks)
+    
+    def _duplicate_group_files(self, paths: List[str]) -> List[str]:
+        """
+        Files sharing a near-duplicate group with ``paths``, transitively.
         
-        # Store in vector database
-        if all_chunks:
-            self._store_in_db(all_chunks, all_embeddings)
-            print(f"Indexed {len(all_chunks)} chunks in vector database")
+        Deleting the rows of ``paths`` drops representatives standing in for
+        copies in other files and leaves ``locations`` elsewhere pointing at
+        them; those files are re-indexed along with ``paths``.
+        """
+        table = self.open_table()
+        if "locations" not in table.schema.names:
+            return []
+        rows = (
+            table.search()
+            .select(["file_path", "locations"])
+            .where("array_length(locations) > 0")
+            .limit(None)
+            .to_arrow()
+            .to_pylist()
+        )
+        groups = [
+            {row["file_path"]} | {location["file_path"] for location in row["locations"]}
+            for row in rows
+        ]
+        found = set(paths)
+        grown = True
+        while grown:
+            grown = False
+            for group in groups:
+                if not group <= found and group & found:
+                    found |= group
+                    grown = True
+        return sorted(found - set(paths))
+    
+    def _current_embeddings(
+        self,
+        chunks: List[CodeChunk],
+        embeddings: List[np.ndarray],
+        embedding_model: str,
+        use_ollama: bool
+    ) -> List[np.ndarray]:
+        # Caller holds the write lock; a migration may have switched models
+        # while ``embeddings`` were computed with ``embedding_model``
+        if embedding_model == self.embedding_model:
+            return embeddings
+        return self.generate_embeddings(chunks, use_ollama=use_ollama)
+    
+    def replace_table(self, data: pa.Table):
+        """Replace the whole index with ``data`` (rows of another ``code_index`` table)."""
+        with self._write_lock:
+            self.table = self.db.create_table(self.table_name, data, schema=data.schema, mode="overwrite")
+            self._create_scalar_indexes()
+            self._save_state(data.schema.field("vector").type.list_size)
+            self._dirty = True
+            self._publish()
+    
+    def export_artifact(self, path: str, commit: Optional[str] = None) -> Dict:
+        """
+        Write the index to a portable artifact tied to ``commit`` (HEAD by default).
+        
+        Returns:
+            The artifact manifest (see core.indexer.artifacts)
+        """
+        with span("index.export"):
+            return export_index(self, path, commit=commit)
+    
+    def import_artifact(self, path: str, use_ollama: bool = True) -> Dict:
+        """
+        Replace the index with an artifact and re-index only the files that
+        differ from the artifact's commit.
+        
+        Raises:
+            ValueError: The artifact is invalid or uses another embedding model
+        """
+        with span("index.import"):
+            return import_index(self, path, use_ollama=use_ollama)
+    
+    def deduplicate(self, chunks: List[CodeChunk]) -> List[CodeChunk]:
+        """
+        Fold near-duplicate chunks into one representative each.
+        
+        The first chunk of a group (in scan order) is kept; the locations of
+        the others are listed in its ``metadata["locations"]``.
+        
+        Returns:
+            The representatives, in their original order
+        """
+        if self.DEDUP_THRESHOLD is None or len(chunks) < 2:
+            return list(chunks)
+        by_language: Dict[str, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            by_language.setdefault(chunk.language, []).append(i)
+        
+        keep = []
+        for indices in by_language.values():
+            groups = group_near_duplicates([chunks[i].content for i in indices], threshold=self.DEDUP_THRESHOLD)
+            for group in groups:
+                representative = chunks[indices[group[0]]]
+                representative.metadata["locations"] = [
+                    {
+                        "file_path": chunks[indices[j]].file_path,
+                        "start_line": chunks[indices[j]].start_line,
+                        "end_line": chunks[indices[j]].end_line,
+                    }
+                    for j in group[1:]
+                ]
+                keep.append(indices[group[0]])
+        DUPLICATE_CHUNKS.inc(len(chunks) - len(keep))
+        return [chunks[i] for i in sorted(keep)]
     
-    def _store_in_db(self, chunks: List[CodeChunk], embeddings: List[np.ndarray]):
-        """Store chunks and embeddings in LanceDB."""
-        import json
+    def _store_in_db(
+        self,
+        chunks: List[CodeChunk],
+        embeddings: List[np.ndarray],
+        replace: bool = False,
+        files: Optional[List[str]] = None
+    ):
+        """
+        Store chunks and embeddings in LanceDB; ``replace`` overwrites the previous index.
         
+        ``files`` lists every file whose rows changed since the last publish,
+        when known, so the in-memory matrix is patched instead of rebuilt.
+        """
         # Prepare data
         data = []
+        total_tokens = 0
         for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
             chunk_id = hashlib.sha256(
                 f"{chunk.file_path}:{chunk.start_line}:{chunk.end_line}".encode()
             ).hexdigest()
             
+            token_count = count_tokens(chunk.content)
+            total_tokens += token_count
             data.append({
                 "id": chunk_id,
                 "file_path": chunk.file_path,
@@ -341,36 +728,487 @@ class IndexingEngine:
                 "node_type": chunk.node_type,
                 "language": chunk.language,
                 "vector": embedding.tolist(),
-                "metadata": json.dumps(chunk.metadata),
+                "token_count": token_count,
+                "symbol": chunk.metadata.get("symbol"),
+                "start_byte": chunk.metadata.get("start_byte"),
+                "end_byte": chunk.metadata.get("end_byte"),
+                "mtime": chunk.metadata.get("mtime"),
+                "locations": chunk.metadata.get("locations") or [],
             })
         
-        # Create or update table
-        if self.table is None:
-            self.table = self.db.create_table("code_index", data)
-        else:
-            self.table.add(data)
+        # Create or update table (engines are reused, so a full re-index replaces the table).
+        # Readers keep using the previous snapshot until every write is done.
+        with self._write_lock:
+            table = None if replace else self._writer()
+            if table is None:
+                schema = self._create_table_schema(len(data[0]["vector"]))
+                self.table = self.db.create_table(self.table_name, data, schema=schema, mode="overwrite")
+                self._create_scalar_indexes()
+                self._save_state(len(data[0]["vector"]))
+            else:
+                table.add(data)
+            self._dirty = True
+            self._publish(files=None if replace else files)
+        INDEXED_CHUNKS.inc(len(data))
+        INDEXED_TOKENS.inc(total_tokens)
+        self.maybe_optimize()
     
-    def search(self, query: str, top_k: int = 10) -> List[Dict]:
-        """Search for similar code chunks."""
+    def _writer(self):
+        # Latest version of the table for writing, or None if it does not exist
         if self.table is None:
-            # Try to open existing table
             try:
-                self.table = self.db.open_table("code_index")
+                self.table = self.db.open_table(self.table_name)
             except Exception:
+                return None
+        return self.table
+    
+    def _publish(self, files: Optional[List[str]] = None):
+        """
+        Point readers at the table's current version.
+        
+        Args:
+            files: Every file whose rows changed since the previous publish
+                (empty if no rows changed), or None if unknown
+        """
+        previous = self._snapshot
+        snapshot = self.db.open_table(self.table_name)
+        snapshot.checkout(self.table.version)
+        self._snapshot = snapshot
+        if self._hierarchy is not None:
+            self._hierarchy_changes.append((
+                previous.version if previous is not None else None,
+                snapshot.version,
+                files if previous is not None else None,
+            ))
+        self._sync_flat(snapshot, files if previous is not None else None, previous)
+    
+    def _sync_flat(self, snapshot, files: Optional[List[str]] = None, previous=None):
+        # Bring the in-memory matrix to the snapshot's version (or drop it)
+        if self.search_backend == "lancedb":
+            return
+        version = snapshot.version
+        if self.flat.is_current(version):
+            return
+        try:
+            if self.search_backend == "auto" and snapshot.count_rows() > self.FLAT_MAX_ROWS:
+                self.flat = FlatIndex(str(self.flat.path), dtype=self.flat.dtype.name)
+                return
+            if files is not None and previous is not None and self.flat.is_current(previous.version):
+                with span("index.flat", version=version, files=len(files)):
+                    if self.flat.update(snapshot, version, files):
+                        return
+            if not (self.flat.load() and self.flat.is_current(version)):
+                with span("index.flat", version=version):
+                    self.flat.build(snapshot, version)
+        except Exception as e:
+            print(f"Warning: Could not build in-memory index, using LanceDB: {e}")
+    
+    def _flat_for(self, filters: Optional[SearchFilters]) -> Optional[FlatIndex]:
+        # The flat index answers unfiltered searches of the current snapshot
+        if filters is not None and not filters.is_empty():
+            return None
+        flat = self.flat
+        if self._snapshot is None or not flat.is_current(self._snapshot.version):
+            return None
+        return flat
+    
+    def hierarchy(self) -> HierarchyIndex:
+        """
+        File and directory summary vectors of the read snapshot, pooled on first use.
+        
+        After writes whose changed files are known, only those files are
+        re-pooled; otherwise every vector is read again.
+        """
+        snapshot = self.open_table()
+        hierarchy = self._hierarchy
+        if hierarchy is not None and hierarchy.version == snapshot.version:
+            return hierarchy
+        files = self._hierarchy_files(hierarchy, snapshot.version) if hierarchy is not None else None
+        with span("index.hierarchy", version=snapshot.version):
+            flat = self._flat_for(None)
+            if files is not None:
+                hierarchy = hierarchy.update(snapshot, snapshot.version, files)
+            elif flat is not None:
+                hierarchy = HierarchyIndex(flat.rows.column("file_path").to_pylist(), flat.vectors, flat.version)
+            else:
+                hierarchy = HierarchyIndex.from_table(snapshot, snapshot.version)
+        self._hierarchy = hierarchy
+        self._hierarchy_changes = [
+            change for change in self._hierarchy_changes
+            if change[0] is not None and change[0] >= hierarchy.version
+        ]
+        return hierarchy
+    
+    def _hierarchy_files(self, hierarchy: HierarchyIndex, version: int) -> Optional[List[str]]:
+        # Files changed from the summaries' version to ``version``, or None if unknown
+        steps = {start: (end, files) for start, end, files in list(self._hierarchy_changes) if start is not None}
+        current = hierarchy.version
+        changed = set()
+        for _ in range(len(steps)):
+            if current == version:
+                break
+            step = steps.get(current)
+            if step is None or step[1] is None:
+                return None
+            current, files = step
+            changed.update(files)
+        return sorted(changed) if current == version else None
+    
+    def _use_hierarchy(self, hierarchical: Optional[bool], filters: Optional[SearchFilters]) -> bool:
+        # Explicit filters already scope the search; narrowing again could empty it
+        if filters is not None and not filters.is_empty():
+            return False
+        if hierarchical is not None:
+            return hierarchical
+        flat = self._flat_for(None)
+        rows = len(flat) if flat is not None else self.open_table().count_rows()
+        return rows >= self.HIERARCHY_MIN_ROWS
+    
+    def _narrow(self, query_embedding: np.ndarray, top_k: int) -> List[str]:
+        hierarchy = self.hierarchy()
+        with span("search.narrow", files=len(hierarchy.files)):
+            return hierarchy.narrow(
+                query_embedding,
+                files=max(self.HIERARCHY_FILES, top_k),
+                directories=self.HIERARCHY_DIRECTORIES
+            )
+    
+    @property
+    def read_version(self) -> Optional[int]:
+        """Table version searches currently read, or None before the first read."""
+        return self._snapshot.version if self._snapshot is not None else None
+    
+    def open_table(self):
+        """
+        Return the read snapshot of the index, raising ValueError if it was never built.
+        
+        The snapshot is pinned at the version of the last completed write, so a
+        re-index or compaction running in the background is never seen half done.
+        """
+        if self._snapshot is None:
+            with self._write_lock:
+                if self._snapshot is None:
+                    if self._writer() is None:
+                        raise ValueError("Index not found. Please run index() first.")
+                    self._publish()
+        return self._snapshot
+    
+    def index_stats(self) -> Dict:
+        """Fragment, version and scalar index coverage statistics of the index."""
+        table = self.open_table()
+        stats = table.stats()
+        fragments = stats.get("fragment_stats", {})
+        indices = {}
+        for index in table.list_indices():
+            indexed = index.num_indexed_rows or 0
+            unindexed = index.num_unindexed_rows or 0
+            indices[index.columns[0] if index.columns else index.name] = {
+                "type": str(index.index_type),
+                "indexed_rows": indexed,
+                "unindexed_rows": unindexed,
+                "coverage": indexed / (indexed + unindexed) if indexed + unindexed else 1.0,
+            }
+        return {
+            "rows": stats.get("num_rows"),
+            "bytes": stats.get("total_bytes"),
+            "read_version": self.read_version,
+            "latest_version": self.table.version if self.table is not None else self.read_version,
+            "fragments": fragments.get("num_fragments"),
+            "small_fragments": fragments.get("num_small_fragments"),
+            "indices": indices,
+            "embedding_model": self.embedding_model,
+            "dimensions": self.state.dimensions,
+            "migration": self.migration_status(),
+        }
+    
+    def optimize(self, cleanup_older_than: Optional[timedelta] = None) -> Dict:
+        """
+        Compact small fragments, drop deleted rows, update scalar indexes and
+        remove versions older than ``cleanup_older_than``.
+        
+        Returns:
+            index_stats() after maintenance
+        """
+        with self._write_lock:
+            table = self._writer()
+            if table is None:
                 raise ValueError("Index not found. Please run index() first.")
+            with span("index.optimize"):
+                table.optimize(cleanup_older_than=cleanup_older_than or self.CLEANUP_OLDER_THAN)
+                self._drop_retired_tables()
+            self._dirty = False
+            self._last_optimized = time.monotonic()
+            # Compaction rewrites fragments, not rows
+            self._publish(files=[])
+        return self.index_stats()
+    
+    def maybe_optimize(self) -> bool:
+        """Run optimize() if enough small fragments or time accumulated since the last writes."""
+        if not self._dirty or self.table is None:
+            return False
+        due = time.monotonic() - self._last_optimized >= self.OPTIMIZE_INTERVAL_SECONDS
+        if not due:
+            fragments = self.table.stats().get("fragment_stats", {})
+            due = (fragments.get("num_small_fragments") or 0) >= self.OPTIMIZE_SMALL_FRAGMENTS
+        if not due:
+            return False
+        try:
+            self.optimize()
+        except Exception as e:
+            print(f"Warning: Index maintenance failed for {self.workspace_path}: {e}")
+            return False
+        return True
+    
+    def _save_state(self, dimensions: Optional[int] = None):
+        # Caller holds self._write_lock
+        self.state.table = self.table_name
+        self.state.embedding_model = self.embedding_model
+        if dimensions is not None:
+            self.state.dimensions = dimensions
+        self.state.save(self.vector_db_path)
+    
+    def _dimensions_of(self, embedding_model: str) -> int:
+        return len(self.embedder.embed(["dimension probe"], model=embedding_model)[0])
+    
+    @property
+    def pending_model(self) -> Optional[str]:
+        """Model of a migration that is recorded but not yet complete."""
+        return self.state.migration["embedding_model"] if self.state.migration else None
+    
+    def migrate_embedding_model(
+        self,
+        embedding_model: str,
+        background: bool = True,
+        use_ollama: bool = True
+    ) -> Optional[EmbeddingMigration]:
+        """
+        Switch the index to another embedding model without search downtime.
+        
+        Rows are re-embedded into a shadow table in throttled batches
+        (MIGRATION_BATCH_SIZE rows, MIGRATION_PAUSE_SECONDS apart) while
+        searches keep using the current table and model; the engine switches to
+        the shadow table atomically once it is complete. An interrupted
+        migration to the same model resumes from the rows already embedded.
         
-        # Generate query embedding
-        query_chunk = CodeChunk(
-            file_path="query",
-            content=query,
-            start_line=0,
-            end_line=0,
-            node_type="query",
-            language="query"
+        Args:
+            embedding_model: New embedding model
+            background: Run in a background thread (otherwise block until done)
+            use_ollama: Embed with Ollama (see index())
+        
+        Returns:
+            The migration, or None if the index already uses the model or does
+            not exist yet (then the model is simply adopted)
+        """
+        with self._write_lock:
+            current = self.migration
+            if current is not None and current.model == embedding_model and current.state in ("pending", "running"):
+                return current
+            if current is not None:
+                current.stop(wait=False)
+            if embedding_model == self.embedding_model:
+                if self.state.migration:
+                    self._drop_table(self.state.migration["table"])
+                    self.state.migration = None
+                    self.state.save(self.vector_db_path)
+                return None
+            if self._writer() is None:
+                self.embedding_model = embedding_model
+                return None
+            
+            pending = self.state.migration
+            if pending and pending["embedding_model"] == embedding_model:
+                table_name = pending["table"]
+            else:
+                if pending:
+                    self._drop_table(pending["table"])
+                table_name = shadow_table_name(embedding_model)
+                self.state.migration = {"table": table_name, "embedding_model": embedding_model}
+                self.state.save(self.vector_db_path)
+            self.migration = EmbeddingMigration(
+                self,
+                embedding_model,
+                table_name,
+                batch_size=self.MIGRATION_BATCH_SIZE,
+                pause_seconds=self.MIGRATION_PAUSE_SECONDS,
+                use_ollama=use_ollama
+            )
+        if background:
+            return self.migration.start()
+        self.migration.run()
+        return self.migration
+    
+    def migration_status(self) -> Optional[Dict]:
+        """Progress of the current or last migration, or None."""
+        if self.migration is not None:
+            return self.migration.status()
+        if self.state.migration:
+            return dict(self.state.migration, state="paused")
+        return None
+    
+    def _cut_over(self, table, table_name: str, embedding_model: str):
+        """Make a fully migrated table the active one (caller holds the write lock)."""
+        self._create_scalar_indexes(table)
+        self.state.retired.append(self.table_name)
+        self.state.migration = None
+        self.table = table
+        self.table_name = table_name
+        self.embedding_model = embedding_model
+        self._save_state(table.schema.field("vector").type.list_size)
+        self.flat = FlatIndex(self._flat_path(table_name), dtype=self.flat.dtype.name)
+        self._hierarchy = None
+        self._hierarchy_changes = []
+        self._dirty = True
+        self._publish()
+    
+    def _drop_table(self, table_name: str):
+        try:
+            self.db.drop_table(table_name)
+        except Exception:
+            pass
+        shutil.rmtree(self._flat_path(table_name), ignore_errors=True)
+    
+    def _drop_retired_tables(self):
+        # Readers finish with a retired table long before the next maintenance run
+        for table_name in self.state.retired:
+            if table_name != self.table_name:
+                self._drop_table(table_name)
+        if self.state.retired:
+            self.state.retired = []
+            self.state.save(self.vector_db_path)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query with this engine's embedding model."""
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Embed several search queries in one batched call."""
+        EMBEDDED_TEXTS.inc(len(queries), model=self.embedding_model)
+        with span("search.embed", queries=len(queries)):
+            return self.embedder.embed(queries, model=self.embedding_model, key=str(self.workspace_path))
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        filters: Optional[SearchFilters] = None,
+        rerank: bool = True,
+        hierarchical: Optional[bool] = None
+    ) -> List[Dict]:
+        """
+        Search for similar code chunks.
+        
+        Args:
+            query: Natural-language or code query
+            top_k: Number of hits to return
+            filters: Restrict the search to a language, node type, path or
+                modification time; applied before the vector search
+            rerank: Rescore a larger candidate pool with the engine's reranker, if any
+            hierarchical: Search only the chunks of the files whose summary
+                vectors best match the query (default: only for large indexes)
+        """
+        self.open_table()
+        SEARCHES.inc()
+        query_embedding = self.embed_query(query)
+        if not (rerank and self.reranker):
+            return self.search_vector(query_embedding, top_k=top_k, filters=filters, hierarchical=hierarchical)
+        
+        candidates = self.search_vector(
+            query_embedding, top_k=self.reranker.candidate_count(top_k), filters=filters, hierarchical=hierarchical
         )
-        query_embedding = self.generate_embeddings([query_chunk])[0]
+        with span("search.rerank", candidates=len(candidates)):
+            return self.reranker.rerank(query, candidates, top_k)
+    
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 10,
+        filters: Optional[SearchFilters] = None,
+        rerank: bool = True,
+        hierarchical: Optional[bool] = None
+    ) -> List[List[Dict]]:
+        """
+        Search for several queries at once.
+        
+        All queries are embedded in one batched call and searched with one
+        multi-vector query, so ten sub-queries cost about as much as one.
+        
+        Returns:
+            One result list per query, in query order
+        """
+        if not queries:
+            return []
+        self.open_table()
+        SEARCHES.inc(len(queries))
+        embeddings = self.embed_queries(queries)
+        if not (rerank and self.reranker):
+            return self.search_vectors(embeddings, top_k=top_k, filters=filters, hierarchical=hierarchical)
         
-        # Search
-        results = self.table.search(query_embedding).limit(top_k).to_pandas()
+        pools = self.search_vectors(
+            embeddings, top_k=self.reranker.candidate_count(top_k), filters=filters, hierarchical=hierarchical
+        )
+        with span("search.rerank", queries=len(queries)):
+            return [self.reranker.rerank(query, pool, top_k) for query, pool in zip(queries, pools)]
+    
+    def _query(self, query_embedding, top_k: int, filters: Optional[SearchFilters]):
+        table = self.open_table()
+        # Hits have the same columns as those of the flat index: no vectors
+        columns = [name for name in table.schema.names if name != "vector"]
+        query = table.search(query_embedding).select(columns).limit(top_k)
+        where = filters.to_where() if filters else None
+        if where:
+            query = query.where(where, prefilter=True)
+        return query
+    
+    def search_vector(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 10,
+        filters: Optional[SearchFilters] = None,
+        hierarchical: Optional[bool] = None
+    ) -> List[Dict]:
+        """Search for the chunks nearest to an already computed query embedding."""
+        self.open_table()
+        if self._use_hierarchy(hierarchical, filters):
+            files = self._narrow(query_embedding, top_k)
+            flat = self._flat_for(None)
+            if flat is not None:
+                with span("search.query", top_k=top_k, backend="flat", files=len(files)):
+                    hits = flat.search(query_embedding, top_k=top_k, rows=flat.rows_for_files(files))
+                    return flat.fetch_rows(self._snapshot, hits)
+            filters = replace(filters or SearchFilters(), file_paths=files)
+        flat = self._flat_for(filters)
+        if flat is not None:
+            with span("search.query", top_k=top_k, backend="flat"):
+                return flat.fetch_rows(self._snapshot, flat.search(query_embedding, top_k=top_k))
+        with span("search.query", top_k=top_k, filtered=bool(filters and not filters.is_empty())):
+            return self._query(query_embedding, top_k, filters).to_list()
+    
+    def search_vectors(
+        self,
+        query_embeddings: List[np.ndarray],
+        top_k: int = 10,
+        filters: Optional[SearchFilters] = None,
+        hierarchical: Optional[bool] = None
+    ) -> List[List[Dict]]:
+        """Search for several query embeddings with one multi-vector query."""
+        if len(query_embeddings) == 1 or self._use_hierarchy(hierarchical, filters):
+            # Every query narrows to its own files
+            return [
+                self.search_vector(embedding, top_k=top_k, filters=filters, hierarchical=hierarchical)
+                for embedding in query_embeddings
+            ]
+        self.open_table()
+        flat = self._flat_for(filters)
+        if flat is not None:
+            with span("search.query", top_k=top_k, queries=len(query_embeddings), backend="flat"):
+                grouped = flat.search_many(query_embeddings, top_k=top_k)
+                flat.fetch_rows(self._snapshot, [hit for hits in grouped for hit in hits])
+                return grouped
+        with span("search.query", top_k=top_k, queries=len(query_embeddings)):
+            hits = self._query(list(query_embeddings), top_k, filters).to_list()
         
-        return results.to_dict("records")
+        # LanceDB returns the hits of all queries together, tagged by query_index
+        grouped = [[] for _ in query_embeddings]
+        for hit in hits:
+            grouped[hit.pop("query_index")].append(hit)
+        return grouped
@@ -0,0 +1,218 @@
+"""
+Federated search over the indexes of many workspaces.
+
+``federated_search`` embeds the query once per embedding model, searches every
+workspace index concurrently with that vector and merges the hits into one
+ranking, tagging each hit with the repository it came from. Latency therefore
+stays close to that of the slowest single index rather than their sum.
+
+``SharedIndex`` is the alternative for large fleets: one LanceDB table holding
+the chunks of many repositories, partitioned by a ``repo`` column, searched
+with a single query and an optional repo filter. Repositories may use different
+embedding models of the same dimensions; a query only matches rows embedded
+with its own model.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import lancedb
+import pyarrow as pa
+
+from core.indexer.engine import IndexingEngine
+from core.indexer.filters import SearchFilters
+from core.telemetry import span
+
+# Upper bound on concurrent index searches per federated query
+MAX_WORKERS = 16
+
+NORMALIZATIONS = ("distance", "minmax")
+
+
+def _score(hit: Dict) -> float:
+    # Similarity in (0, 1] from the vector distance, comparable across indexes
+    # built with the same embedding model
+    return 1.0 / (1.0 + max(float(hit.get("_distance", 0.0)), 0.0))
+
+
+def _minmax(hits: List[Dict]):
+    scores = [hit["score"] for hit in hits]
+    low, high = min(scores), max(scores)
+    for hit in hits:
+        hit["score"] = 1.0 if high == low else (hit["score"] - low) / (high - low)
+
+
+def merge_results(results: Dict[str, List[Dict]], top_k: int, normalize: str = "distance") -> List[Dict]:
+    """
+    Merge per-repository hits into one ranking.
+
+    Args:
+        results: Hits of each repository, best first
+        top_k: Number of hits to return
+        normalize: "distance" scores every hit from its vector distance;
+            "minmax" rescales each repository's scores to [0, 1] first, for
+            indexes whose distances are not comparable (different models)
+
+    Returns:
+        Hits with "repo" and "score" keys, highest score first
+    """
+    if normalize not in NORMALIZATIONS:
+        raise ValueError(f"Unknown normalization: {normalize}")
+
+    merged = []
+    for repo, hits in results.items():
+        tagged = [dict(hit, repo=repo, score=_score(hit)) for hit in hits]
+        if normalize == "minmax" and tagged:
+            _minmax(tagged)
+        merged.extend(tagged)
+
+    merged.sort(key=lambda hit: hit["score"], reverse=True)
+    return merged[:top_k]
+
+
+def federated_search(
+    engines: Dict[str, IndexingEngine],
+    query: str,
+    top_k: int = 10,
+    normalize: Optional[str] = None,
+    filters: Optional[SearchFilters] = None,
+) -> Dict:
+    """
+    Search many workspace indexes with one query.
+
+    Args:
+        engines: Indexing engines keyed by repository name
+        query: Natural-language or code query
+        top_k: Number of merged hits to return (and fetched per repository)
+        normalize: Score normalization (see ``merge_results``); defaults to
+            "distance" when all engines share an embedding model, else "minmax"
+        filters: Metadata pre-filters applied in every index
+
+    Returns:
+        Dict with the merged "results" and per-repository "errors"
+    """
+    with span("search.federated", repos=len(engines), top_k=top_k):
+        # Embed the query once per embedding model
+        vectors = {}
+        for repo, engine in engines.items():
+            if engine.embedding_model not in vectors:
+                vectors[engine.embedding_model] = engine.embed_query(query)
+
+        def search_one(item):
+            repo, engine = item
+            return repo, engine.search_vector(vectors[engine.embedding_model], top_k=top_k, filters=filters)
+
+        results = {}
+        errors = {}
+        workers = max(1, min(MAX_WORKERS, len(engines)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="opencode-federated") as pool:
+            futures = {pool.submit(search_one, item): item[0] for item in engines.items()}
+            for future, repo in futures.items():
+                try:
+                    results[repo] = future.result()[1]
+                except Exception as e:
+                    # A missing or broken index must not fail the whole query
+                    errors[repo] = str(e)
+
+        if normalize is None:
+            normalize = "distance" if len(vectors) <= 1 else "minmax"
+        return {
+            "results": merge_results(results, top_k, normalize=normalize),
+            "errors": errors,
+            "normalize": normalize,
+        }
+
+
+class SharedIndex:
+    """
+    One LanceDB table with the chunks of many repositories.
+
+    Rows carry a ``repo`` column; ``sync`` replaces one repository's partition
+    with the current contents of its workspace index.
+
+    Args:
+        db_path: Directory of the shared LanceDB database
+    """
+
+    TABLE_NAME = "code_index_shared"
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        self.db = lancedb.connect(str(self.db_path))
+        self.table = None
+
+    def _open_table(self):
+        if self.table is None:
+            try:
+                self.table = self.db.open_table(self.TABLE_NAME)
+            except Exception:
+                raise ValueError("Shared index not found. Sync a workspace first.")
+        return self.table
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
+
+    def sync(self, repo: str, engine: IndexingEngine) -> int:
+        """
+        Replace ``repo``'s rows with the contents of ``engine``'s index.
+
+        Returns:
+            Number of rows written
+        """
+        source = engine.open_table().to_arrow()
+        data = source.append_column("repo", pa.array([repo] * source.num_rows, pa.string()))
+        data = data.append_column("embedding_model", pa.array([engine.embedding_model] * source.num_rows, pa.string()))
+
+        try:
+            table = self._open_table()
+        except ValueError:
+            self.table = self.db.create_table(self.TABLE_NAME, data)
+            return data.num_rows
+
+        dimensions = table.schema.field("vector").type.list_size
+        if data.num_rows and data.schema.field("vector").type.list_size != dimensions:
+            raise ValueError(
+                f"{repo} uses {engine.embedding_model} with {data.schema.field('vector').type.list_size} "
+                f"dimensions; the shared index holds {dimensions}-dimensional vectors"
+            )
+        table.delete(f"repo = {self._quote(repo)}")
+        if data.num_rows:
+            table.add(data)
+        return data.num_rows
+
+    def repos(self) -> List[str]:
+        table = self._open_table()
+        return sorted(set(table.to_arrow().column("repo").to_pylist()))
+
+    def search(
+        self,
+        query_vector,
+        top_k: int = 10,
+        repos: Optional[List[str]] = None,
+        filters: Optional[SearchFilters] = None,
+        embedding_model: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Search the shared table, optionally restricted to some repositories.
+
+        Rows embedded with another model than ``embedding_model`` (the query
+        vector's) are skipped: their distances are not comparable.
+        """
+        table = self._open_table()
+        clauses = []
+        if embedding_model:
+            clauses.append(f"embedding_model = {self._quote(embedding_model)}")
+        if repos:
+            clauses.append("repo IN (" + ", ".join(self._quote(repo) for repo in repos) + ")")
+        if filters and filters.to_where():
+            clauses.append(filters.to_where())
+        with span("search.shared", top_k=top_k):
+            query = table.search(query_vector).limit(top_k)
+            if clauses:
+                query = query.where(" AND ".join(clauses), prefilter=True)
+            hits = query.to_list()
+        for hit in hits:
+            hit["score"] = _score(hit)
+        return hits
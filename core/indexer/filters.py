@@ -0,0 +1,117 @@
+"""
+Metadata filters for index searches.
+
+``SearchFilters`` is translated into a SQL predicate that LanceDB applies as a
+pre-filter, before the vector search, using the scalar indexes built on the
+filtered columns. A scoped search therefore returns ``top_k`` hits from the
+scope instead of post-filtering the global top-k down to (often) nothing.
+"""
+from dataclasses import dataclass, fields
+from typing import List, Optional, Union
+
+# Columns with scalar indexes and their LanceDB index types
+INDEXED_COLUMNS = {
+    "language": "BITMAP",
+    "node_type": "BITMAP",
+    "file_path": "BTREE",
+    "mtime": "BTREE",
+    "id": "BTREE",
+}
+
+
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _as_list(value: Union[str, List[str]]) -> List[str]:
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _glob_part_to_like(pattern: str) -> str:
+    out = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "*":
+            while i + 1 < len(pattern) and pattern[i + 1] == "*":
+                i += 1
+            out.append("%")
+        elif char == "?":
+            out.append("_")
+        else:
+            out.append(_like_escape(char))
+        i += 1
+    return "".join(out)
+
+
+def glob_to_like(pattern: str) -> List[str]:
+    """
+    Translate a path glob into SQL LIKE patterns, of which any may match.
+
+    ``*`` and ``**`` match any characters (including ``/``), ``?`` matches one
+    character; everything else is literal. ``**/`` matches zero or more
+    directories, so each one yields a pattern without it and one with ``%/``.
+    """
+    parts = pattern.split("**/")
+    patterns = [_glob_part_to_like(parts[0])]
+    for part in parts[1:]:
+        tail = _glob_part_to_like(part)
+        patterns = [head + directories + tail for head in patterns for directories in ("", "%/")]
+    return list(dict.fromkeys(patterns))
+
+
+@dataclass
+class SearchFilters:
+    """
+    Restricts a search to part of the index.
+
+    Attributes:
+        language: Language name(s), e.g. "typescript"
+        node_type: Node type(s), e.g. "function_definition"
+        path_prefix: Workspace-relative directory or path prefix, e.g. "src/payments"
+        path_glob: Workspace-relative glob, e.g. "src/**/*.ts"
+        modified_since: Only files modified at or after this Unix timestamp
+        file_paths: Only these workspace-relative files
+        ids: Only these chunk ids
+    """
+    language: Optional[Union[str, List[str]]] = None
+    node_type: Optional[Union[str, List[str]]] = None
+    path_prefix: Optional[str] = None
+    path_glob: Optional[str] = None
+    modified_since: Optional[float] = None
+    file_paths: Optional[List[str]] = None
+    ids: Optional[List[str]] = None
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) in (None, "", []) for f in fields(self))
+
+    def to_where(self) -> Optional[str]:
+        """SQL predicate for LanceDB, or None if nothing is filtered."""
+        clauses = []
+        for column in ("language", "node_type"):
+            value = getattr(self, column)
+            if value:
+                values = _as_list(value)
+                if len(values) == 1:
+                    clauses.append(f"{column} = {_quote(values[0])}")
+                else:
+                    clauses.append(f"{column} IN ({', '.join(_quote(v) for v in values)})")
+        if self.path_prefix:
+            prefix = self.path_prefix.replace("\\", "/")
+            if prefix.startswith("./"):
+                prefix = prefix[2:]
+            clauses.append(f"file_path LIKE {_quote(_like_escape(prefix) + '%')} ESCAPE '\\'")
+        if self.path_glob:
+            likes = [f"file_path LIKE {_quote(like)} ESCAPE '\\'" for like in glob_to_like(self.path_glob)]
+            clauses.append(likes[0] if len(likes) == 1 else "(" + " OR ".join(likes) + ")")
+        if self.modified_since is not None:
+            clauses.append(f"mtime >= {float(self.modified_since)!r}")
+        if self.file_paths:
+            clauses.append(f"file_path IN ({', '.join(_quote(path) for path in self.file_paths)})")
+        if self.ids:
+            clauses.append(f"id IN ({', '.join(_quote(i) for i in self.ids)})")
+        return " AND ".join(clauses) if clauses else None
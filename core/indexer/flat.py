@@ -0,0 +1,229 @@
+"""
+In-process flat vector search for small and medium indexes.
+
+``FlatIndex`` keeps the L2-normalised chunk vectors of a ``code_index`` table
+version in one contiguous NumPy matrix and their ids and file paths in an
+Arrow IPC file, both memory-mapped from disk so every worker process shares
+the same pages. A query is one matrix-vector product plus ``argpartition``; a
+batch of queries is one matrix-matrix product. Hits carry the id, file path
+and distance; ``fetch_rows`` completes them from the table.
+
+Each table version is written to its own directory and ``CURRENT`` is switched
+atomically, so readers of an older version keep working while it is replaced.
+A write that only touched some files patches the previous version's matrix
+instead of reading the whole table again.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from core.indexer.filters import SearchFilters
+
+CURRENT_FILE = "CURRENT"
+# Columns kept next to the vectors; the others are read per hit
+COLUMNS = ("id", "file_path")
+# Bounded IN lists keep the predicates small
+IN_LIST_SIZE = 500
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale the vectors along the last axis to unit length (zero vectors stay zero)."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class FlatIndex:
+    """
+    Memory-mapped matrix of normalised vectors for one table version.
+
+    Args:
+        path: Directory holding the versioned matrices
+        dtype: "float32", or "float16" to halve memory at some cost in speed
+    """
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.version: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.rows: Optional[pa.Table] = None
+
+    def __len__(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def is_current(self, version: int) -> bool:
+        return self.vectors is not None and self.version == version
+
+    def load(self) -> bool:
+        """Map the current version from disk; returns False if there is none."""
+        try:
+            version = int((self.path / CURRENT_FILE).read_text().strip())
+            directory = self.path / f"v{version}"
+            vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+            rows = pa.ipc.open_file(pa.memory_map(str(directory / "rows.arrow"))).read_all()
+        except (OSError, ValueError):
+            return False
+        if vectors.dtype != self.dtype:
+            return False
+        self.vectors, self.rows, self.version = vectors, rows, version
+        return True
+
+    @staticmethod
+    def _read(table, where: Optional[str] = None) -> pa.Table:
+        # Only the kept columns and the vectors, never the chunk content
+        columns = [name for name in COLUMNS if name in table.schema.names] + ["vector"]
+        query = table.search().select(columns)
+        if where:
+            query = query.where(where)
+        return query.limit(None).to_arrow()
+
+    def _matrix(self, data: pa.Table) -> np.ndarray:
+        vector_column = data.column("vector").combine_chunks()
+        dimensions = vector_column.type.list_size if pa.types.is_fixed_size_list(vector_column.type) else None
+        flat_values = vector_column.flatten().to_numpy(zero_copy_only=False).astype(np.float32)
+        if dimensions is None:
+            dimensions = len(flat_values) // max(len(data), 1)
+        return normalize(flat_values.reshape(len(data), dimensions)).astype(self.dtype)
+
+    def build(self, table, version: int):
+        """
+        Write the matrix for ``version`` of a LanceDB table and map it.
+
+        Args:
+            table: LanceDB table (checked out at ``version``)
+            version: Table version the matrix reflects
+        """
+        data = self._read(table)
+        self._write(self._matrix(data), data.drop_columns(["vector"]), version)
+
+    def update(self, table, version: int, file_paths: List[str]) -> bool:
+        """
+        Derive the matrix for ``version`` from the mapped one by re-reading
+        only the rows of ``file_paths``.
+
+        Args:
+            table: LanceDB table (checked out at ``version``)
+            version: Table version the matrix reflects
+            file_paths: Workspace-relative paths of every file whose rows
+                changed since the mapped version (empty after a compaction)
+
+        Returns:
+            False if nothing is mapped and a full build is needed
+        """
+        if self.vectors is None or "file_path" not in self.rows.column_names:
+            return False
+        keep = np.ones(len(self), dtype=bool)
+        keep[self.rows_for_files(file_paths)] = False
+        vectors = [np.asarray(self.vectors[keep])]
+        rows = [self.rows.filter(pa.array(keep))]
+        for start in range(0, len(file_paths), IN_LIST_SIZE):
+            where = SearchFilters(file_paths=file_paths[start:start + IN_LIST_SIZE]).to_where()
+            data = self._read(table, where)
+            if len(data):
+                vectors.append(self._matrix(data))
+                rows.append(data.drop_columns(["vector"]).cast(rows[0].schema))
+        self._write(np.concatenate(vectors), pa.concat_tables(rows), version)
+        return True
+
+    def _write(self, vectors: np.ndarray, rows: pa.Table, version: int):
+        self.path.mkdir(parents=True, exist_ok=True)
+        directory = self.path / f"v{version}"
+        staging = self.path / f".v{version}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        np.save(staging / "vectors.npy", vectors)
+        with pa.OSFile(str(staging / "rows.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, rows.schema) as writer:
+                writer.write_table(rows)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+
+        pointer = self.path / f".{CURRENT_FILE}.{os.getpid()}.tmp"
+        pointer.write_text(str(version))
+        os.replace(pointer, self.path / CURRENT_FILE)
+
+        self.load()
+        self._remove_old_versions(keep=version)
+
+    def _remove_old_versions(self, keep: int):
+        for child in self.path.glob("v*"):
+            if child.name != f"v{keep}":
+                # Mapped files stay readable on POSIX; on Windows they are removed later
+                shutil.rmtree(child, ignore_errors=True)
+
+    def fetch_rows(self, table, hits: List[Dict]) -> List[Dict]:
+        """
+        Complete ``hits`` (of this index) with the other columns of their rows.
+
+        Args:
+            table: LanceDB table checked out at this index's version
+            hits: Hits from search or search_many, updated in place
+
+        Returns:
+            ``hits``
+        """
+        ids = list({hit["id"] for hit in hits})
+        rows = {}
+        columns = [name for name in table.schema.names if name != "vector"]
+        for start in range(0, len(ids), IN_LIST_SIZE):
+            batch = ids[start:start + IN_LIST_SIZE]
+            where = SearchFilters(ids=batch).to_where()
+            for row in table.search().where(where).select(columns).limit(len(batch)).to_list():
+                rows[row["id"]] = row
+        for hit in hits:
+            hit.update(rows.get(hit["id"], {}))
+        return hits
+
+    def _hits(self, indices: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        hits = self.rows.take(pa.array(indices, pa.int64())).to_pylist()
+        for hit, score in zip(hits, scores.tolist()):
+            # Squared L2 distance between unit vectors, comparable to LanceDB's "l2"
+            hit["_distance"] = max(2.0 - 2.0 * score, 0.0)
+        return hits
+
+    @staticmethod
+    def _top(scores: np.ndarray, top_k: int) -> np.ndarray:
+        if top_k >= scores.shape[-1]:
+            return np.argsort(-scores, axis=-1)
+        part = np.argpartition(-scores, top_k - 1, axis=-1)[..., :top_k]
+        order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+        return np.take_along_axis(part, order, axis=-1)
+
+    def rows_for_files(self, file_paths: List[str]) -> np.ndarray:
+        """Row numbers of the chunks of ``file_paths``."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        mask = pc.is_in(self.rows.column("file_path"), value_set=pa.array(file_paths, pa.string()))
+        return np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+
+    def search(self, query: np.ndarray, top_k: int = 10, rows: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Nearest chunks to ``query`` by cosine similarity.
+
+        Args:
+            query: Query embedding
+            top_k: Number of hits to return
+            rows: Only search these row numbers (see rows_for_files)
+        """
+        if not len(self) or top_k <= 0 or (rows is not None and not len(rows)):
+            return []
+        q = normalize(np.asarray(query, dtype=np.float32)).astype(self.dtype)
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        scores = (vectors @ q).astype(np.float32)
+        top = self._top(scores, top_k)
+        return self._hits(top if rows is None else rows[top], scores[top])
+
+    def search_many(self, queries: List[np.ndarray], top_k: int = 10) -> List[List[Dict]]:
+        """Nearest chunks for several queries with one matrix-matrix product."""
+        if not len(self) or top_k <= 0:
+            return [[] for _ in queries]
+        q = normalize(np.asarray(queries, dtype=np.float32)).astype(self.dtype)
+        scores = (q @ self.vectors.T).astype(np.float32)
+        top = self._top(scores, top_k)
+        return [self._hits(row, scores[i, row]) for i, row in enumerate(top)]
@@ -0,0 +1,166 @@
+"""
+Coarse-to-fine search over directories, files and chunks.
+
+``HierarchyIndex`` pools the chunk embeddings of an index into one summary
+vector per file and per directory (the normalised mean of their children, so
+no extra model calls are needed). A query first picks the best directories,
+then the best files inside them, and only those files' chunks are searched.
+In a large monorepo this replaces one scan over every chunk by three scans
+over much smaller sets. After a write, ``update`` re-pools only the files
+whose rows changed; directory summaries are re-pooled from file summaries.
+"""
+import posixpath
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.indexer.filters import SearchFilters
+from core.indexer.flat import IN_LIST_SIZE, normalize
+
+
+def _pool(groups: np.ndarray, vectors: np.ndarray, count: int) -> np.ndarray:
+    pooled = np.zeros((count, vectors.shape[1]), dtype=np.float32)
+    np.add.at(pooled, groups, vectors)
+    return normalize(pooled)
+
+
+def _top(vectors: np.ndarray, query: np.ndarray, n: int) -> np.ndarray:
+    scores = vectors @ query
+    if n >= len(scores):
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, n - 1)[:n]
+    return part[np.argsort(-scores[part])]
+
+
+class HierarchyIndex:
+    """
+    File and directory summary vectors for one index version.
+
+    Args:
+        file_paths: Workspace-relative file path of every chunk
+        vectors: Chunk embeddings, one row per chunk
+        version: Table version the summaries were pooled from
+    """
+
+    def __init__(self, file_paths: List[str], vectors: np.ndarray, version: Optional[int] = None):
+        files, file_vectors = self._pool_files(file_paths, vectors)
+        self._set_files(files, file_vectors, version)
+
+    @staticmethod
+    def _pool_files(file_paths: List[str], vectors: np.ndarray):
+        chunk_vectors = normalize(np.asarray(vectors, dtype=np.float32))
+        files, file_ids = np.unique(np.array(file_paths, dtype=object), return_inverse=True)
+        return [str(path) for path in files], _pool(file_ids.reshape(-1), chunk_vectors, len(files))
+
+    def _set_files(self, files: List[str], file_vectors: np.ndarray, version: Optional[int]):
+        self.version = version
+        self.files = files
+        self.file_vectors = file_vectors
+        # Directories are compared with "/" separators on every platform
+        self._posix_files = [path.replace("\\", "/") for path in self.files]
+
+        # Every ancestor directory of a file summarises the files below it
+        directory_ids: Dict[str, int] = {}
+        pairs = []
+        for file_id, path in enumerate(self._posix_files):
+            directory = posixpath.dirname(path)
+            while directory:
+                pairs.append((directory_ids.setdefault(directory, len(directory_ids)), file_id))
+                directory = posixpath.dirname(directory)
+        self.directories = list(directory_ids)
+        if pairs:
+            dir_ids, member_files = np.array(pairs).T
+            self.directory_vectors = _pool(dir_ids, self.file_vectors[member_files], len(self.directories))
+        else:
+            self.directory_vectors = np.zeros((0, file_vectors.shape[1]), dtype=np.float32)
+
+    @staticmethod
+    def _read(table, where: Optional[str] = None):
+        # Only the paths and vectors, never the chunk content
+        query = table.search().select(["file_path", "vector"])
+        if where:
+            query = query.where(where)
+        data = query.limit(None).to_arrow()
+        column = data.column("vector").combine_chunks()
+        values = column.flatten().to_numpy(zero_copy_only=False).astype(np.float32)
+        vectors = values.reshape(len(data), -1) if len(data) else np.zeros((0, 1), dtype=np.float32)
+        return data.column("file_path").to_pylist(), vectors
+
+    @classmethod
+    def from_table(cls, table, version: Optional[int] = None) -> "HierarchyIndex":
+        """Pool the summaries of a LanceDB table (checked out at ``version``)."""
+        return cls(*cls._read(table), version)
+
+    def update(self, table, version: int, file_paths: List[str]) -> "HierarchyIndex":
+        """
+        Summaries for ``version``, re-pooling only the files of ``file_paths``.
+
+        Args:
+            table: LanceDB table (checked out at ``version``)
+            version: Table version the summaries reflect
+            file_paths: Workspace-relative paths of every file whose rows
+                changed since this index's version
+
+        Returns:
+            A new HierarchyIndex; this one is left unchanged for readers
+        """
+        changed = set(file_paths)
+        paths, vectors = [], []
+        changed_list = sorted(changed)
+        for start in range(0, len(changed_list), IN_LIST_SIZE):
+            where = SearchFilters(file_paths=changed_list[start:start + IN_LIST_SIZE]).to_where()
+            batch_paths, batch_vectors = self._read(table, where)
+            if batch_paths:
+                paths.extend(batch_paths)
+                vectors.append(batch_vectors)
+        kept = [i for i, path in enumerate(self.files) if path not in changed]
+        files = [self.files[i] for i in kept]
+        file_vectors = [self.file_vectors[kept]] if kept else []
+        if paths:
+            new_files, new_vectors = self._pool_files(paths, np.concatenate(vectors))
+            files += new_files
+            file_vectors.append(new_vectors)
+        if not files:
+            return HierarchyIndex([], np.zeros((0, self.file_vectors.shape[1]), dtype=np.float32), version)
+        order = sorted(range(len(files)), key=files.__getitem__)
+        hierarchy = HierarchyIndex.__new__(HierarchyIndex)
+        hierarchy._set_files([files[i] for i in order], np.concatenate(file_vectors)[order], version)
+        return hierarchy
+
+    def top_directories(self, query: np.ndarray, n: int) -> List[str]:
+        if not self.directories or n <= 0:
+            return []
+        q = normalize(np.asarray(query, dtype=np.float32))
+        return [self.directories[i] for i in _top(self.directory_vectors, q, n)]
+
+    def top_files(self, query: np.ndarray, n: int, directories: Optional[List[str]] = None) -> List[str]:
+        """Best ``n`` files, optionally only those below ``directories``."""
+        if not self.files or n <= 0:
+            return []
+        candidates = np.arange(len(self.files))
+        if directories:
+            prefixes = tuple(directory.rstrip("/") + "/" for directory in directories)
+            candidates = np.array([i for i, path in enumerate(self._posix_files) if path.startswith(prefixes)], dtype=int)
+            if not len(candidates):
+                return []
+        q = normalize(np.asarray(query, dtype=np.float32))
+        return [self.files[candidates[i]] for i in _top(self.file_vectors[candidates], q, n)]
+
+    def narrow(self, query: np.ndarray, files: int, directories: int = 0) -> List[str]:
+        """
+        Files whose chunks should be searched for ``query``.
+
+        Args:
+            query: Query embedding
+            files: Number of files to keep
+            directories: If set, first keep only files below this many best directories
+        """
+        chosen = self.top_directories(query, directories) if directories else None
+        result = self.top_files(query, files, chosen)
+        # A directory choice that leaves too few files falls back to all files
+        if chosen and len(result) < files:
+            result += [path for path in self.top_files(query, files) if path not in result][:files - len(result)]
+        return result
+
+    def stats(self) -> Dict:
+        return {"files": len(self.files), "directories": len(self.directories), "version": self.version}
@@ -0,0 +1,257 @@
+"""
+Online migration of an index to another embedding model.
+
+``EmbeddingMigration`` re-embeds the rows of the active ``code_index`` table
+with the new model into a shadow table, in throttled batches, while searches
+keep using the active table and the old model. Progress lives in the shadow
+table itself, so an interrupted migration resumes where it stopped. Rows
+written to the active table meanwhile are picked up by comparing the two
+tables by chunk id and content; the last comparison and the cut-over run
+under the engine's write lock, so no write is lost.
+
+The active table, its model and dimensions, and any pending migration are
+recorded in ``index.json`` next to the index (see ``IndexState``), replaced
+atomically at cut-over.
+"""
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from core.telemetry import span
+
+if TYPE_CHECKING:
+    from core.indexer.engine import IndexingEngine
+
+STATE_FILE = "index.json"
+DEFAULT_TABLE = "code_index"
+
+
+@dataclass
+class IndexState:
+    """
+    Which table an index reads, and what it is migrating to.
+
+    Attributes:
+        table: Name of the active table
+        embedding_model: Model of the active table's vectors
+        dimensions: Vector dimensions of the active table
+        migration: {"table", "embedding_model"} of a pending migration
+        retired: Tables replaced by a migration, dropped at the next optimize()
+    """
+    table: str = DEFAULT_TABLE
+    embedding_model: Optional[str] = None
+    dimensions: Optional[int] = None
+    migration: Optional[Dict[str, str]] = None
+    retired: List[str] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["IndexState"]:
+        try:
+            data = json.loads((Path(directory) / STATE_FILE).read_text())
+        except (OSError, ValueError):
+            return None
+        return cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+
+    def save(self, directory: Path):
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        staging = directory / f".{STATE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+        staging.write_text(json.dumps(asdict(self), indent=2))
+        os.replace(staging, directory / STATE_FILE)
+
+
+def shadow_table_name(model: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", model).strip("_").lower()
+    return f"{DEFAULT_TABLE}__{slug}_{int(time.time())}"
+
+
+def _keys(table: pa.Table) -> List[Tuple[str, str]]:
+    return list(zip(table.column("id").to_pylist(), table.column("content").to_pylist()))
+
+
+class EmbeddingMigration:
+    """
+    Re-embeds an engine's index with another model and cuts over when done.
+
+    Args:
+        engine: Engine whose index is migrated
+        model: New embedding model
+        table_name: Shadow table (resumed if it exists)
+        batch_size: Rows embedded per batch
+        pause_seconds: Pause between batches, on top of the bulk scheduling
+            of the embeddings
+        use_ollama: Embed with Ollama (see IndexingEngine.index)
+    """
+
+    MAX_PASSES = 3
+
+    def __init__(
+        self,
+        engine: "IndexingEngine",
+        model: str,
+        table_name: str,
+        batch_size: int = 256,
+        pause_seconds: float = 0.05,
+        use_ollama: bool = True,
+    ):
+        self.engine = engine
+        self.model = model
+        self.table_name = table_name
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_seconds
+        self.use_ollama = use_ollama
+        self.done = 0
+        self.total: Optional[int] = None
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def status(self) -> Dict:
+        return {
+            "embedding_model": self.model,
+            "table": self.table_name,
+            "state": self.state,
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+        }
+
+    def start(self) -> "EmbeddingMigration":
+        """Run the migration in a background thread."""
+        self._thread = threading.Thread(target=self.run, name="opencode-migration", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a background migration; returns False on timeout."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def stop(self, wait: bool = True):
+        """Stop after the current batch; the shadow table is kept for resuming."""
+        self._stop.set()
+        if wait:
+            self.wait()
+
+    def run(self):
+        self.state = "running"
+        try:
+            with span("index.migrate", model=self.model):
+                self._run()
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            print(f"Warning: Embedding migration to {self.model} failed: {e}")
+
+    def _run(self):
+        # Passes outside the write lock until caught up (or writes keep coming)
+        for _ in range(self.MAX_PASSES):
+            if self._stop.is_set():
+                break
+            todo, stale = self._pending(self.engine.open_table())
+            self.total = self.done + len(todo)
+            if not len(todo) and not stale:
+                break
+            self._delete(stale)
+            for start in range(0, len(todo), self.batch_size):
+                if self._stop.is_set():
+                    break
+                self._add(todo.slice(start, self.batch_size))
+                self.done += min(self.batch_size, len(todo) - start)
+                if self.pause_seconds:
+                    time.sleep(self.pause_seconds)
+        if self._stop.is_set():
+            self.state = "stopped"
+            return
+
+        # Catch up with the latest writes and switch tables atomically
+        with self.engine._write_lock:
+            if self._stop.is_set():
+                self.state = "stopped"
+                return
+            active = self.engine._writer()
+            todo, stale = self._pending(active)
+            self._delete(stale)
+            if len(todo):
+                self._add(todo)
+                self.done += len(todo)
+            self.total = self.done
+            shadow = self._shadow()
+            if shadow is None:
+                # Nothing to migrate: an empty index simply switches model
+                shadow = self._create(active.to_arrow().slice(0, 0), None)
+            self.engine._cut_over(shadow, self.table_name, self.model)
+        self.state = "complete"
+
+    def _shadow(self):
+        try:
+            return self.engine.db.open_table(self.table_name)
+        except Exception:
+            return None
+
+    def _pending(self, active) -> Tuple[pa.Table, Set[str]]:
+        # Active rows missing from the shadow table, and shadow ids no longer current
+        rows = active.to_arrow().drop_columns(["vector"])
+        shadow = self._shadow()
+        if shadow is None:
+            return rows, set()
+        done = set(_keys(shadow.to_arrow().select(["id", "content"])))
+        current = _keys(rows)
+        current_set = set(current)
+        stale = {key[0] for key in done if key not in current_set}
+        # Stale ids are deleted by id, so their current rows are embedded again
+        mask = pa.array([key not in done or key[0] in stale for key in current])
+        return rows.filter(mask), stale
+
+    def _delete(self, ids: Set[str]):
+        shadow = self._shadow()
+        if shadow is None or not ids:
+            return
+        ids = sorted(ids)
+        for start in range(0, len(ids), 500):
+            quoted = ", ".join("'" + value.replace("'", "''") + "'" for value in ids[start:start + 500])
+            shadow.delete(f"id IN ({quoted})")
+
+    def _add(self, rows: pa.Table):
+        embeddings = self.engine.embedder.embed(
+            rows.column("content").to_pylist(),
+            model=self.model,
+            use_ollama=self.use_ollama,
+            priority="bulk",
+            key=str(self.engine.workspace_path),
+        )
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        shadow = self._shadow()
+        if shadow is None:
+            self._create(rows, vectors)
+            return
+        shadow.add(self._with_vectors(rows, vectors, shadow.schema))
+
+    def _with_vectors(self, rows: pa.Table, vectors: np.ndarray, schema: pa.Schema) -> pa.Table:
+        dimensions = schema.field("vector").type.list_size
+        flat = pa.array(vectors.reshape(-1), pa.float32())
+        columns = {"vector": pa.FixedSizeListArray.from_arrays(flat, dimensions)}
+        # Columns the old table predates are filled with nulls
+        for name in schema.names:
+            if name != "vector":
+                columns[name] = rows.column(name) if name in rows.column_names else pa.nulls(len(rows), schema.field(name).type)
+        return pa.table([columns[name] for name in schema.names], names=schema.names).cast(schema)
+
+    def _create(self, rows: pa.Table, vectors: Optional[np.ndarray]):
+        dimensions = vectors.shape[1] if vectors is not None and len(vectors) else self.engine._dimensions_of(self.model)
+        schema = self.engine._create_table_schema(dimensions, self.model)
+        if vectors is None:
+            vectors = np.zeros((0, dimensions), dtype=np.float32)
+        data = self._with_vectors(rows, vectors, schema)
+        return self.engine.db.create_table(self.table_name, data, schema=schema, mode="overwrite")
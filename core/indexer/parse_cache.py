@@ -0,0 +1,168 @@
+"""
+LRU cache of tree-sitter parse trees shared by the indexer and orchestrator.
+
+Trees are keyed by file path and validated by a content hash. When a path is
+parsed again with different content, the cached tree is updated with a
+single ``Tree.edit`` covering the changed byte range and re-parsed
+incrementally, which costs a fraction of a full parse for small edits.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from core.telemetry import CACHE_REQUESTS
+
+# Rough in-memory size of a syntax tree relative to its source
+TREE_BYTES_PER_SOURCE_BYTE = 10
+# Block size of the common prefix/suffix search in compute_input_edit
+PREFIX_BLOCK_BYTES = 64 * 1024
+
+
+def _point_at(source: bytes, offset: int) -> Tuple[int, int]:
+    row = source.count(b"\n", 0, offset)
+    column = offset - (source.rfind(b"\n", 0, offset) + 1)
+    return row, column
+
+
+def _common_prefix(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common prefix of ``a`` and ``b``, at most ``limit``."""
+    # Whole blocks are compared as slices, then the first differing block is
+    # bisected, so a large file costs a few C-level comparisons
+    low = 0
+    while low < limit:
+        high = min(low + PREFIX_BLOCK_BYTES, limit)
+        if a[low:high] != b[low:high]:
+            break
+        low = high
+    else:
+        return limit
+    # a[:low] == b[:low] and a[low:high] != b[low:high]
+    while high - low > 1:
+        middle = (low + high) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def compute_input_edit(old: bytes, new: bytes) -> Optional[Dict]:
+    """
+    Describe the change from ``old`` to ``new`` as a single tree-sitter edit.
+
+    The edited region is everything between the common prefix and the common
+    suffix. Returns None if the sources are identical.
+    """
+    if old == new:
+        return None
+    limit = min(len(old), len(new))
+    start = _common_prefix(old, new, limit)
+    suffix = _common_prefix(old[::-1], new[::-1], limit - start)
+    old_end = len(old) - suffix
+    new_end = len(new) - suffix
+    return {
+        "start_byte": start,
+        "old_end_byte": old_end,
+        "new_end_byte": new_end,
+        "start_point": _point_at(old, start),
+        "old_end_point": _point_at(old, old_end),
+        "new_end_point": _point_at(new, new_end),
+    }
+
+
+@dataclass
+class _Entry:
+    language: str
+    source: bytes
+    digest: bytes
+    tree: object
+    cost: int
+
+
+class ParseCache:
+    """Thread-safe LRU of parse trees with a memory budget."""
+
+    def __init__(self, parsers: Dict, max_bytes: int = 128 * 1024 * 1024):
+        self.parsers = parsers
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._size = 0
+        # Parsers are not thread-safe; parsing is serialized per cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.incremental = 0
+        self.full = 0
+
+    def parse(self, path: str, source: bytes, language: str):
+        """
+        Return the tree for ``source``, reusing or incrementally updating the
+        cached tree for ``path`` when possible.
+        """
+        parser = self.parsers[language]
+        digest = hashlib.blake2b(source, digest_size=16).digest()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.language == language and entry.digest == digest:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="parse", result="hit")
+                return entry.tree
+
+            tree = None
+            edit = None
+            if entry is not None and entry.language == language:
+                edit = compute_input_edit(entry.source, source)
+            if edit is not None:
+                # Edit a copy: callers may still be walking the cached tree
+                old_tree = entry.tree.copy()
+                old_tree.edit(**edit)
+                tree = parser.parse(source, old_tree)
+                self.incremental += 1
+                CACHE_REQUESTS.inc(cache="parse", result="incremental")
+            if tree is None:
+                tree = parser.parse(source)
+                self.full += 1
+                CACHE_REQUESTS.inc(cache="parse", result="miss")
+
+            self._store(path, _Entry(
+                language, source, digest, tree,
+                cost=len(source) * (TREE_BYTES_PER_SOURCE_BYTE + 1),
+            ))
+            return tree
+
+    def update(self, path: str, source: bytes, language: str):
+        """Record a known edit (e.g. from a file watcher or the edit engine)."""
+        return self.parse(path, source, language)
+
+    def invalidate(self, path: str):
+        """Forget the tree for ``path``."""
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._size -= entry.cost
+
+    def _store(self, path: str, entry: _Entry):
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self._size -= old.cost
+        if entry.cost > self.max_bytes:
+            return
+        self._entries[path] = entry
+        self._size += entry.cost
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.cost
+
+    def stats(self) -> Dict:
+        """Cache occupancy and hit counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "incremental": self.incremental,
+                "full": self.full,
+            }
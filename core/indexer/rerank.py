@@ -0,0 +1,260 @@
+"""
+Second-stage reranking of search hits.
+
+``RerankStage`` retrieves a larger candidate pool from the vector index,
+rescores it with a ``Reranker`` (a small local cross-encoder, or an LLM
+scorer) and returns the best ``top_k``. Scores are cached per
+(query hash, chunk id, content hash), and scoring runs under a latency budget:
+if the reranker does not answer in time, the first-stage order is returned and
+the scores still being computed are cached for the next request. While
+``max_pending`` scoring jobs are still running, further requests skip
+reranking instead of queueing behind them.
+"""
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Tuple
+
+from core.telemetry import CACHE_REQUESTS, REGISTRY
+
+RERANKS = REGISTRY.counter(
+    "opencode_rerank_requests_total", "Rerank requests by outcome (reranked, cached, timeout, busy, error)", ["result"]
+)
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Reranker:
+    """Scores (query, passage) pairs; higher is more relevant."""
+
+    name = "reranker"
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        raise NotImplementedError
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Local cross-encoder from sentence-transformers, run on CPU in batches.
+
+    The model is loaded on first use. Requires the optional
+    ``sentence-transformers`` package.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_CROSS_ENCODER, batch_size: int = 32, device: str = "cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self.name = f"cross-encoder:{model_name}"
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, device=self.device)
+            return self._model
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        scores = self.model.predict([(query, passage) for passage in passages], batch_size=self.batch_size)
+        # Depending on the model and library version these are logits or
+        # probabilities; a sigmoid on every value maps both into (0, 1) in order
+        return [_sigmoid(value) for value in map(float, scores)]
+
+
+def _sigmoid(value: float) -> float:
+    if value >= 0:
+        return 1.0 / (1.0 + math.exp(-value))
+    exp = math.exp(value)
+    return exp / (1.0 + exp)
+
+
+class LLMReranker(Reranker):
+    """
+    Asks a chat model to grade every candidate in one JSON request.
+
+    Args:
+        model_config: Configuration passed to ``create_llm_client``
+        model: Chat model used for grading
+        max_chars: Characters of each candidate shown to the model
+    """
+
+    PROMPT = (
+        "Grade how relevant each numbered code snippet is to the query, from 0 "
+        "(unrelated) to 10 (exactly what is needed). Respond with JSON: "
+        '{"scores": [<one number per snippet, in order>]}'
+    )
+
+    def __init__(self, model_config: Dict, model: Optional[str] = None, max_chars: int = 1200):
+        self.model_config = model_config
+        self.model = model or model_config.get("rerank_model") or model_config.get("planning_model", "llama3.1:8b")
+        self.max_chars = max_chars
+        self.name = f"llm:{self.model}"
+        self._llm = None
+
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        if self._llm is None:
+            from core.orchestrator.llm import create_llm_client
+            self._llm = create_llm_client(self.model_config)
+        snippets = "\n\n".join(
+            f"[{i}]\n{passage[:self.max_chars]}" for i, passage in enumerate(passages)
+        )
+        response = self._llm.chat(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.PROMPT},
+                {"role": "user", "content": f"Query: {query}\n\n{snippets}"},
+            ],
+            format_json=True,
+            options={"temperature": 0},
+            priority="interactive",
+        )
+        scores = json.loads(response.content).get("scores", [])
+        if len(scores) != len(passages):
+            raise ValueError(f"Expected {len(passages)} scores, got {len(scores)}")
+        return [min(max(float(value) / 10.0, 0.0), 1.0) for value in scores]
+
+
+class RerankStage:
+    """
+    Reranks first-stage hits within a latency budget.
+
+    Args:
+        reranker: Scorer for (query, passage) pairs
+        pool_factor: Candidates retrieved per requested hit
+        max_pool: Upper bound on the candidate pool
+        budget_seconds: Time allowed for scoring before falling back to first-stage order
+        cache_entries: Number of (query, chunk) scores kept
+        max_pending: Scoring jobs allowed to run or wait at once; requests
+            beyond it get the first-stage order
+    """
+
+    def __init__(
+        self,
+        reranker: Reranker,
+        pool_factor: int = 4,
+        max_pool: int = 64,
+        budget_seconds: float = 0.3,
+        cache_entries: int = 20000,
+        max_pending: int = 2,
+    ):
+        self.reranker = reranker
+        self.pool_factor = pool_factor
+        self.max_pool = max_pool
+        self.budget_seconds = budget_seconds
+        self.cache_entries = cache_entries
+        self.max_pending = max_pending
+        self._cache: "OrderedDict[Tuple[str, str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Jobs submitted and not finished, including ones abandoned after a timeout
+        self._pending = 0
+        # One worker: the scorer is CPU bound and batches internally
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="opencode-rerank")
+
+    def candidate_count(self, top_k: int) -> int:
+        """Size of the first-stage pool to retrieve for ``top_k`` hits."""
+        return max(top_k, min(top_k * self.pool_factor, self.max_pool))
+
+    def _key(self, query_hash: str, hit: Dict) -> Tuple[str, str, str, str]:
+        # The chunk id only names a line range; the content can change under it
+        content_hash = hashlib.sha256((hit.get("content") or "").encode()).hexdigest()
+        return (self.reranker.name, query_hash, hit.get("id") or "", content_hash)
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _score_and_cache(self, query: str, keys: List[Tuple], passages: List[str]) -> List[float]:
+        scores = self.reranker.score(query, passages)
+        with self._lock:
+            for key, value in zip(keys, scores):
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, hits: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Return the ``top_k`` best of ``hits`` by reranker score.
+
+        Hits get a ``rerank_score`` key. Falls back to the first-stage order
+        (without ``rerank_score``) if scoring fails or exceeds the budget.
+        """
+        if not hits:
+            return []
+        query_hash = hashlib.sha256(query.encode()).hexdigest()
+        keys = [self._key(query_hash, hit) for hit in hits]
+
+        scores: Dict[int, float] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+        missing = [i for i in range(len(hits)) if i not in scores]
+        CACHE_REQUESTS.inc(len(scores), cache="rerank", result="hit")
+        CACHE_REQUESTS.inc(len(missing), cache="rerank", result="miss")
+
+        if missing:
+            with self._lock:
+                busy = self._pending >= self.max_pending
+                if not busy:
+                    self._pending += 1
+            if busy:
+                RERANKS.inc(result="busy")
+                return hits[:top_k]
+            future = self._executor.submit(
+                self._score_and_cache,
+                query,
+                [keys[i] for i in missing],
+                [hits[i].get("content") or "" for i in missing],
+            )
+            future.add_done_callback(self._finished)
+            try:
+                for i, value in zip(missing, future.result(timeout=self.budget_seconds)):
+                    scores[i] = value
+            except FutureTimeout:
+                # Keep scoring in the background so the next request hits the cache
+                RERANKS.inc(result="timeout")
+                return hits[:top_k]
+            except Exception as e:
+                print(f"Warning: Reranking failed, using first-stage order: {e}")
+                RERANKS.inc(result="error")
+                return hits[:top_k]
+            RERANKS.inc(result="reranked")
+        else:
+            RERANKS.inc(result="cached")
+
+        # Stable sort keeps the first-stage order among equal scores
+        order = sorted(range(len(hits)), key=lambda i: scores[i], reverse=True)
+        return [dict(hits[i], rerank_score=scores[i]) for i in order[:top_k]]
+
+
+def create_rerank_stage(config: Dict) -> Optional[RerankStage]:
+    """
+    Build the rerank stage described by ``config``, or None if reranking is off.
+
+    Keys: ``rerank`` ("off", "cross-encoder" or "llm"), ``rerank_model``,
+    ``rerank_budget_ms``, ``rerank_pool_factor`` and, for "llm", the LLM client
+    settings read by ``create_llm_client``.
+    """
+    kind = (config.get("rerank") or "off").lower()
+    if kind in ("", "0", "off", "false", "none"):
+        return None
+    if kind == "cross-encoder":
+        reranker = CrossEncoderReranker(config.get("rerank_model") or DEFAULT_CROSS_ENCODER)
+    elif kind == "llm":
+        reranker = LLMReranker(config)
+    else:
+        raise ValueError(f"Unknown reranker: {kind}")
+    return RerankStage(
+        reranker,
+        pool_factor=int(config.get("rerank_pool_factor", 4)),
+        budget_seconds=float(config.get("rerank_budget_ms", 300)) / 1000.0,
+    )
@@ -0,0 +1,64 @@
+"""
+Token counting shared by the indexer and the orchestrator's context builder.
+
+Uses tiktoken when it is installed and its encoding can be loaded; otherwise
+falls back to a word/punctuation approximation that tracks BPE counts for
+source code closely enough for budgeting.
+"""
+import re
+import threading
+from typing import Optional
+
+DEFAULT_ENCODING = "cl100k_base"
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+_encoding_loaded = False
+_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception:
+                # Not installed, or the encoding file cannot be fetched offline
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Return the number of tokens in ``text``."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Approximation: one token per punctuation mark, ~4 characters per token
+    # for words and identifiers.
+    return sum(max(1, (len(m) + 3) // 4) for m in _WORD_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> Optional[str]:
+    """
+    Cut ``text`` at a line boundary so it fits in ``max_tokens``.
+
+    Returns None if not even the first line fits.
+    """
+    kept = []
+    used = 0
+    for line in text.splitlines(keepends=True):
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    if not kept:
+        return None
+    return "".join(kept)
@@ -1,3 +1,32 @@
-from .agent import AgentOrchestrator, TaskPlan, EditInstruction, TaskStatus
+"""
+Agent orchestrator package.
 
-__all__ = ["AgentOrchestrator", "TaskPlan", "EditInstruction", "TaskStatus"]
+Exports are resolved lazily so that importing the package does not load the
+indexer and LLM provider libraries until an orchestrator is actually needed.
+"""
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+_EXPORTS = {
+    "AgentOrchestrator": ".agent",
+    "TaskPlan": ".agent",
+    "EditInstruction": ".agent",
+    "TaskStatus": ".agent",
+    "WorktreeManager": ".worktree",
+    "ShadowWorkspace": ".worktree",
+}
+
+__all__ = ["AgentOrchestrator", "TaskPlan", "EditInstruction", "TaskStatus", "WorktreeManager", "ShadowWorkspace"]
+
+if TYPE_CHECKING:
+    from .agent import AgentOrchestrator, TaskPlan, EditInstruction, TaskStatus
+    from .worktree import WorktreeManager, ShadowWorkspace
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -1,12 +1,40 @@
+import os
+import signal
 import subprocess
 import json
 import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
-import ollama
 from core.indexer import IndexingEngine
+from core.indexer.engine import load_parsers
+from core.indexer.parse_cache import ParseCache
+from core.orchestrator.context import ContextBuilder
+from core.orchestrator.edits import EditEngine, EditResult
+from core.orchestrator.llm import GenerationAborted, LLMClient, create_llm_client
+from core.orchestrator.prompts import fix_request, plan_conversation, planning_messages
+from core.orchestrator.syntax import SyntaxChecker, SyntaxIssue
+from core.orchestrator.verify import (
+    DiagnosticParser,
+    OutputBuffer,
+    VerificationResult,
+    junit_command,
+    merge_failures,
+    parse_junit,
+    source_spans,
+)
+from core.orchestrator.worktree import ShadowWorkspace, WorktreeManager
+from core.telemetry import REGISTRY, span
+
+AGENT_RUNS = REGISTRY.counter("opencode_agent_runs_total", "Agent loop runs by final status", ["status"])
+AGENT_ITERATIONS = REGISTRY.histogram(
+    "opencode_agent_iterations", "Iterations needed by successful agent runs", buckets=(1, 2, 3, 4, 5, 7, 10)
+)
 
 
 class TaskStatus(Enum):
@@ -17,6 +45,7 @@ class TaskStatus(Enum):
     SUCCESS = "success"
     FAILED = "failed"
     REVIEW = "review"
+    CANCELLED = "cancelled"
 
 
 @dataclass
@@ -28,6 +57,7 @@ class EditInstruction:
     start_line: Optional[int] = None
     end_line: Optional[int] = None
     replacement: Optional[str] = None
+    search: Optional[str] = None  # exact text to replace, instead of a line range
     metadata: Dict = None
     
     def __post_init__(self):
@@ -42,6 +72,7 @@ class TaskPlan:
     steps: List[EditInstruction]
     test_command: Optional[str] = None
     verification_commands: List[str] = None
+    messages: List[Dict] = None  # conversation that produced the plan, ending with the answer
     
     def __post_init__(self):
         if self.verification_commands is None:
@@ -58,11 +89,13 @@ class AgentOrchestrator:
         self, 
         workspace_path: str,
         model_config: dict,
-        indexer: Optional[IndexingEngine] = None
+        indexer: Optional[IndexingEngine] = None,
+        llm_client: Optional[LLMClient] = None
     ):
         self.workspace_path = Path(workspace_path)
         self.model_config = model_config
         self.indexer = indexer
+        self._llm = llm_client
         
         # Model configuration
         self.planning_model = model_config.get("planning_model", "llama3.1:8b")
@@ -71,68 +104,111 @@ class AgentOrchestrator:
         
         # Use shadow branch for safe edits
         self.use_shadow_branch = model_config.get("use_shadow_branch", True)
-        self.shadow_branch = "opencode-shadow"
+        self.shadow_branch = model_config.get("shadow_branch", "opencode-shadow")
+        self._worktrees: Optional[WorktreeManager] = None
+        
+        # Prompt context: how many search hits to consider and how many tokens to spend
+        self.context_candidates = int(model_config.get("context_candidates", 20))
+        self.context_builder = ContextBuilder(
+            token_budget=int(model_config.get("context_token_budget", 3000))
+        )
+        
+        # Reject edits with syntax errors before running verification commands
+        self.syntax_check = model_config.get("syntax_check", True)
+        self._syntax_checker: Optional[SyntaxChecker] = None
+        
+        # Number of candidate plans explored concurrently by run_loop
+        self.speculative_candidates = int(model_config.get("speculative_candidates", 1))
+        
+        # Options sent with every chat: a changed context size reloads the model
+        # and a truncated prompt loses its cached prefix
+        self.chat_options = {"num_ctx": int(model_config.get("llm_num_ctx", 8192))}
+    
+    @property
+    def llm(self) -> LLMClient:
+        """LLM client shared by all calls of this orchestrator, created on first use."""
+        if self._llm is None:
+            cache_dir = self.workspace_path / ".opencode" / "cache" / "llm"
+            self._llm = create_llm_client(self.model_config, cache_dir=str(cache_dir))
+        return self._llm
+    
+    @property
+    def syntax_checker(self) -> SyntaxChecker:
+        """Syntax checker sharing the indexer's parse cache, created on first use."""
+        if self._syntax_checker is None:
+            parse_cache = self.indexer.parse_cache if self.indexer else ParseCache(load_parsers())
+            self._syntax_checker = SyntaxChecker(
+                parse_cache,
+                language_for=lambda path: IndexingEngine.LANGUAGE_MAP.get(path.suffix.lower()),
+                root=self.workspace_path
+            )
+        return self._syntax_checker
+    
+    def attach_indexer(self, indexer: Optional[IndexingEngine]):
+        """Use ``indexer`` for context search and share its parse cache from now on."""
+        self.indexer = indexer
+        self._syntax_checker = None
+
+    def close(self):
+        """Remove the shadow workspaces created by this orchestrator."""
+        if self._worktrees is not None:
+            self._worktrees.cleanup_all()
+
+    def check_syntax(self, edit_result: EditResult) -> List[SyntaxIssue]:
+        """Re-parse the files changed by an edit batch and return syntax issues."""
+        if not self.syntax_check:
+            return []
+        changed = {
+            path: text for path, text in edit_result.updated.items()
+            if text != edit_result.original.get(path)
+        }
+        try:
+            return self.syntax_checker.check_files(changed)
+        except Exception as e:
+            print(f"Warning: Syntax check failed: {e}")
+            return []
+    
+    @property
+    def worktrees(self) -> WorktreeManager:
+        """Shadow workspace manager, created on first use."""
+        if self._worktrees is None:
+            self._worktrees = WorktreeManager(str(self.workspace_path), name_prefix=self.shadow_branch)
+        return self._worktrees
     
-    def plan_task(self, user_goal: str, context: Optional[List[Dict]] = None) -> TaskPlan:
+    def plan_task(
+        self,
+        user_goal: str,
+        context: Optional[List[Dict]] = None,
+        options: Optional[Dict] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> TaskPlan:
         """
         Breaks a high-level goal into specific file edits using AI planning.
         
         Args:
             user_goal: High-level description of what the user wants to accomplish
             context: Optional code context from indexer search
+            options: Optional model options (e.g. temperature, seed)
+            cancel: Event that stops the generation when set
         
         Returns:
             TaskPlan with steps to execute
         """
-        # Build context prompt
-        context_str = ""
-        if context:
-            context_str = "\n\nRelevant code context:\n"
-            for item in context[:5]:  # Top 5 results
-                context_str += f"\n--- {item.get('file_path', 'unknown')} ---\n"
-                context_str += item.get('content', '')[:500] + "\n"
-        
-        # Create planning prompt
-        planning_prompt = f"""You are an expert software engineer planning a code change.
-
-User Goal: {user_goal}
-{context_str}
-
-Break this goal down into specific file edits. For each edit, provide:
-1. file_path: relative path from workspace root
-2. operation: "create", "modify", or "delete"
-3. For modify: start_line, end_line, and replacement content
-4. For create: full content
-5. For delete: just file_path
-
-Respond ONLY with valid JSON in this format:
-{{
-    "steps": [
-        {{
-            "file_path": "path/to/file.py",
-            "operation": "modify",
-            "start_line": 10,
-            "end_line": 15,
-            "replacement": "new code here"
-        }}
-    ],
-    "test_command": "pytest tests/",
-    "verification_commands": ["python -m pytest", "flake8"]
-}}
-"""
+        # Stable parts first, so the model server can reuse the cached prompt prefix
+        messages = planning_messages(user_goal, self.context_builder.build(context) if context else None)
         
         try:
-            # Call Ollama for planning
-            response = ollama.chat(
-                model=self.planning_model,
-                messages=[
-                    {"role": "system", "content": "You are a precise software engineering planner. Always respond with valid JSON only."},
-                    {"role": "user", "content": planning_prompt}
-                ],
-                format="json"
-            )
+            # Call the planning model
+            with span("agent.plan", model=self.planning_model):
+                response = self.llm.chat(
+                    model=self.planning_model,
+                    messages=messages,
+                    format_json=True,
+                    options={**self.chat_options, **(options or {})},
+                    on_token=self._abort_on(cancel)
+                )
             
-            plan_data = json.loads(response["message"]["content"])
+            plan_data = json.loads(response.content)
             
             # Convert to TaskPlan
             steps = [
@@ -143,7 +219,8 @@ Respond ONLY with valid JSON in this format:
                 goal=user_goal,
                 steps=steps,
                 test_command=plan_data.get("test_command"),
-                verification_commands=plan_data.get("verification_commands", [])
+                verification_commands=plan_data.get("verification_commands", []),
+                messages=messages + [{"role": "assistant", "content": response.content}]
             )
         except Exception as e:
             print(f"Error in planning: {e}")
@@ -154,132 +231,269 @@ Respond ONLY with valid JSON in this format:
                 test_command=None
             )
     
-    def apply_edit(self, edit: EditInstruction, dry_run: bool = False) -> bool:
+    def apply_edit(self, edit: EditInstruction, dry_run: bool = False, shadow: Optional[ShadowWorkspace] = None) -> bool:
         """
         Applies an edit instruction to the file system.
         
         Args:
             edit: EditInstruction to apply
             dry_run: If True, don't actually apply the edit
+            shadow: Shadow workspace to apply the edit in instead of the workspace
         
         Returns:
             True if successful, False otherwise
         """
-        file_path = self.workspace_path / edit.file_path
+        return bool(self.apply_edits([edit], dry_run=dry_run, shadow=shadow).applied)
+    
+    def apply_edits(
+        self,
+        edits: List[EditInstruction],
+        dry_run: bool = False,
+        shadow: Optional[ShadowWorkspace] = None
+    ) -> EditResult:
+        """
+        Applies a batch of edits, one atomic write per file.
+        
+        Line numbers of all line-range edits refer to the files as they were
+        before the batch, so edits to the same file do not shift each other.
+        
+        Args:
+            edits: EditInstructions to apply, in plan order
+            dry_run: If True, compute the result and diff without writing
+            shadow: Shadow workspace to apply the edits in instead of the workspace
+        
+        Returns:
+            EditResult with applied/failed edits and a unified diff
+        """
+        if shadow is not None:
+            engine = EditEngine(shadow.path, before_write=shadow.track)
+        else:
+            engine = EditEngine(self.workspace_path)
         
         try:
-            if edit.operation == "create":
-                if not dry_run:
-                    file_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(file_path, "w") as f:
-                        f.write(edit.content or "")
-                return True
-            
-            elif edit.operation == "modify":
-                if not file_path.exists():
-                    print(f"Warning: File {file_path} does not exist for modification")
-                    return False
-                
-                with open(file_path, "r") as f:
-                    lines = f.readlines()
-                
-                if edit.start_line and edit.end_line and edit.replacement:
-                    # Replace lines
-                    # Handle multi-line replacement
-                    replacement_lines = edit.replacement.split("\n")
-                    replacement_lines = [line + "\n" if i < len(replacement_lines) - 1 else line 
-                                       for i, line in enumerate(replacement_lines)]
-                    if replacement_lines and not replacement_lines[-1].endswith("\n"):
-                        replacement_lines[-1] += "\n"
-                    
-                    new_lines = (
-                        lines[:edit.start_line - 1] +
-                        replacement_lines +
-                        lines[edit.end_line:]
-                    )
-                    
-                    if not dry_run:
-                        with open(file_path, "w") as f:
-                            f.writelines(new_lines)
-                    return True
-                elif edit.content:
-                    # Replace entire file
-                    if not dry_run:
-                        with open(file_path, "w") as f:
-                            f.write(edit.content)
-                    return True
-            
-            elif edit.operation == "delete":
-                if not dry_run and file_path.exists():
-                    file_path.unlink()
-                return True
-            
-            return False
+            result = engine.apply(edits, dry_run=dry_run)
         except Exception as e:
-            print(f"Error applying edit to {file_path}: {e}")
-            return False
+            print(f"Error applying edits: {e}")
+            return EditResult(failed=[(edit, str(e)) for edit in edits])
+        
+        for edit, reason in result.failed:
+            print(f"Warning: Could not apply {edit.operation} {edit.file_path}: {reason}")
+        return result
     
-    def verify_changes(self, test_command: Optional[str] = None, verification_commands: Optional[List[str]] = None) -> Tuple[bool, str]:
+    def verify_changes(
+        self,
+        test_command: Optional[str] = None,
+        verification_commands: Optional[List[str]] = None,
+        cwd: Optional[Path] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Tuple[bool, str]:
         """
         Runs verification commands and returns success status.
         
         Args:
             test_command: Command to run tests
             verification_commands: List of commands to verify changes
+            cwd: Directory to run the commands in (defaults to the workspace)
+            cancel: Event that kills the running command when set
         
         Returns:
-            Tuple of (success: bool, output: str)
+            Tuple of (success: bool, output: str); on failure the output is a
+            compact failure summary followed by the source around the failures
         """
-        all_commands = []
-        if test_command:
-            all_commands.append(test_command)
-        if verification_commands:
-            all_commands.extend(verification_commands)
-        
-        if not all_commands:
+        if not test_command and not verification_commands:
             return True, "No verification commands provided"
         
-        for cmd in all_commands:
+        cwd = Path(cwd or self.workspace_path)
+        result = self.verify(test_command, verification_commands, cwd=cwd, cancel=cancel)
+        output = result.summary()
+        if result.failures:
+            spans = source_spans(result.failures, cwd, chunker=self._chunker(cwd))
+            if spans:
+                output += "\n\nRelevant source:\n" + spans
+        return result.success, output
+    
+    def _chunker(self, cwd: Path):
+        """
+        Chunker for files under ``cwd``, keyed by their workspace path.
+        
+        Verification usually runs in a shadow workspace; its files are chunked
+        as the workspace files they shadow, so the indexer (and its parse
+        cache) only ever sees workspace paths.
+        """
+        if self.indexer is None:
+            return None
+        root = cwd.resolve()
+        workspace = self.workspace_path.resolve()
+        if workspace == root or workspace in root.parents:
+            root = workspace
+        
+        def chunk(path: Path, data: bytes):
             try:
-                result = subprocess.run(
-                    cmd,
-                    shell=True,
-                    cwd=str(self.workspace_path),
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
-                )
+                relative = path.resolve().relative_to(root)
+            except ValueError:
+                return []
+            return self.indexer.chunk_file(self.workspace_path / relative, data)
+        
+        return chunk
+    
+    def verify(
+        self,
+        test_command: Optional[str] = None,
+        verification_commands: Optional[List[str]] = None,
+        cwd: Optional[Path] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> VerificationResult:
+        """
+        Run verification commands until one fails, parsing its failures.
+        
+        Output is kept in a bounded buffer per command, and pytest commands
+        write a JUnit XML report that is preferred over the parsed output.
+        
+        Args:
+            test_command: Command to run tests
+            verification_commands: List of commands to verify changes
+            cwd: Directory to run the commands in (defaults to the workspace)
+            cancel: Event that kills the running command when set
+        
+        Returns:
+            VerificationResult of the first failing command, or a successful one
+        """
+        cwd = Path(cwd or self.workspace_path)
+        commands = ([test_command] if test_command else []) + list(verification_commands or [])
+        for cmd in commands:
+            output = OutputBuffer()
+            parser = DiagnosticParser(cwd)
+            
+            def on_line(line: str):
+                output.append(line)
+                parser.feed(line)
+            
+            with tempfile.TemporaryDirectory(prefix="opencode-verify-") as report_dir:
+                report = Path(report_dir) / "junit.xml"
+                try:
+                    returncode = self._run_command(
+                        junit_command(cmd, report) or cmd,
+                        cwd=cwd,
+                        timeout=300,  # 5 minute timeout
+                        cancel=cancel,
+                        on_line=on_line
+                    )
+                except subprocess.TimeoutExpired:
+                    return VerificationResult(
+                        False, cmd, output=output, failures=merge_failures(parser.failures), error="timed out"
+                    )
+                except Exception as e:
+                    return VerificationResult(False, cmd, error=f"could not be run: {e}")
                 
-                if result.returncode != 0:
-                    return False, f"Command '{cmd}' failed:\n{result.stderr}\n{result.stdout}"
-            except subprocess.TimeoutExpired:
-                return False, f"Command '{cmd}' timed out"
-            except Exception as e:
-                return False, f"Error running '{cmd}': {e}"
+                if returncode is None:
+                    return VerificationResult(False, cmd, output=output, error="cancelled")
+                if returncode != 0:
+                    failures = parse_junit(report, cwd) or parser.failures
+                    return VerificationResult(False, cmd, returncode, output, merge_failures(failures))
         
-        return True, "All verification commands passed"
+        return VerificationResult(True)
     
-    def run_loop(self, user_goal: str, max_iterations: int = 5) -> Dict:
+    @staticmethod
+    def _run_command(
+        cmd: str,
+        cwd: Path,
+        timeout: float,
+        cancel: Optional[threading.Event] = None,
+        on_line: Optional[Callable[[str], None]] = None
+    ) -> Optional[int]:
+        """
+        Run a shell command, killing it on timeout or cancellation.
+        
+        Stdout and stderr are merged and streamed to ``on_line`` line by line
+        (lines longer than 64 KiB arrive in pieces) instead of being buffered.
+        
+        Returns:
+            The exit code, or None if cancelled
+        """
+        process = subprocess.Popen(
+            cmd,
+            shell=True,
+            cwd=str(cwd),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            start_new_session=(os.name != "nt")
+        )
+        finished = threading.Event()
+        
+        def pump():
+            for line in iter(lambda: process.stdout.readline(65536), ""):
+                if on_line and not finished.is_set():
+                    on_line(line)
+            process.stdout.close()
+        
+        reader = threading.Thread(target=pump, name="opencode-verify-output", daemon=True)
+        reader.start()
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    process.wait(timeout=0.1)
+                    # Background processes left by the command may keep the pipe open
+                    reader.join(5)
+                    return process.returncode
+                except subprocess.TimeoutExpired:
+                    cancelled = cancel is not None and cancel.is_set()
+                    if not cancelled and time.monotonic() < deadline:
+                        continue
+                    # Kill the whole process group so test runners don't linger
+                    if os.name != "nt":
+                        try:
+                            os.killpg(process.pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                    else:
+                        process.kill()
+                    process.wait()
+                    reader.join(5)
+                    if cancelled:
+                        return None
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+        finally:
+            finished.set()
+    
+    def run_loop(self, user_goal: str, max_iterations: int = 5, candidates: Optional[int] = None) -> Dict:
         """
         Orchestrates the planning, execution, and verification loop.
         
         Args:
             user_goal: High-level goal to accomplish
             max_iterations: Maximum number of retry iterations
+            candidates: Number of alternative plans to try concurrently
+                (defaults to the "speculative_candidates" model setting)
         
         Returns:
             Dictionary with status and results
         """
+        with span("agent.run"):
+            result = self._run_loop(user_goal, max_iterations, candidates)
+        AGENT_RUNS.inc(status=result["status"])
+        if result.get("iterations"):
+            AGENT_ITERATIONS.observe(result["iterations"])
+        return result
+    
+    def _run_loop(self, user_goal: str, max_iterations: int, candidates: Optional[int]) -> Dict:
         print(f"Executing goal: {user_goal}")
         
         # Get context from indexer if available
         context = None
         if self.indexer:
             try:
-                context = self.indexer.search(user_goal, top_k=5)
+                with span("agent.context"):
+                    context = self.indexer.search(user_goal, top_k=self.context_candidates)
             except Exception as e:
                 print(f"Warning: Could not get context from indexer: {e}")
         
+        candidates = candidates or self.speculative_candidates
+        if candidates > 1:
+            return self._run_speculative(user_goal, context, max_iterations, candidates)
+        
         # Plan the task
         plan = self.plan_task(user_goal, context=context)
         
@@ -292,39 +506,206 @@ Respond ONLY with valid JSON in this format:
         
         print(f"Plan created with {len(plan.steps)} steps")
         
-        # Execute plan with verification loop
+        # Execute plan with verification loop, in a shadow workspace if enabled
+        shadow = self._open_shadow()
+        keep_shadow = False
+        try:
+            result = self._execute_plan(user_goal, plan, max_iterations, shadow=shadow)
+            if shadow is not None and result["status"] == TaskStatus.SUCCESS.value:
+                keep_shadow = self._promote(shadow, result)
+            return result
+        finally:
+            if shadow is not None and not keep_shadow:
+                shadow.cleanup()
+    
+    def _run_speculative(
+        self,
+        user_goal: str,
+        context: Optional[List[Dict]],
+        max_iterations: int,
+        candidates: int
+    ) -> Dict:
+        """
+        Plan, apply and verify several candidate plans concurrently.
+        
+        Each candidate runs in its own shadow workspace. The first candidate
+        whose verification passes is promoted and the others are cancelled.
+        """
+        job_id = uuid.uuid4().hex[:8]
+        cancel = threading.Event()
+        claim = threading.Lock()
+        print(f"Speculating with {candidates} candidate plans")
+        
+        def attempt(index: int) -> Tuple[Dict, Optional[ShadowWorkspace]]:
+            # Candidate 0 uses the default options, so it matches the serial loop
+            options = None if index == 0 else {"temperature": 0.8, "seed": index}
+            plan = self.plan_task(user_goal, context=context, options=options, cancel=cancel)
+            if cancel.is_set():
+                return {"status": TaskStatus.CANCELLED.value, "message": "Cancelled", "plan": plan}, None
+            if not plan.steps:
+                return {"status": TaskStatus.FAILED.value, "message": "Planning failed: No steps generated", "plan": plan}, None
+            
+            shadow = self.worktrees.create(job_id)
+            won = False
+            try:
+                result = self._execute_plan(user_goal, plan, max_iterations, shadow=shadow, cancel=cancel, options=options)
+                if result["status"] == TaskStatus.SUCCESS.value:
+                    with claim:
+                        won = not cancel.is_set()
+                        cancel.set()
+                    if won:
+                        return result, shadow
+                    result = {"status": TaskStatus.CANCELLED.value, "message": "Cancelled", "plan": plan}
+                return result, None
+            finally:
+                if not won:
+                    shadow.cleanup()
+        
+        executor = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="opencode-candidate")
+        futures = {executor.submit(attempt, i): i for i in range(candidates)}
+        results: Dict[int, Dict] = {}
+        winner = None
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result, shadow = future.result()
+                except Exception as e:
+                    result, shadow = {"status": TaskStatus.FAILED.value, "message": str(e), "plan": None}, None
+                result["candidate"] = index
+                results[index] = result
+                if shadow is not None:
+                    winner = (result, shadow)
+                    break
+        finally:
+            # Losing candidates notice the event, abort their generations,
+            # kill their commands and clean up
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        try:
+            if winner is not None:
+                result, shadow = winner
+                result["candidates"] = candidates
+                if not self._promote(shadow, result):
+                    shadow.cleanup()
+                return result
+            
+            # No candidate passed: report the first candidate that got furthest
+            failures = [results[i] for i in sorted(results) if results[i]["status"] != TaskStatus.CANCELLED.value]
+            result = failures[0] if failures else {"status": TaskStatus.FAILED.value, "plan": None}
+            result["status"] = TaskStatus.FAILED.value
+            result["message"] = f"None of {candidates} candidate plans passed verification"
+            result["candidates"] = candidates
+            return result
+        finally:
+            # The winner is promoted first; then wait for the losers to stop
+            executor.shutdown(wait=True)
+    
+    @staticmethod
+    def _abort_on(cancel: Optional[threading.Event]) -> Optional[Callable[[str], None]]:
+        # Token callback stopping the stream, and the generation with it, on cancel
+        if cancel is None:
+            return None
+        
+        def check(token: str):
+            if cancel.is_set():
+                raise GenerationAborted("Cancelled")
+        
+        return check
+    
+    def _promote(self, shadow: ShadowWorkspace, result: Dict) -> bool:
+        """
+        Copy a successful shadow's changes into the workspace.
+        
+        Returns:
+            True if the shadow has to be kept for review because of conflicts
+        """
+        promotion = shadow.promote()
+        result["promoted_files"] = promotion.promoted
+        if not promotion.conflicts:
+            return False
+        result["status"] = TaskStatus.REVIEW.value
+        result["message"] = "Changes verified, but some files were modified in the workspace meanwhile"
+        result["conflicts"] = promotion.conflicts
+        result["shadow_path"] = str(shadow.path)
+        return True
+    
+    def _open_shadow(self, job_id: Optional[str] = None) -> Optional[ShadowWorkspace]:
+        """Create a shadow workspace for a job, or None to edit in place."""
+        if not self.use_shadow_branch:
+            return None
+        try:
+            return self.worktrees.create(job_id)
+        except Exception as e:
+            print(f"Warning: Could not create shadow workspace, editing in place: {e}")
+            return None
+    
+    def _execute_plan(
+        self,
+        user_goal: str,
+        plan: TaskPlan,
+        max_iterations: int,
+        shadow: Optional[ShadowWorkspace] = None,
+        cancel: Optional[threading.Event] = None,
+        options: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Apply, verify and fix a plan until it passes or iterations run out.
+        
+        Fix requests continue the plan's conversation with the plan's model
+        options, so each one reuses the prompt prefix of the previous call.
+        """
+        cwd = shadow.path if shadow is not None else None
+        output = ""
+        cancelled = {
+            "status": TaskStatus.CANCELLED.value,
+            "message": "Cancelled",
+            "plan": plan
+        }
         for iteration in range(max_iterations):
+            if cancel is not None and cancel.is_set():
+                return cancelled
             print(f"\n--- Iteration {iteration + 1}/{max_iterations} ---")
             
-            # Apply all edits
-            success_count = 0
-            for i, step in enumerate(plan.steps):
-                print(f"Applying step {i + 1}/{len(plan.steps)}: {step.operation} {step.file_path}")
-                if self.apply_edit(step):
-                    success_count += 1
-                else:
-                    print(f"Warning: Failed to apply step {i + 1}")
+            # Apply all edits in one batch
+            print(f"Applying {len(plan.steps)} steps")
+            with span("agent.apply", steps=len(plan.steps)):
+                edit_result = self.apply_edits(plan.steps, shadow=shadow)
             
-            if success_count == 0:
+            if not edit_result.applied:
                 return {
                     "status": TaskStatus.FAILED.value,
                     "message": "All edit steps failed",
                     "plan": plan
                 }
             
-            # Verify changes
-            print("Verifying changes...")
-            success, output = self.verify_changes(
-                test_command=plan.test_command,
-                verification_commands=plan.verification_commands
-            )
+            # Reject syntactically broken edits before running any commands
+            with span("agent.syntax"):
+                issues = self.check_syntax(edit_result)
+            if issues:
+                success = False
+                output = "Syntax errors after applying edits:\n" + "\n".join(str(issue) for issue in issues)
+            else:
+                # Verify changes
+                print("Verifying changes...")
+                with span("agent.verify"):
+                    success, output = self.verify_changes(
+                        test_command=plan.test_command,
+                        verification_commands=plan.verification_commands,
+                        cwd=cwd,
+                        cancel=cancel
+                    )
+            if cancel is not None and cancel.is_set() and not success:
+                return cancelled
             
             if success:
                 return {
                     "status": TaskStatus.SUCCESS.value,
                     "message": "Task completed successfully",
                     "plan": plan,
-                    "iterations": iteration + 1
+                    "iterations": iteration + 1,
+                    "diff": edit_result.diff
                 }
             else:
                 print(f"Verification failed: {output}")
@@ -332,26 +713,26 @@ Respond ONLY with valid JSON in this format:
                 # If not last iteration, try to fix
                 if iteration < max_iterations - 1:
                     # Use AI to generate fix based on error
-                    fix_prompt = f"""The following verification failed:
-{output}
-
-Original goal: {user_goal}
-
-Generate a fix plan. Respond with JSON in the same format as before."""
+                    messages = plan_conversation(plan) + [fix_request(output)]
                     
                     try:
-                        response = ollama.chat(
-                            model=self.editing_model,
-                            messages=[
-                                {"role": "system", "content": "You are a debugging assistant. Respond with valid JSON only."},
-                                {"role": "user", "content": fix_prompt}
-                            ],
-                            format="json"
-                        )
-                        fix_data = json.loads(response["message"]["content"])
+                        # Not cached: a repeated failure must not replay the same fix
+                        with span("agent.fix", model=self.editing_model):
+                            response = self.llm.chat(
+                                model=self.editing_model,
+                                messages=messages,
+                                format_json=True,
+                                options={**self.chat_options, **(options or {})},
+                                on_token=self._abort_on(cancel),
+                                use_cache=False
+                            )
+                        fix_data = json.loads(response.content)
                         plan.steps = [EditInstruction(**step) for step in fix_data.get("steps", [])]
+                        plan.messages = messages + [{"role": "assistant", "content": response.content}]
                         print("Generated fix plan, retrying...")
                     except Exception as e:
+                        if cancel is not None and cancel.is_set():
+                            return cancelled
                         print(f"Error generating fix: {e}")
                         break
         
@@ -0,0 +1,145 @@
+"""
+Token-budgeted context assembly for planning prompts.
+
+Search hits are turned into a prompt section that fits a token budget: the
+best hit is always included, the remaining hits are packed by relevance per
+token, hits that are symbol-graph neighbours of the top hits (they define a
+name the top hits use, or use a name the top hits define) are boosted, and
+overlapping line ranges from the same file are only included once.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from core.indexer.tokens import count_tokens, truncate_to_tokens
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+@lru_cache(maxsize=4096)
+def _cached_count(text: str) -> int:
+    return count_tokens(text)
+
+
+@dataclass
+class ContextItem:
+    """A search hit considered for the prompt."""
+    file_path: str
+    content: str
+    start_line: int
+    end_line: int
+    score: float
+    tokens: int
+    symbol: Optional[str] = None
+    neighbour: bool = False
+    truncated: bool = False
+    identifiers: Set[str] = field(default_factory=set)
+
+    @property
+    def header(self) -> str:
+        return f"\n--- {self.file_path}:{self.start_line}-{self.end_line} ---\n"
+
+    def overlaps(self, other: "ContextItem") -> bool:
+        return (
+            self.file_path == other.file_path
+            and self.start_line <= other.end_line
+            and other.start_line <= self.end_line
+        )
+
+
+class ContextBuilder:
+    """Packs search hits into a prompt section within a token budget."""
+
+    # Score multiplier for symbol-graph neighbours of the top hits
+    NEIGHBOUR_BOOST = 1.5
+    # Number of top hits whose neighbours are boosted
+    ANCHORS = 3
+    # A hit that does not fit is truncated only if at least this much budget is left
+    MIN_PARTIAL_TOKENS = 64
+
+    def __init__(self, token_budget: int = 3000):
+        self.token_budget = token_budget
+
+    def build(self, hits: List[Dict]) -> str:
+        """Return the formatted context for ``hits`` (best first)."""
+        return "".join(item.header + item.content.rstrip("\n") + "\n" for item in self.select(hits))
+
+    def select(self, hits: List[Dict]) -> List[ContextItem]:
+        """Choose which hits (or hit prefixes) go into the prompt."""
+        items = [self._to_item(hit, rank) for rank, hit in enumerate(hits)]
+        if not items:
+            return []
+        self._boost_neighbours(items)
+
+        # The best hit goes first; the rest are ordered by value per token
+        ordered = [items[0]] + sorted(items[1:], key=lambda i: i.score / max(i.tokens, 1), reverse=True)
+
+        selected: List[ContextItem] = []
+        remaining = self.token_budget
+        for item in ordered:
+            if any(item.overlaps(chosen) for chosen in selected):
+                continue
+            cost = item.tokens + _cached_count(item.header)
+            if cost <= remaining:
+                selected.append(item)
+                remaining -= cost
+            elif remaining >= self.MIN_PARTIAL_TOKENS and not selected:
+                # Keep the head of the best hit: it holds the signature
+                partial = truncate_to_tokens(item.content, remaining - _cached_count(item.header))
+                if partial:
+                    item.content = partial
+                    item.end_line = item.start_line + partial.count("\n")
+                    item.truncated = True
+                    selected.append(item)
+                    remaining -= _cached_count(partial) + _cached_count(item.header)
+        return selected
+
+    def _to_item(self, hit: Dict, rank: int) -> ContextItem:
+        content = hit.get("content") or ""
+        metadata = hit.get("metadata") or {}
+        if isinstance(metadata, str):
+            try:
+                metadata = json.loads(metadata)
+            except ValueError:
+                metadata = {}
+
+        distance = hit.get("_distance")
+        if hit.get("rerank_score") is not None:
+            score = float(hit["rerank_score"])
+        elif distance is not None:
+            score = 1.0 / (1.0 + float(distance))
+        else:
+            score = 1.0 / (1.0 + rank)
+
+        tokens = hit.get("token_count")
+        if not tokens:
+            tokens = _cached_count(content)
+
+        return ContextItem(
+            file_path=hit.get("file_path", "unknown"),
+            content=content,
+            start_line=int(hit.get("start_line") or 0),
+            end_line=int(hit.get("end_line") or 0),
+            score=score,
+            tokens=int(tokens),
+            symbol=hit.get("symbol") or metadata.get("symbol"),
+            identifiers=set(_IDENTIFIER_RE.findall(content)),
+        )
+
+    def _boost_neighbours(self, items: List[ContextItem]):
+        anchors = items[:self.ANCHORS]
+        used_by_anchors: Set[str] = set()
+        anchor_symbols: Set[str] = set()
+        for anchor in anchors:
+            used_by_anchors |= anchor.identifiers
+            if anchor.symbol:
+                anchor_symbols.add(anchor.symbol)
+
+        for item in items[self.ANCHORS:]:
+            callee = item.symbol is not None and item.symbol in used_by_anchors
+            caller = bool(anchor_symbols & item.identifiers)
+            if callee or caller:
+                item.neighbour = True
+                item.score *= self.NEIGHBOUR_BOOST
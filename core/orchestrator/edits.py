@@ -0,0 +1,233 @@
+"""
+Edit application engine.
+
+A plan's edits are grouped by file and each file is read once. Line-range
+edits are interpreted against the file as it was before the plan (the line
+numbers the model saw), applied bottom-up so earlier edits cannot shift later
+ones, and anchored search/replace edits locate their target by text. Every
+changed file is staged to a temporary file next to it and then renamed into
+place, so a crash never leaves a partially written file.
+"""
+import difflib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from core.orchestrator.worktree import resolve_within
+
+if TYPE_CHECKING:
+    from core.orchestrator.agent import EditInstruction
+
+
+@dataclass
+class EditResult:
+    """Outcome of applying a batch of edits."""
+    applied: List["EditInstruction"] = field(default_factory=list)
+    failed: List[Tuple["EditInstruction", str]] = field(default_factory=list)
+    # Workspace-relative path -> text before/after the batch (None = absent)
+    original: Dict[str, Optional[str]] = field(default_factory=dict)
+    updated: Dict[str, Optional[str]] = field(default_factory=dict)
+    diff: str = ""
+
+    @property
+    def success(self) -> bool:
+        return bool(self.applied) and not self.failed
+
+
+class EditError(Exception):
+    """Raised when a single edit cannot be applied."""
+
+
+def _replacement_lines(text: str, newline: str) -> List[str]:
+    if not text:
+        return []
+    lines = text.splitlines()
+    return [line + newline for line in lines]
+
+
+def _detect_newline(text: Optional[str]) -> str:
+    if text and "\r\n" in text:
+        return "\r\n"
+    return "\n"
+
+
+class EditEngine:
+    """Applies EditInstructions under a root directory."""
+
+    def __init__(self, root: Path, before_write: Optional[Callable[[str], None]] = None):
+        self.root = Path(root)
+        self.before_write = before_write
+
+    def apply(self, edits: List["EditInstruction"], dry_run: bool = False) -> EditResult:
+        """
+        Apply ``edits`` in one pass per file.
+
+        Args:
+            edits: Edits to apply, in plan order
+            dry_run: Compute the result and diff without writing anything
+
+        Returns:
+            EditResult with applied and failed edits, new file contents and a unified diff
+        """
+        result = EditResult()
+        by_file: Dict[str, List["EditInstruction"]] = {}
+        for edit in edits:
+            by_file.setdefault(edit.file_path, []).append(edit)
+
+        for rel, file_edits in by_file.items():
+            try:
+                original = self._read(rel)
+            except EditError as e:
+                result.failed.extend((edit, str(e)) for edit in file_edits)
+                continue
+            text = original
+            pending: List["EditInstruction"] = []
+            base = original
+            for edit in file_edits:
+                try:
+                    # A search anchor wins over the line range, which is only a hint then
+                    is_range = edit.start_line and edit.end_line and edit.replacement is not None and not edit.search
+                    if edit.operation == "modify" and is_range:
+                        if text is None:
+                            raise EditError(f"File {rel} does not exist for modification")
+                        if not pending:
+                            base = text
+                        pending.append(edit)
+                        continue
+                    # Any other edit needs the range edits before it resolved
+                    if pending:
+                        text = self._apply_ranges(base, pending, result)
+                        pending = []
+                    text = self._apply_one(rel, text, edit)
+                    result.applied.append(edit)
+                except EditError as e:
+                    result.failed.append((edit, str(e)))
+            if pending:
+                text = self._apply_ranges(base, pending, result)
+
+            result.original[rel] = original
+            result.updated[rel] = text
+
+        changed = {rel: text for rel, text in result.updated.items() if text != result.original[rel]}
+        result.diff = self._diff(result.original, changed)
+        if not dry_run and changed:
+            self._write_atomically(changed)
+        return result
+
+    def _path(self, rel: str) -> Path:
+        # Model plans may name absolute or escaping paths
+        try:
+            return resolve_within(self.root, rel)
+        except ValueError as e:
+            raise EditError(str(e))
+
+    def _read(self, rel: str) -> Optional[str]:
+        path = self._path(rel)
+        if not path.is_file():
+            return None
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def _apply_one(self, rel: str, text: Optional[str], edit: "EditInstruction") -> Optional[str]:
+        if edit.operation == "create":
+            return edit.content or ""
+        if edit.operation == "delete":
+            return None
+        if edit.operation != "modify":
+            raise EditError(f"Unknown operation: {edit.operation}")
+        if text is None:
+            raise EditError(f"File {rel} does not exist for modification")
+        if edit.search:
+            return self._apply_search(text, edit)
+        if edit.content:
+            # Replace entire file
+            return edit.content
+        raise EditError("Modify edit needs a line range, search text or content")
+
+    def _apply_search(self, text: str, edit: "EditInstruction") -> str:
+        """Replace the occurrence of ``edit.search`` closest to ``edit.start_line``."""
+        positions = []
+        start = text.find(edit.search)
+        while start != -1:
+            positions.append(start)
+            start = text.find(edit.search, start + 1)
+        if not positions:
+            raise EditError(f"Search text not found in {edit.file_path}")
+        if len(positions) > 1 and not edit.start_line:
+            raise EditError(f"Search text is ambiguous in {edit.file_path}")
+        if edit.start_line:
+            positions.sort(key=lambda p: abs(text.count("\n", 0, p) + 1 - edit.start_line))
+        pos = positions[0]
+        return text[:pos] + (edit.replacement or "") + text[pos + len(edit.search):]
+
+    def _apply_ranges(self, text: str, edits: List["EditInstruction"], result: EditResult) -> str:
+        """Apply line-range edits that all refer to ``text``, bottom-up."""
+        lines = text.splitlines(keepends=True)
+        newline = _detect_newline(text)
+        accepted = []
+        for edit in sorted(edits, key=lambda e: e.start_line, reverse=True):
+            start, end = edit.start_line, edit.end_line
+            if start < 1 or end < start - 1 or start > len(lines) + 1:
+                result.failed.append((edit, f"Line range {start}-{end} outside {edit.file_path}"))
+                continue
+            if accepted and end >= accepted[-1].start_line:
+                result.failed.append((edit, f"Line range {start}-{end} overlaps another edit"))
+                continue
+            if lines and not lines[-1].endswith(("\n", "\r")) and end >= len(lines):
+                lines[-1] += newline
+            lines[start - 1:end] = _replacement_lines(edit.replacement, newline)
+            accepted.append(edit)
+        # Report in plan order
+        result.applied.extend(e for e in edits if e in accepted)
+        return "".join(lines)
+
+    @staticmethod
+    def _diff(original: Dict[str, Optional[str]], changed: Dict[str, Optional[str]]) -> str:
+        chunks = []
+        for rel, text in changed.items():
+            before = original.get(rel)
+            chunks.extend(difflib.unified_diff(
+                (before or "").splitlines(keepends=True),
+                (text or "").splitlines(keepends=True),
+                fromfile=f"a/{rel}" if before is not None else "/dev/null",
+                tofile=f"b/{rel}" if text is not None else "/dev/null",
+            ))
+        return "".join(line if line.endswith("\n") else line + "\n" for line in chunks)
+
+    def _write_atomically(self, changed: Dict[str, Optional[str]]):
+        """Stage every file to a temp file first, then rename them all into place."""
+        staged = []
+        try:
+            for rel, text in changed.items():
+                path = self._path(rel)
+                if self.before_write:
+                    self.before_write(rel)
+                if text is None:
+                    staged.append((None, path))
+                    continue
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if path.exists():
+                    os.chmod(tmp, path.stat().st_mode & 0o7777)
+                staged.append((tmp, path))
+        except BaseException:
+            for tmp, _ in staged:
+                if tmp:
+                    try:
+                        os.unlink(tmp)
+                    except OSError:
+                        pass
+            raise
+
+        for tmp, path in staged:
+            if tmp is None:
+                if path.exists():
+                    path.unlink()
+            else:
+                os.replace(tmp, path)
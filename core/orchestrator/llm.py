@@ -0,0 +1,426 @@
+"""
+LLM client layer for the orchestrator.
+
+All chat calls go through an ``LLMClient``: one long-lived provider client per
+orchestrator (so HTTP connections are pooled), streamed token consumption
+(so a JSON answer is returned as soon as its top-level value closes, and
+generations that are clearly not JSON are aborted early), and an on-disk
+response cache keyed by the full prompt.
+"""
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from core.scheduling import ModelScheduler, get_scheduler
+from core.telemetry import CACHE_REQUESTS, REGISTRY, span
+
+LLM_REQUESTS = REGISTRY.counter("opencode_llm_requests_total", "LLM chat calls", ["provider", "model", "cached"])
+LLM_TOKENS = REGISTRY.counter("opencode_llm_tokens_total", "LLM tokens used", ["provider", "model", "kind"])
+LLM_FIRST_TOKEN = REGISTRY.histogram("opencode_llm_time_to_first_token_seconds", "Time to first streamed token", ["provider", "model"])
+
+
+class GenerationAborted(Exception):
+    """Raised when a streamed generation is stopped before completion."""
+
+
+@dataclass
+class ChatResponse:
+    """Result of a chat call."""
+    content: str
+    model: str
+    provider: str
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    duration: float = 0.0
+    time_to_first_token: Optional[float] = None
+    complete: bool = True
+
+
+class JSONStreamWatcher:
+    """
+    Tracks a streamed JSON document without parsing it.
+
+    ``complete`` becomes True as soon as the top-level object or array is
+    closed; ``feed`` raises ``GenerationAborted`` if the stream does not start
+    like JSON at all.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.complete = False
+        self.end = 0  # length of the consumed text at completion
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._consumed = 0
+
+    def feed(self, text: str):
+        for char in text:
+            self._consumed += 1
+            if self.complete:
+                continue
+            if not self.started:
+                if char.isspace():
+                    continue
+                if char not in "{[":
+                    raise GenerationAborted(f"Expected JSON, got {char!r}")
+                self.started = True
+                self._depth = 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+                    self.end = self._consumed
+
+
+class ResponseCache:
+    """On-disk cache of chat responses keyed by a hash of the request."""
+
+    def __init__(self, cache_dir: str, max_entries: int = 2000):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict], format_json: bool, options: Optional[Dict]) -> str:
+        payload = json.dumps(
+            {
+                "provider": provider,
+                "model": model,
+                "messages": messages,
+                "format_json": format_json,
+                "options": options or {},
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[ChatResponse]:
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        data["cached"] = True
+        return ChatResponse(**data)
+
+    def put(self, key: str, response: ChatResponse):
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(asdict(response), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write LLM cache entry: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        """Drop the oldest entries once the cache grows past ``max_entries``."""
+        entries = list(self.cache_dir.glob("*/*.json"))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+class LLMClient:
+    """
+    Base class for chat providers.
+
+    Subclasses implement ``_stream`` to yield content tokens and may fill the
+    ``usage`` dict with "prompt_tokens" and "completion_tokens" once known.
+    """
+
+    provider = "base"
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        max_chars: Optional[int] = None,
+        scheduler: Optional[ModelScheduler] = None,
+    ):
+        self.cache = cache
+        self.max_chars = max_chars
+        # Set for clients of the local model server shared with the indexer
+        self.scheduler = scheduler
+
+    def chat(
+        self,
+        model: str,
+        messages: List[Dict],
+        format_json: bool = False,
+        options: Optional[Dict] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        use_cache: bool = True,
+        priority: str = "agent",
+    ) -> ChatResponse:
+        """
+        Run a chat completion, streaming the answer.
+
+        Args:
+            model: Model name for the provider
+            messages: Chat messages ({"role", "content"})
+            format_json: Request JSON output and stop once the JSON value closes
+            options: Provider options (temperature, seed, ...)
+            on_token: Callback invoked with every streamed token
+            use_cache: Look up and store the response in the response cache
+            priority: Scheduler class of the call, if the client has a scheduler
+
+        Returns:
+            ChatResponse with the generated content
+        """
+        key = None
+        if self.cache is not None and use_cache:
+            key = ResponseCache.make_key(self.provider, model, messages, format_json, options)
+            cached = self.cache.get(key)
+            CACHE_REQUESTS.inc(cache="llm", result="hit" if cached is not None else "miss")
+            if cached is not None:
+                LLM_REQUESTS.inc(provider=self.provider, model=model, cached="true")
+                return cached
+
+        with span("llm.chat", provider=self.provider, model=model):
+            if self.scheduler is None:
+                response = self._chat(model, messages, format_json, options, on_token)
+            else:
+                with self.scheduler.slot(priority):
+                    response = self._chat(model, messages, format_json, options, on_token)
+        
+        LLM_REQUESTS.inc(provider=self.provider, model=model, cached="false")
+        if response.prompt_tokens is not None:
+            LLM_TOKENS.inc(response.prompt_tokens, provider=self.provider, model=model, kind="prompt")
+        if response.completion_tokens is not None:
+            LLM_TOKENS.inc(response.completion_tokens, provider=self.provider, model=model, kind="completion")
+        if response.time_to_first_token is not None:
+            LLM_FIRST_TOKEN.observe(response.time_to_first_token, provider=self.provider, model=model)
+
+        if key is not None and response.complete:
+            self.cache.put(key, response)
+        return response
+
+    def _chat(self, model, messages, format_json, options, on_token) -> ChatResponse:
+        """Consume the provider stream and assemble the response."""
+        watcher = JSONStreamWatcher() if format_json else None
+        parts = []
+        length = 0
+        first_token_at = None
+        start = time.monotonic()
+        usage: Dict[str, int] = {}
+
+        stream = self._stream(model, messages, format_json, options, usage)
+        try:
+            for token in stream:
+                if not token:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic() - start
+                parts.append(token)
+                length += len(token)
+                if on_token:
+                    on_token(token)
+                if watcher:
+                    watcher.feed(token)
+                    if watcher.complete:
+                        break
+                if self.max_chars and length > self.max_chars:
+                    raise GenerationAborted(f"Generation exceeded {self.max_chars} characters")
+        finally:
+            # Closing the generator closes the HTTP stream, which stops the
+            # generation on the server side as well.
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+
+        content = "".join(parts)
+        if watcher and watcher.complete:
+            content = content[:watcher.end]
+
+        return ChatResponse(
+            content=content,
+            model=model,
+            provider=self.provider,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            duration=time.monotonic() - start,
+            time_to_first_token=first_token_at,
+            complete=not watcher or watcher.complete,
+        )
+
+    def _stream(self, model: str, messages: List[Dict], format_json: bool, options: Optional[Dict], usage: Dict) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class OllamaClient(LLMClient):
+    """Chat through a local Ollama server."""
+
+    provider = "ollama"
+
+    def __init__(self, host: Optional[str] = None, timeout: Optional[float] = 300.0, keep_alive=None, **kwargs):
+        super().__init__(**kwargs)
+        import ollama
+
+        # A single client keeps its HTTP connection pool across calls
+        self._client = ollama.Client(host=host, timeout=timeout)
+        self.keep_alive = keep_alive
+
+    def _stream(self, model, messages, format_json, options, usage):
+        parts = self._client.chat(
+            model=model,
+            messages=messages,
+            format="json" if format_json else None,
+            options=options,
+            stream=True,
+            keep_alive=self.keep_alive,
+        )
+        for part in parts:
+            if part.get("done"):
+                usage["prompt_tokens"] = part.get("prompt_eval_count")
+                usage["completion_tokens"] = part.get("eval_count")
+            yield part["message"]["content"]
+
+
+class OpenAIClient(LLMClient):
+    """Chat through the OpenAI API (or an OpenAI-compatible server)."""
+
+    provider = "openai"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, timeout: Optional[float] = 300.0, **kwargs):
+        super().__init__(**kwargs)
+        import openai
+
+        self._client = openai.OpenAI(base_url=base_url, api_key=api_key, timeout=timeout)
+
+    def _stream(self, model, messages, format_json, options, usage):
+        options = dict(options or {})
+        extra = {}
+        if format_json:
+            extra["response_format"] = {"type": "json_object"}
+        for name in ("temperature", "seed", "top_p"):
+            if name in options:
+                extra[name] = options[name]
+        if "num_predict" in options:
+            extra["max_tokens"] = options["num_predict"]
+
+        stream = self._client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **extra,
+        )
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+
+class AnthropicClient(LLMClient):
+    """Chat through the Anthropic Messages API."""
+
+    provider = "anthropic"
+
+    def __init__(self, api_key: Optional[str] = None, timeout: Optional[float] = 300.0, max_tokens: int = 4096, **kwargs):
+        super().__init__(**kwargs)
+        import anthropic
+
+        self._client = anthropic.Anthropic(api_key=api_key, timeout=timeout)
+        self.max_tokens = max_tokens
+
+    def _stream(self, model, messages, format_json, options, usage):
+        options = dict(options or {})
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        turns = [m for m in messages if m["role"] != "system"]
+        extra = {}
+        if system:
+            extra["system"] = system
+        for name in ("temperature", "top_p"):
+            if name in options:
+                extra[name] = options[name]
+
+        with self._client.messages.stream(
+            model=model,
+            messages=turns,
+            max_tokens=options.get("num_predict", self.max_tokens),
+            **extra,
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+            message = stream.get_final_message()
+            usage["prompt_tokens"] = message.usage.input_tokens
+            usage["completion_tokens"] = message.usage.output_tokens
+
+
+PROVIDERS = {
+    "ollama": OllamaClient,
+    "openai": OpenAIClient,
+    "anthropic": AnthropicClient,
+}
+
+
+def create_llm_client(model_config: dict, cache_dir: Optional[str] = None) -> LLMClient:
+    """
+    Build an LLM client from orchestrator model configuration.
+
+    Recognised keys: ``llm_provider`` (ollama, openai, anthropic), ``llm_host``
+    (Ollama host or OpenAI-compatible base URL), ``llm_api_key``,
+    ``llm_timeout``, ``llm_cache`` (set to False to disable caching) and
+    ``llm_keep_alive`` (how long Ollama keeps the model loaded between calls,
+    default 30 minutes, so it is not unloaded while verification runs).
+
+    Ollama clients share the process-wide ``ModelScheduler`` with the
+    embedding backend, since both talk to the same local server.
+    """
+    provider = model_config.get("llm_provider", "ollama")
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    cache = None
+    if cache_dir and model_config.get("llm_cache", True):
+        cache = ResponseCache(cache_dir)
+
+    kwargs = {"cache": cache, "timeout": model_config.get("llm_timeout", 300.0)}
+    if provider == "ollama":
+        kwargs["host"] = model_config.get("llm_host")
+        kwargs["scheduler"] = get_scheduler()
+        kwargs["keep_alive"] = model_config.get("llm_keep_alive", "30m")
+    elif provider == "openai":
+        kwargs["base_url"] = model_config.get("llm_host")
+        kwargs["api_key"] = model_config.get("llm_api_key")
+    else:
+        kwargs["api_key"] = model_config.get("llm_api_key")
+    return PROVIDERS[provider](**kwargs)
@@ -0,0 +1,93 @@
+"""
+Prompt templates of the agent loop.
+
+Model servers reuse the evaluated prompt (the KV cache) for the longest prefix
+a request shares with the previous one. Prompts are therefore laid out
+stable-prefix-first: the system message, the response schema, the repository
+context, and only then the parts that vary, like the goal or a verification
+failure. Fix requests append to the job's conversation instead of starting a
+new one, so each iteration only evaluates the newly appended failure.
+"""
+import json
+from dataclasses import asdict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from core.orchestrator.agent import TaskPlan
+
+SYSTEM_PROMPT = (
+    "You are an expert software engineer who plans code changes as file edits "
+    "and fixes them when verification fails. Always respond with valid JSON only."
+)
+
+PLAN_SCHEMA = """A plan is a list of file edits. For each edit, provide:
+1. file_path: relative path from workspace root
+2. operation: "create", "modify", or "delete"
+3. For modify: start_line, end_line, and replacement content
+   (or "search" with the exact text to replace instead of a line range)
+4. For create: full content
+5. For delete: just file_path
+
+Respond ONLY with valid JSON in this format:
+{
+    "steps": [
+        {
+            "file_path": "path/to/file.py",
+            "operation": "modify",
+            "start_line": 10,
+            "end_line": 15,
+            "replacement": "new code here"
+        }
+    ],
+    "test_command": "pytest tests/",
+    "verification_commands": ["python -m pytest", "flake8"]
+}"""
+
+
+def planning_messages(user_goal: str, context: Optional[str] = None) -> List[Dict]:
+    """
+    Messages asking for a plan for ``user_goal``.
+
+    Args:
+        user_goal: High-level description of the change
+        context: Rendered code context from the index, if any
+
+    Returns:
+        System and user message, with the goal last
+    """
+    parts = [PLAN_SCHEMA]
+    if context:
+        parts.append("Relevant code context:\n" + context)
+    parts.append(f"User Goal: {user_goal}\n\nBreak this goal down into specific file edits.")
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": "\n\n".join(parts)},
+    ]
+
+
+def plan_conversation(plan: "TaskPlan") -> List[Dict]:
+    """
+    The conversation that produced ``plan``, ending with the model's answer.
+
+    Plans built without the model (no recorded conversation) get a planning
+    request without context and their steps as the answer.
+    """
+    if plan.messages:
+        return list(plan.messages)
+    answer = {
+        "steps": [asdict(step) for step in plan.steps],
+        "test_command": plan.test_command,
+        "verification_commands": plan.verification_commands,
+    }
+    return planning_messages(plan.goal) + [{"role": "assistant", "content": json.dumps(answer)}]
+
+
+def fix_request(output: str) -> Dict:
+    """User message asking to fix a failed verification, appended to the job's conversation."""
+    return {
+        "role": "user",
+        "content": f"""The edits were applied, but the following verification failed:
+{output}
+
+Generate a fix plan for the files as they are now. Respond with JSON in the same format as before.""",
+    }
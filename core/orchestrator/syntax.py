@@ -0,0 +1,92 @@
+"""
+Fast in-process syntax gate run between applying edits and verification.
+
+Edited files are re-parsed through the indexer's parse cache, so a file the
+indexer (or an earlier iteration) has already parsed is re-parsed
+incrementally (``Tree.edit`` + reparse). ``ERROR`` and ``MISSING`` nodes are
+reported with their locations, which lets a broken edit be rejected without
+running the test suite.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from core.indexer.parse_cache import ParseCache
+
+MAX_ISSUES_PER_FILE = 10
+
+
+@dataclass
+class SyntaxIssue:
+    """A syntax problem found in an edited file (1-indexed position)."""
+    file_path: str
+    line: int
+    column: int
+    kind: str  # "error" or "missing"
+    text: str
+
+    def __str__(self) -> str:
+        if self.kind == "missing":
+            return f"{self.file_path}:{self.line}:{self.column}: missing {self.text}"
+        return f"{self.file_path}:{self.line}:{self.column}: syntax error near {self.text!r}"
+
+
+def find_syntax_issues(tree, file_path: str, source: bytes, limit: int = MAX_ISSUES_PER_FILE) -> List[SyntaxIssue]:
+    """Collect the outermost ERROR nodes and all MISSING nodes of ``tree``."""
+    issues: List[SyntaxIssue] = []
+    if not tree.root_node.has_error:
+        return issues
+    stack = [tree.root_node]
+    while stack and len(issues) < limit:
+        node = stack.pop()
+        if node.is_missing:
+            issues.append(SyntaxIssue(
+                file_path, node.start_point[0] + 1, node.start_point[1] + 1, "missing", node.type
+            ))
+            continue
+        if node.type == "ERROR":
+            snippet = source[node.start_byte:node.end_byte].decode("utf-8", "replace")
+            snippet = snippet.strip().splitlines()[0][:60] if snippet.strip() else ""
+            issues.append(SyntaxIssue(
+                file_path, node.start_point[0] + 1, node.start_point[1] + 1, "error", snippet
+            ))
+            continue
+        if node.has_error:
+            # Visit children in source order
+            stack.extend(reversed(node.children))
+    return issues
+
+
+class SyntaxChecker:
+    """Checks edited files for syntax errors using tree-sitter."""
+
+    def __init__(self, parse_cache: ParseCache, language_for: Callable[[Path], Optional[str]], root: Path):
+        self.parse_cache = parse_cache
+        self.language_for = language_for
+        # Trees are cached under workspace paths, so checking a shadow copy
+        # of a file warms the cache for the workspace file as well
+        self.root = Path(root)
+
+    def check(self, file_path: str, source: bytes) -> List[SyntaxIssue]:
+        """
+        Parse ``source`` and return its syntax issues.
+
+        Args:
+            file_path: Workspace-relative path (selects the grammar)
+            source: New file contents
+        """
+        language = self.language_for(Path(file_path))
+        if language not in self.parse_cache.parsers:
+            return []
+        tree = self.parse_cache.parse(str(self.root / file_path), source, language)
+        return find_syntax_issues(tree, file_path, source)
+
+    def check_files(self, updated: Dict[str, Optional[str]]) -> List[SyntaxIssue]:
+        """Check every file in a ``{path: text}`` map, skipping deleted files."""
+        issues: List[SyntaxIssue] = []
+        for file_path, text in updated.items():
+            if text is None:
+                self.parse_cache.invalidate(str(self.root / file_path))
+                continue
+            issues.extend(self.check(file_path, text.encode("utf-8")))
+        return issues
@@ -0,0 +1,352 @@
+"""
+Bounded capture and structured parsing of verification output.
+
+Verification commands can print megabytes (a noisy test suite, a linter run
+over the whole tree). Their output is streamed line by line into an
+``OutputBuffer`` that keeps only the tail, while a ``DiagnosticParser`` picks
+failures out of every line as it passes:
+
+- ``path:line[:col]: message`` (gcc, clang, go, flake8, ruff, mypy, pylint,
+  pytest's short tracebacks) and ``path(line,col): message`` (tsc)
+- rustc's ``--> path:line:col`` with the preceding ``error: ...`` line
+- the innermost workspace frame of a Python traceback, with its exception
+
+pytest commands additionally write a JUnit XML report, whose failed test cases
+are the most precise source of failures. Only locations inside the directory
+the command ran in are kept. ``VerificationResult.summary`` renders the
+deduplicated failures, and ``source_spans`` the code around them, for the
+fix prompt.
+"""
+import re
+import shlex
+import xml.etree.ElementTree as ET
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# Characters of output kept per command
+MAX_OUTPUT_CHARS = 64_000
+# Output tail shown in the summary when no failure could be parsed
+SUMMARY_TAIL_CHARS = 4_000
+MAX_FAILURES = 200
+MAX_MESSAGE_CHARS = 300
+
+_PATH = r"(?P<path>(?:[A-Za-z]:)?[^\s:()'\"<>]+\.[A-Za-z0-9]+)"
+_LINE_PATTERNS = [
+    re.compile(_PATH + r":(?P<line>\d+):(?:(?P<col>\d+):)?\s*(?P<message>\S.*)$"),
+    re.compile(_PATH + r"\((?P<line>\d+),(?P<col>\d+)\):\s*(?P<message>\S.*)$"),
+]
+_RUST_LOCATION = re.compile(r"^\s*--> " + _PATH + r":(?P<line>\d+):(?P<col>\d+)")
+_RUST_MESSAGE = re.compile(r"^(?P<message>(?:error|warning)(?:\[\w+\])?: .+)$")
+_TRACEBACK_FRAME = re.compile(r'^\s*File "(?P<path>[^"]+)", line (?P<line>\d+)')
+_EXCEPTION = re.compile(r"^(?P<message>[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt)\b.*)$")
+_PYTEST = re.compile(r"(^|[\s/])(py\.test|pytest)(\s|$)")
+_SHELL_OPERATORS = re.compile(r"[;&|<>`$]")
+
+
+@dataclass
+class Failure:
+    """A failure reported by a verification command."""
+    message: str
+    file_path: Optional[str] = None  # relative to the command's directory, "/"-separated
+    line: Optional[int] = None  # 1-indexed
+    test: Optional[str] = None
+    count: int = 1
+    tests: List[str] = field(default_factory=list)
+
+    @property
+    def key(self) -> Tuple:
+        return (self.file_path, self.line, self.message)
+
+    def __str__(self) -> str:
+        location = f"{self.file_path}:{self.line}: " if self.file_path else ""
+        text = location + self.message
+        if self.tests:
+            shown = ", ".join(self.tests[:3])
+            more = f", +{len(self.tests) - 3} more" if len(self.tests) > 3 else ""
+            text += f" [{shown}{more}]"
+        elif self.count > 1:
+            text += f" (x{self.count})"
+        return text
+
+
+def merge_failures(failures: List[Failure], limit: int = MAX_FAILURES) -> List[Failure]:
+    """Merge failures with the same location and message, keeping first-seen order."""
+    merged: Dict[Tuple, Failure] = {}
+    for failure in failures:
+        existing = merged.get(failure.key)
+        if existing is None:
+            if len(merged) >= limit:
+                continue
+            existing = merged[failure.key] = Failure(failure.message, failure.file_path, failure.line)
+            existing.count = 0
+        existing.count += failure.count
+        if failure.test and failure.test not in existing.tests:
+            existing.tests.append(failure.test)
+    return list(merged.values())
+
+
+class OutputBuffer:
+    """Keeps the last ``max_chars`` characters of a line stream."""
+
+    def __init__(self, max_chars: int = MAX_OUTPUT_CHARS):
+        self.max_chars = max_chars
+        self.lines: Deque[str] = deque()
+        self.chars = 0
+        self.dropped = 0
+
+    def append(self, line: str):
+        line = line[-self.max_chars:]
+        self.lines.append(line)
+        self.chars += len(line)
+        while self.chars > self.max_chars:
+            self.chars -= len(self.lines.popleft())
+            self.dropped += 1
+
+    def text(self, max_chars: Optional[int] = None) -> str:
+        """The kept output, or only its last ``max_chars`` characters."""
+        text = "".join(self.lines)
+        dropped = self.dropped
+        if max_chars is not None and len(text) > max_chars:
+            cut = text.find("\n", len(text) - max_chars)
+            cut = len(text) - max_chars if cut < 0 else cut + 1
+            dropped += text[:cut].count("\n")
+            text = text[cut:]
+        return (f"[... {dropped} earlier lines omitted ...]\n" if dropped else "") + text
+
+
+class DiagnosticParser:
+    """
+    Extracts failures with a file and line from command output, line by line.
+
+    Args:
+        root: Directory the command runs in; locations outside it are ignored
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self.failures: List[Failure] = []
+        self._rust_message: Optional[str] = None
+        self._frame: Optional[Tuple[str, int]] = None
+        self._paths: Dict[str, Optional[str]] = {}
+
+    def feed(self, line: str):
+        line = line.rstrip("\r\n")
+        if len(self.failures) >= MAX_FAILURES * 4:
+            # Keep the parse bounded too; merge_failures deduplicates what was kept
+            self.failures = merge_failures(self.failures)
+
+        frame = _TRACEBACK_FRAME.match(line)
+        if frame:
+            path = self._relative(frame.group("path"))
+            if path is not None:
+                self._frame = (path, int(frame.group("line")))
+            return
+        if self._frame is not None:
+            exception = _EXCEPTION.match(line)
+            if exception:
+                self._add(exception.group("message"), *self._frame)
+                self._frame = None
+                return
+
+        message = _RUST_MESSAGE.match(line)
+        if message:
+            self._rust_message = message.group("message")
+            return
+        location = _RUST_LOCATION.match(line)
+        if location:
+            path = self._relative(location.group("path"))
+            if path is not None and self._rust_message:
+                self._add(self._rust_message, path, int(location.group("line")))
+            self._rust_message = None
+            return
+
+        for pattern in _LINE_PATTERNS:
+            match = pattern.match(line.strip())
+            if match:
+                path = self._relative(match.group("path"))
+                if path is not None:
+                    self._add(match.group("message"), path, int(match.group("line")))
+                return
+
+    def _add(self, message: str, path: str, line: int):
+        self.failures.append(Failure(message.strip()[:MAX_MESSAGE_CHARS], path, line))
+
+    def _relative(self, path: str) -> Optional[str]:
+        if path not in self._paths:
+            self._paths[path] = relative_path(self.root, path)
+        return self._paths[path]
+
+
+def relative_path(root: Path, path: str) -> Optional[str]:
+    """``path`` relative to ``root`` if it names a file inside it, else None."""
+    candidate = Path(path)
+    if not candidate.is_absolute():
+        candidate = root / candidate
+    try:
+        candidate = candidate.resolve()
+        relative = candidate.relative_to(root)
+    except (OSError, ValueError):
+        return None
+    return relative.as_posix() if candidate.is_file() else None
+
+
+def junit_command(command: str, report: Path) -> Optional[str]:
+    """
+    ``command`` with a JUnit XML report added, if it is a plain pytest call.
+
+    Commands chained with shell operators are left alone, since the option
+    would go to the last command of the chain.
+    """
+    if not _PYTEST.search(command) or "--junitxml" in command or _SHELL_OPERATORS.search(command):
+        return None
+    # xunit1 records the file and line of each test case
+    return f"{command} --junitxml={shlex.quote(str(report))} -o junit_family=xunit1"
+
+
+def parse_junit(report: Path, root: Path) -> List[Failure]:
+    """Failed and errored test cases of a JUnit XML report."""
+    root = Path(root).resolve()
+    try:
+        tree = ET.parse(report)
+    except (OSError, ET.ParseError):
+        return []
+    failures = []
+    for case in tree.iter("testcase"):
+        for outcome in list(case.findall("failure")) + list(case.findall("error")):
+            name = "::".join(part for part in (case.get("classname"), case.get("name")) if part)
+            message = (outcome.get("message") or outcome.text or "failed").strip().splitlines()
+            path, line = _junit_location(outcome.text or "", case, root)
+            failures.append(Failure(
+                (message[0] if message else "failed")[:MAX_MESSAGE_CHARS], path, line, test=name
+            ))
+    return failures
+
+
+def _junit_location(text: str, case, root: Path) -> Tuple[Optional[str], Optional[int]]:
+    # Innermost workspace location of the traceback, else the test itself
+    for raw in reversed(text.splitlines()):
+        match = _LINE_PATTERNS[0].match(raw.strip())
+        if match:
+            path = relative_path(root, match.group("path"))
+            if path is not None:
+                return path, int(match.group("line"))
+    path = relative_path(root, case.get("file") or "")
+    if path is None:
+        return None, None
+    line = case.get("line")
+    # JUnit line numbers are 0-indexed
+    return path, int(line) + 1 if line and line.isdigit() else None
+
+
+@dataclass
+class VerificationResult:
+    """
+    Outcome of a verification run.
+
+    Attributes:
+        success: All commands passed
+        command: The command that failed (None on success)
+        returncode: Its exit code (None if cancelled, timed out or not started)
+        output: Bounded output of the failed command
+        failures: Deduplicated failures parsed from it
+        error: Why the command did not complete (cancelled, timed out, ...)
+    """
+    success: bool
+    command: Optional[str] = None
+    returncode: Optional[int] = None
+    output: Optional[OutputBuffer] = None
+    failures: List[Failure] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def summary(self, max_failures: int = 20) -> str:
+        """Compact description of the failure for logs and fix prompts."""
+        if self.success:
+            return "All verification commands passed"
+        if self.error:
+            return f"Command '{self.command}' {self.error}"
+        lines = [f"Command '{self.command}' failed (exit code {self.returncode})"]
+        if self.failures:
+            count = len(self.failures)
+            lines.append(f"{count} distinct failure{'s' if count != 1 else ''}:")
+            lines.extend(f"- {failure}" for failure in self.failures[:max_failures])
+            if len(self.failures) > max_failures:
+                lines.append(f"- ... and {len(self.failures) - max_failures} more")
+        elif self.output is not None:
+            lines.append("Output:")
+            lines.append(self.output.text(SUMMARY_TAIL_CHARS).rstrip())
+        return "\n".join(lines)
+
+
+def source_spans(
+    failures: List[Failure],
+    root: Path,
+    chunker: Optional[Callable[[Path, bytes], List]] = None,
+    max_spans: int = 5,
+    max_lines: int = 40,
+    context_lines: int = 5,
+) -> str:
+    """
+    Code around the first failure locations, for the fix prompt.
+
+    A location is shown with its enclosing indexed chunk (function, class)
+    when ``chunker`` finds one of at most ``max_lines`` lines, and otherwise
+    with ``context_lines`` lines around it.
+
+    Args:
+        failures: Failures, most relevant first
+        root: Directory the failure paths are relative to
+        chunker: ``IndexingEngine.chunk_file``-like callable, or None
+        max_spans: Maximum number of spans
+        max_lines: Maximum lines per span
+        context_lines: Lines shown around a location without a chunk
+    """
+    spans: List[Tuple[str, int, int]] = []
+    sources: Dict[str, List[str]] = {}
+    chunks: Dict[str, List] = {}
+    for failure in failures:
+        if len(spans) >= max_spans:
+            break
+        if not failure.file_path or not failure.line:
+            continue
+        if any(path == failure.file_path and start <= failure.line <= end for path, start, end in spans):
+            continue
+        path = Path(root) / failure.file_path
+        if failure.file_path not in sources:
+            try:
+                data = path.read_bytes()
+            except OSError:
+                continue
+            sources[failure.file_path] = data.decode("utf-8", errors="replace").splitlines()
+            chunks[failure.file_path] = _chunks(chunker, path, data)
+        lines = sources[failure.file_path]
+        if failure.line > len(lines):
+            continue
+
+        enclosing = [
+            (chunk.start_line, chunk.end_line) for chunk in chunks[failure.file_path]
+            if chunk.start_line <= failure.line <= chunk.end_line and chunk.end_line - chunk.start_line < max_lines
+        ]
+        if enclosing:
+            start, end = max(enclosing, key=lambda span: span[0])
+        else:
+            start, end = max(1, failure.line - context_lines), min(len(lines), failure.line + context_lines)
+        spans.append((failure.file_path, start, end))
+
+    parts = []
+    for file_path, start, end in spans:
+        body = "\n".join(sources[file_path][start - 1:end])
+        parts.append(f"--- {file_path}:{start}-{end} ---\n{body}")
+    return "\n\n".join(parts)
+
+
+def _chunks(chunker, path: Path, data: bytes) -> List:
+    if chunker is None:
+        return []
+    try:
+        return chunker(path, data)
+    except Exception as e:
+        print(f"Warning: Could not chunk {path}: {e}")
+        return []
+
@@ -0,0 +1,318 @@
+"""
+Shadow workspaces for the agent loop.
+
+Agent edits are applied to an isolated copy of the workspace instead of the
+user's tree. In a git repository the copy is a detached ``git worktree`` of
+HEAD with the user's uncommitted changes replayed on top; elsewhere it is a
+reflink (copy-on-write) copy where the filesystem supports it and a plain copy
+otherwise. Verification runs inside the copy, and only the files the agent
+touched are copied back once a candidate passes.
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class PromotionResult:
+    """Outcome of copying a shadow workspace's changes back to the workspace."""
+    promoted: List[str] = field(default_factory=list)
+    conflicts: List[str] = field(default_factory=list)
+
+
+def _file_digest(path: Path) -> Optional[str]:
+    """Return the sha256 of a file, or None if it does not exist."""
+    if not path.is_file():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def resolve_within(root: Path, relative_path: str) -> Path:
+    """
+    Return ``root / relative_path``, refusing paths that lead outside ``root``.
+
+    Raises:
+        ValueError: If the path is absolute or resolves outside ``root``
+            (through ``..`` components or symlinks)
+    """
+    if Path(relative_path).is_absolute():
+        raise ValueError(f"Path must be relative to the workspace: {relative_path}")
+    path = Path(root) / relative_path
+    resolved_root = Path(root).resolve()
+    if resolved_root not in path.resolve().parents:
+        raise ValueError(f"Path leads outside the workspace: {relative_path}")
+    return path
+
+
+class ShadowWorkspace:
+    """
+    An isolated, disposable copy of the workspace.
+
+    Files written through ``track`` are remembered together with the content
+    hash they had when the shadow was created, so ``promote`` can refuse to
+    overwrite files the user changed in the meantime.
+    """
+
+    def __init__(self, manager: "WorktreeManager", path: Path, job_id: str, kind: str):
+        self.manager = manager
+        self.source = manager.workspace_path
+        self.path = path
+        self.job_id = job_id
+        self.kind = kind  # "worktree" or "copy"
+        self.touched: Dict[str, Optional[str]] = {}
+        self.closed = False
+
+    def resolve(self, relative_path: str) -> Path:
+        """Map a workspace-relative path into the shadow (see ``resolve_within``)."""
+        return resolve_within(self.path, relative_path)
+
+    def track(self, relative_path: str):
+        """Record that ``relative_path`` is about to be written in the shadow."""
+        if relative_path not in self.touched:
+            self.touched[relative_path] = _file_digest(self.resolve(relative_path))
+
+    def promote(self) -> PromotionResult:
+        """
+        Copy touched files back into the real workspace.
+
+        A file is skipped (and reported as a conflict) if the user changed it
+        after the shadow was created.
+
+        Raises:
+            ValueError: If a touched path leads outside the shadow or the
+                workspace; nothing is copied then
+        """
+        result = PromotionResult()
+        paths = {rel: (self.resolve(rel), resolve_within(self.source, rel)) for rel in self.touched}
+        for rel, base_digest in self.touched.items():
+            src, dst = paths[rel]
+            if _file_digest(dst) != base_digest:
+                result.conflicts.append(rel)
+                continue
+            if src.exists():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+            elif dst.exists():
+                dst.unlink()
+            result.promoted.append(rel)
+        return result
+
+    def cleanup(self):
+        """Remove the shadow from disk. Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        self.manager._release(self)
+
+    def __enter__(self) -> "ShadowWorkspace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+
+
+class WorktreeManager:
+    """
+    Creates and tracks shadow workspaces for a single workspace.
+
+    Several shadows may exist for the same job at once (one per candidate
+    plan). All shadows still alive are removed when the job is cleaned up or
+    when the process exits.
+    """
+
+    # Untracked directories that are expensive to copy but needed to run
+    # tests; they are symlinked into the shadow instead.
+    LINKED_DIRS = ("node_modules", ".venv", "venv")
+    
+    # OpenCode's own state (index, caches) is never copied into a shadow
+    STATE_DIR = ".opencode"
+
+    def __init__(self, workspace_path: str, name_prefix: str = "opencode-shadow", root: Optional[str] = None):
+        self.workspace_path = Path(workspace_path).resolve()
+        self.name_prefix = name_prefix
+        workspace_key = hashlib.sha1(str(self.workspace_path).encode()).hexdigest()[:12]
+        base = Path(root) if root else Path(tempfile.gettempdir()) / name_prefix
+        self.root = base / workspace_key / str(os.getpid())
+        # Worktrees are only used when the workspace is the repository root;
+        # a sub-directory of a larger repository falls back to a copy.
+        toplevel = self._git("rev-parse", "--show-toplevel")
+        self.is_git = (
+            toplevel.returncode == 0
+            and Path(os.fsdecode(toplevel.stdout.strip())).resolve() == self.workspace_path
+        )
+        self._lock = threading.Lock()
+        self._live: Dict[str, List[ShadowWorkspace]] = {}
+        self._prune_stale(base / workspace_key)
+        _managers.add(self)
+
+    def _git(self, *args: str, cwd: Optional[Path] = None) -> subprocess.CompletedProcess:
+        try:
+            return subprocess.run(
+                ["git", *args],
+                cwd=str(cwd or self.workspace_path),
+                capture_output=True,
+            )
+        except FileNotFoundError:
+            return subprocess.CompletedProcess(args, 127, b"", b"git not found")
+
+    def _prune_stale(self, workspace_root: Path):
+        """Remove shadows left behind by processes that no longer exist."""
+        if workspace_root.exists():
+            for entry in workspace_root.iterdir():
+                if entry.name == str(os.getpid()) or not entry.name.isdigit():
+                    continue
+                if not _pid_alive(int(entry.name)):
+                    shutil.rmtree(entry, ignore_errors=True)
+        if self.is_git:
+            self._git("worktree", "prune")
+
+    def create(self, job_id: Optional[str] = None) -> ShadowWorkspace:
+        """Create a new shadow workspace for ``job_id``."""
+        job_id = job_id or uuid.uuid4().hex[:8]
+        path = self.root / f"{self.name_prefix}-{job_id}-{uuid.uuid4().hex[:6]}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if self.is_git and self._create_worktree(path):
+            kind = "worktree"
+        else:
+            self._create_copy(path)
+            kind = "copy"
+
+        shadow = ShadowWorkspace(self, path, job_id, kind)
+        with self._lock:
+            self._live.setdefault(job_id, []).append(shadow)
+        return shadow
+
+    def _create_worktree(self, path: Path) -> bool:
+        result = self._git("worktree", "add", "--detach", "--quiet", str(path), "HEAD")
+        if result.returncode != 0:
+            shutil.rmtree(path, ignore_errors=True)
+            return False
+        self._replay_uncommitted(path)
+        self._link_dirs(path)
+        return True
+
+    def _replay_uncommitted(self, path: Path):
+        """Bring the user's uncommitted and untracked files into a fresh worktree."""
+        changed = self._git("diff", "--name-only", "--no-renames", "-z", "HEAD").stdout
+        untracked = self._git("ls-files", "--others", "--exclude-standard", "-z").stdout
+        for raw in (changed + untracked).split(b"\0"):
+            if not raw:
+                continue
+            rel = os.fsdecode(raw)
+            if rel.split("/", 1)[0] == self.STATE_DIR:
+                continue
+            src = self.workspace_path / rel
+            dst = path / rel
+            if src.is_file():
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+            elif dst.exists() and not src.exists():
+                dst.unlink()
+
+    def _link_dirs(self, path: Path):
+        for name in self.LINKED_DIRS:
+            src = self.workspace_path / name
+            dst = path / name
+            if src.is_dir() and not dst.exists():
+                try:
+                    dst.symlink_to(src, target_is_directory=True)
+                except OSError:
+                    pass
+
+    def _create_copy(self, path: Path):
+        """Copy the workspace, using copy-on-write clones when available."""
+        if sys.platform.startswith("linux"):
+            cmd = ["cp", "-a", "--reflink=auto", f"{self.workspace_path}/.", str(path)]
+        elif sys.platform == "darwin":
+            cmd = ["cp", "-cR", f"{self.workspace_path}/.", str(path)]
+        else:
+            cmd = None
+
+        if cmd:
+            path.mkdir(parents=True, exist_ok=True)
+            try:
+                if subprocess.run(cmd, capture_output=True).returncode == 0:
+                    shutil.rmtree(path / self.STATE_DIR, ignore_errors=True)
+                    return
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(path, ignore_errors=True)
+
+        shutil.copytree(
+            self.workspace_path,
+            path,
+            symlinks=True,
+            ignore=lambda d, names: [self.STATE_DIR] if Path(d) == self.workspace_path and self.STATE_DIR in names else []
+        )
+
+    def _release(self, shadow: ShadowWorkspace):
+        with self._lock:
+            shadows = self._live.get(shadow.job_id, [])
+            if shadow in shadows:
+                shadows.remove(shadow)
+            if not shadows:
+                self._live.pop(shadow.job_id, None)
+
+        if shadow.kind == "worktree":
+            result = self._git("worktree", "remove", "--force", str(shadow.path))
+            if result.returncode != 0:
+                shutil.rmtree(shadow.path, ignore_errors=True)
+                self._git("worktree", "prune")
+        else:
+            shutil.rmtree(shadow.path, ignore_errors=True)
+
+    def live(self, job_id: Optional[str] = None) -> List[ShadowWorkspace]:
+        """Return the shadows that are still alive, optionally for one job."""
+        with self._lock:
+            if job_id is not None:
+                return list(self._live.get(job_id, []))
+            return [s for shadows in self._live.values() for s in shadows]
+
+    def cleanup(self, job_id: str):
+        """Remove every shadow belonging to ``job_id``."""
+        for shadow in self.live(job_id):
+            shadow.cleanup()
+
+    def cleanup_all(self):
+        """Remove every shadow created by this manager."""
+        for shadow in self.live():
+            shadow.cleanup()
+
+
+# Managers whose shadows are removed at exit; weak, so a discarded manager is
+# not kept alive by the exit hook
+_managers: "weakref.WeakSet[WorktreeManager]" = weakref.WeakSet()
+
+
+@atexit.register
+def _cleanup_managers():
+    for manager in list(_managers):
+        manager.cleanup_all()
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill(pid, 0) terminates the process on Windows.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
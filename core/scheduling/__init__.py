@@ -0,0 +1,15 @@
+from .scheduler import (
+    PRIORITIES,
+    ModelScheduler,
+    PriorityClass,
+    SchedulerOverloaded,
+    get_scheduler,
+)
+
+__all__ = [
+    "PRIORITIES",
+    "ModelScheduler",
+    "PriorityClass",
+    "SchedulerOverloaded",
+    "get_scheduler",
+]
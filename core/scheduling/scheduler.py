@@ -0,0 +1,206 @@
+"""
+Priority scheduling of requests to the shared model server.
+
+Query embeddings, agent chats and bulk indexing embeddings all go to the same
+local Ollama instance. ``ModelScheduler`` hands out a bounded number of
+model-server slots by priority class, so a large index run cannot push search
+latency from milliseconds to seconds:
+
+- ``interactive``: search query embeddings and reranking
+- ``agent``: planning and fix chats of the agent loop
+- ``bulk``: embeddings for indexing, delta updates and model migrations
+
+A free slot goes to the highest class with waiters that is below its own
+concurrency limit. Within a class, waiters are served round-robin by key (the
+workspace, by default), so one large job does not starve another, and FIFO
+within a key. Classes with a ``max_queue`` shed load: once that many requests
+are waiting, new ones fail fast with ``SchedulerOverloaded``.
+
+Queue depth, active slots, wait time and shed requests are exported as
+``opencode_scheduler_*`` metrics and by ``ModelScheduler.stats()``.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Hashable, Iterator, Optional
+
+from core.telemetry import REGISTRY
+
+PRIORITIES = ("interactive", "agent", "bulk")
+
+QUEUE_DEPTH = REGISTRY.gauge("opencode_scheduler_queue_depth", "Requests waiting for a model slot", ["priority"])
+ACTIVE_SLOTS = REGISTRY.gauge("opencode_scheduler_active", "Model slots in use", ["priority"])
+WAIT_SECONDS = REGISTRY.histogram("opencode_scheduler_wait_seconds", "Time waited for a model slot", ["priority"])
+SHED_REQUESTS = REGISTRY.counter("opencode_scheduler_shed_total", "Requests rejected by load shedding", ["priority"])
+
+
+class SchedulerOverloaded(RuntimeError):
+    """Raised when a request is shed because its class queue is full."""
+
+
+@dataclass
+class PriorityClass:
+    """
+    Limits of one priority class.
+
+    Attributes:
+        limit: Slots the class may hold at once
+        max_queue: Waiting requests beyond which new ones are shed (None: never)
+    """
+    limit: int
+    max_queue: Optional[int] = None
+
+
+DEFAULT_CLASSES = {
+    "interactive": PriorityClass(limit=4),
+    "agent": PriorityClass(limit=2),
+    "bulk": PriorityClass(limit=1, max_queue=16),
+}
+
+
+@dataclass
+class _Waiter:
+    priority: str
+    key: Hashable
+    since: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+class ModelScheduler:
+    """
+    Grants model-server slots by priority class.
+
+    Args:
+        capacity: Slots across all classes, i.e. concurrent model requests
+        classes: Limits per class (DEFAULT_CLASSES if None). The defaults keep
+            one of the 4 slots free of agent and bulk work at all times.
+    """
+
+    def __init__(self, capacity: int = 4, classes: Optional[Dict[str, PriorityClass]] = None):
+        self.capacity = max(1, capacity)
+        self.classes = dict(classes or DEFAULT_CLASSES)
+        self._order = [p for p in PRIORITIES if p in self.classes] + [p for p in self.classes if p not in PRIORITIES]
+        self._cond = threading.Condition()
+        self._waiting: Dict[str, "OrderedDict[Hashable, Deque[_Waiter]]"] = {p: OrderedDict() for p in self.classes}
+        self._queued = {p: 0 for p in self.classes}
+        self._active = {p: 0 for p in self.classes}
+        self._granted = {p: 0 for p in self.classes}
+        self._shed = {p: 0 for p in self.classes}
+        self._wait_total = {p: 0.0 for p in self.classes}
+        self._wait_max = {p: 0.0 for p in self.classes}
+
+    @contextmanager
+    def slot(self, priority: str, key: Hashable = None) -> Iterator[None]:
+        """
+        Hold a model-server slot of ``priority`` for the duration of the block.
+
+        Args:
+            priority: Priority class ("interactive", "agent" or "bulk")
+            key: Fair-queuing key within the class, e.g. the workspace
+
+        Raises:
+            ValueError: Unknown priority class
+            SchedulerOverloaded: The class sheds load and its queue is full
+        """
+        self._acquire(priority, key)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def overloaded(self, priority: str) -> bool:
+        """Whether a new ``priority`` request would be shed right now."""
+        limits = self.classes[priority]
+        with self._cond:
+            return limits.max_queue is not None and self._queued[priority] >= limits.max_queue
+
+    def stats(self) -> Dict:
+        """Limits, active slots, queue depth and wait times per class."""
+        with self._cond:
+            classes = {}
+            for priority, limits in self.classes.items():
+                granted = self._granted[priority]
+                classes[priority] = {
+                    "limit": limits.limit,
+                    "max_queue": limits.max_queue,
+                    "active": self._active[priority],
+                    "queued": self._queued[priority],
+                    "granted": granted,
+                    "shed": self._shed[priority],
+                    "wait_seconds_avg": round(self._wait_total[priority] / granted, 4) if granted else 0.0,
+                    "wait_seconds_max": round(self._wait_max[priority], 4),
+                }
+            return {"capacity": self.capacity, "active": sum(self._active.values()), "classes": classes}
+
+    def _acquire(self, priority: str, key: Hashable):
+        if priority not in self.classes:
+            raise ValueError(f"Unknown priority class: {priority}")
+        limits = self.classes[priority]
+        with self._cond:
+            if limits.max_queue is not None and self._queued[priority] >= limits.max_queue:
+                self._shed[priority] += 1
+                SHED_REQUESTS.inc(priority=priority)
+                raise SchedulerOverloaded(
+                    f"Model server busy: {self._queued[priority]} {priority} requests already queued"
+                )
+            waiter = _Waiter(priority, key)
+            self._waiting[priority].setdefault(key, deque()).append(waiter)
+            self._queued[priority] += 1
+            self._dispatch()
+            while not waiter.granted:
+                self._cond.wait()
+            waited = time.monotonic() - waiter.since
+            self._wait_total[priority] += waited
+            self._wait_max[priority] = max(self._wait_max[priority], waited)
+        WAIT_SECONDS.observe(waited, priority=priority)
+
+    def _release(self, priority: str):
+        with self._cond:
+            self._active[priority] -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        # Caller holds self._cond: grant free slots, highest class first
+        granted = False
+        while sum(self._active.values()) < self.capacity:
+            for priority in self._order:
+                if self._queued[priority] and self._active[priority] < self.classes[priority].limit:
+                    self._grant(priority)
+                    granted = True
+                    break
+            else:
+                break
+        for priority in self._order:
+            QUEUE_DEPTH.set(self._queued[priority], priority=priority)
+            ACTIVE_SLOTS.set(self._active[priority], priority=priority)
+        if granted:
+            self._cond.notify_all()
+
+    def _grant(self, priority: str):
+        # Round-robin over keys: serve the oldest key, then move it to the back
+        waiting = self._waiting[priority]
+        key, waiters = next(iter(waiting.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            waiting.move_to_end(key)
+        else:
+            del waiting[key]
+        waiter.granted = True
+        self._queued[priority] -= 1
+        self._active[priority] += 1
+        self._granted[priority] += 1
+
+
+_default_scheduler: Optional[ModelScheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> ModelScheduler:
+    """Return the process-wide scheduler for the local model server."""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = ModelScheduler()
+        return _default_scheduler
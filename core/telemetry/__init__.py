@@ -0,0 +1,17 @@
+from .tracing import (
+    REGISTRY,
+    CACHE_REQUESTS,
+    span,
+    telemetry_enabled,
+    set_enabled,
+    configure_opentelemetry,
+)
+
+__all__ = [
+    "REGISTRY",
+    "CACHE_REQUESTS",
+    "span",
+    "telemetry_enabled",
+    "set_enabled",
+    "configure_opentelemetry",
+]
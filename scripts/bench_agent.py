@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Agent loop benchmark for the OpenCode backend.
+
+record: runs a goal in a workspace with the configured model and writes a
+        recording of its chats, edits and verification results
+replay: replays a recording against a local mock Ollama server with the
+        given latency and prints a JSON report (wall-clock time, iterations,
+        time per phase, overhead outside the model) tagged with the commit
+
+Examples:
+  python scripts/bench_agent.py record ~/src/app "Add a --verbose flag" -o verbose.json
+  python scripts/bench_agent.py replay verbose.json --runs 5 --ttft 0.5 --tokens-per-second 40
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def command_record(args):
+    from core.benchmark import record
+    from core.orchestrator import AgentOrchestrator
+
+    model_config = {
+        "planning_model": os.getenv("OPENCODE_PLANNING_MODEL", "llama3.1:8b"),
+        "editing_model": os.getenv("OPENCODE_EDITING_MODEL", "llama3.1:8b"),
+        "llm_provider": os.getenv("OPENCODE_LLM_PROVIDER", "ollama"),
+        "llm_host": os.getenv("OPENCODE_LLM_HOST"),
+        "llm_cache": False,
+        "use_shadow_branch": False,
+    }
+    orchestrator = AgentOrchestrator(args.workspace, model_config)
+    try:
+        # The agent's progress output goes to stderr, the summary to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            recording = record(orchestrator, args.goal, max_iterations=args.max_iterations)
+    finally:
+        orchestrator.close()
+    recording.save(args.output)
+    print(json.dumps({"output": args.output, "exchanges": len(recording.exchanges), **recording.result}, indent=2))
+
+
+def command_replay(args):
+    from core.benchmark import Latency, Recording, replay
+
+    recording = Recording.load(args.recording)
+    latency = Latency(
+        time_to_first_token=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        scale=args.latency_scale,
+    )
+    with contextlib.redirect_stdout(sys.stderr):
+        report = replay(
+            recording, runs=args.runs, latency=latency,
+            verify_scale=args.verify_scale, name=os.path.basename(args.recording)
+        )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Run a goal and record it")
+    record_parser.add_argument("workspace")
+    record_parser.add_argument("goal")
+    record_parser.add_argument("-o", "--output", required=True)
+    record_parser.add_argument("--max-iterations", type=int, default=5)
+    record_parser.set_defaults(func=command_record)
+
+    replay_parser = commands.add_parser("replay", help="Replay a recording and report timings")
+    replay_parser.add_argument("recording")
+    replay_parser.add_argument("--runs", type=int, default=3)
+    replay_parser.add_argument("--ttft", type=float, default=None, help="Seconds to first token (default: as recorded)")
+    replay_parser.add_argument("--tokens-per-second", type=float, default=None, help="Default: as recorded")
+    replay_parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for recorded timings")
+    replay_parser.add_argument("--verify-scale", type=float, default=0.0,
+                               help="Multiplier for recorded verification times (default: skip them)")
+    replay_parser.add_argument("-o", "--output", help="Also write the report to this file")
+    replay_parser.set_defaults(func=command_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
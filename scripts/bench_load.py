@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Load test for the OpenCode backend.
+
+Seeds and indexes a synthetic workspace, then runs core.api.server:app under
+uvicorn for every worker count, with embeddings and agent chats answered by a
+local mock Ollama server. At every concurrency level, clients send a mix of
+/api/search, /api/status, /api/index and /api/agent/execute requests for
+--duration seconds. Prints a JSON report with requests/s and p50/p95/p99
+latency per endpoint, tagged with the commit.
+
+Examples:
+  python scripts/bench_load.py --concurrency 1 4 16 --workers 1 4
+  python scripts/bench_load.py --mix search=1 --concurrency 32 --max-p95-ms search=200
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_pairs(values, convert):
+    pairs = {}
+    for value in values or []:
+        name, _, amount = value.partition("=")
+        pairs[name] = convert(amount)
+    return pairs
+
+
+def main():
+    from core.benchmark.load import DEFAULT_MIX
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", nargs="+", metavar="ENDPOINT=WEIGHT",
+                        help="Relative endpoint weights (default: %s)" % " ".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--files", type=int, default=100, help="Modules in the seeded workspace")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Mock seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--embed-seconds", type=float, default=0.005, help="Mock delay per embedding request")
+    parser.add_argument("--max-p95-ms", nargs="+", metavar="ENDPOINT=MS",
+                        help="Exit non-zero if an endpoint's p95 exceeds this at any level")
+    parser.add_argument("-o", "--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    from core.benchmark import Latency, run_load_test
+
+    report = run_load_test(
+        concurrency=args.concurrency,
+        workers=args.workers,
+        duration=args.duration,
+        mix=parse_pairs(args.mix, int) or None,
+        files=args.files,
+        latency=Latency(
+            time_to_first_token=args.ttft,
+            tokens_per_second=args.tokens_per_second,
+            embed_seconds=args.embed_seconds,
+        ),
+    )
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+    failed = False
+    for name, limit in parse_pairs(args.max_p95_ms, float).items():
+        for result in report["results"]:
+            p95 = result["endpoints"].get(name, {}).get("p95_ms")
+            if p95 is not None and p95 > limit:
+                print(f"{name}: p95 {p95} ms > {limit} ms at {result['workers']} workers, "
+                      f"concurrency {result['concurrency']}", file=sys.stderr)
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the OpenCode backend.
+
+Measures, in fresh interpreters:
+  - the time to import core.api.server, and which heavy modules it pulls in
+  - with --serve, the time until a uvicorn process answers GET /
+
+Exits non-zero if the import time exceeds --max-import-seconds or a heavy
+module is imported eagerly, so it can guard startup regressions in CI.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be loaded after startup (by warm-up or on first use)
+HEAVY_MODULES = ["lancedb", "pyarrow", "numpy", "ollama", "tree_sitter", "openai", "anthropic"]
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import core.api.server
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_import(runs: int):
+    samples = []
+    heavy = set()
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        heavy.update(result["heavy"])
+    return samples, sorted(heavy)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_serve(runs: int, timeout: float = 30.0):
+    samples = []
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, OPENCODE_WARMUP_MODELS="0")
+    for _ in range(runs):
+        port = _free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "core.api.server:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while time.perf_counter() - start < timeout:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                        if response.status == 200:
+                            samples.append(time.perf_counter() - start)
+                            break
+                except OSError:
+                    time.sleep(0.01)
+        finally:
+            process.terminate()
+            process.wait()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="Also measure time until GET / answers")
+    parser.add_argument("--max-import-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    samples, heavy = measure_import(args.runs)
+    report = {
+        "import_seconds": {
+            "median": statistics.median(samples),
+            "min": min(samples),
+            "max": max(samples),
+        },
+        "eager_heavy_modules": heavy,
+    }
+    if args.serve:
+        serve = measure_serve(args.runs)
+        report["time_to_health_seconds"] = {
+            "median": statistics.median(serve) if serve else None,
+            "successful_runs": len(serve),
+        }
+    print(json.dumps(report, indent=2))
+
+    failed = bool(heavy)
+    if args.max_import_seconds is not None and report["import_seconds"]["median"] > args.max_import_seconds:
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
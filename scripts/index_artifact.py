@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Build or load a prebuilt index artifact.
+
+In CI, index the checkout once and publish the artifact:
+
+    python scripts/index_artifact.py export /path/to/repo index.tar
+
+On a developer machine, load it and index only the local changes:
+
+    python scripts/index_artifact.py import /path/to/repo index.tar
+
+Both commands print a JSON summary.
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def _engine(workspace: str, embedding_model):
+    from core.indexer import IndexingEngine
+    return IndexingEngine(
+        workspace_path=workspace,
+        vector_db_path=os.path.join(workspace, ".opencode", "index"),
+        embedding_model=embedding_model
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("workspace", help="Repository to index")
+    parser.add_argument("artifact", help="Artifact file to write or read")
+    parser.add_argument("--embedding-model", default=None)
+    parser.add_argument("--commit", default=None, help="Commit to record on export (default: HEAD)")
+    parser.add_argument("--reuse-index", action="store_true", help="Export the existing index without re-indexing")
+    args = parser.parse_args()
+
+    engine = _engine(os.path.abspath(args.workspace), args.embedding_model)
+    if args.command == "export":
+        if not args.reuse_index:
+            engine.index()
+        manifest = engine.export_artifact(args.artifact, commit=args.commit)
+        summary = {key: value for key, value in manifest.items() if key != "files"}
+        summary["files"] = len(manifest["files"])
+    else:
+        try:
+            summary = engine.import_artifact(args.artifact)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
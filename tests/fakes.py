@@ -0,0 +1,66 @@
+"""
+Test doubles shared by the test modules.
+"""
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+from core.indexer.embeddings import EmbeddingBackend
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    """
+    Embedding backend returning deterministic vectors without a model server.
+
+    A text always gets the same vector for the same model.
+
+    Args:
+        dimensions: Vector size, or vector size per model name
+        unit: Unit-length normal vectors, like ollama.embed returns
+            (default: uniform values in [0, 1))
+        topics: Words that own one axis each; a text containing one is
+            embedded near its axis (unit vectors with a little noise)
+        **kwargs: EmbeddingBackend arguments
+
+    Attributes:
+        batches: Texts of every model request, in order
+        texts: Every text embedded, in order
+        model_texts: Texts embedded per model
+    """
+
+    def __init__(
+        self,
+        dimensions: Union[int, Dict[str, int]] = 8,
+        unit: bool = False,
+        topics: Sequence[str] = (),
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.dimensions = dimensions
+        self.unit = unit
+        self.topics = tuple(topics)
+        self.batches: List[List[str]] = []
+        self.texts: List[str] = []
+        self.model_texts: Dict[str, List[str]] = defaultdict(list)
+
+    def vector(self, model: str, text: str) -> np.ndarray:
+        size = self.dimensions[model] if isinstance(self.dimensions, dict) else self.dimensions
+        rng = np.random.default_rng(zlib.crc32(f"{model}:{text}".encode()))
+        if self.topics:
+            vector = (rng.normal(size=size) * 0.05).astype(np.float32)
+            for axis, topic in enumerate(self.topics):
+                if topic in text:
+                    vector[axis] += 1.0
+        elif self.unit:
+            vector = rng.normal(size=size).astype(np.float32)
+        else:
+            return rng.random(size).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _embed_batch(self, model, texts):
+        self.batches.append(list(texts))
+        self.texts.extend(texts)
+        self.model_texts[model].extend(texts)
+        return [self.vector(model, text) for text in texts]
@@ -0,0 +1,150 @@
+"""
+Tests for prebuilt index artifacts.
+"""
+import os
+import unittest
+import tempfile
+import shutil
+import subprocess
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer import IndexingEngine
+    from core.indexer.artifacts import read_artifact
+    from tests.fakes import FakeEmbeddingBackend
+    ARTIFACTS_AVAILABLE = True
+except ImportError as e:
+    ARTIFACTS_AVAILABLE = False
+    print(f"Warning: Could not import artifacts: {e}")
+
+
+SOURCES = {
+    "app/orders.py": "def create_order(cart):\n    order = Order(cart)\n    order.save()\n    notify(order)\n    return order\n",
+    "app/users.py": "def load_user(user_id):\n    user = db.get(user_id)\n    if user is None:\n        raise KeyError(user_id)\n    return user\n",
+    "lib/math.py": "def mean(values):\n    total = sum(values)\n    count = len(values)\n    assert count\n    return total / count\n",
+}
+
+
+def _git(cwd, *args):
+    return subprocess.run(["git", *args], cwd=str(cwd), capture_output=True, check=True)
+
+
+class TestIndexArtifacts(unittest.TestCase):
+    """Test cases for exporting and importing index artifacts."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not ARTIFACTS_AVAILABLE:
+            self.skipTest("Artifact dependencies not available")
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.source = self.test_dir / "ci"
+        for name, content in SOURCES.items():
+            (self.source / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.source / name).write_text(content)
+        self.artifact = self.test_dir / "index.tar"
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _engine(self, workspace, embedder=None, model=None):
+        engine = IndexingEngine(
+            workspace_path=str(workspace),
+            vector_db_path=str(workspace / ".opencode" / "index"),
+            embedding_model=model,
+            embedder=embedder or FakeEmbeddingBackend()
+        )
+        if "python" not in engine.parsers:
+            self.skipTest("tree-sitter-python not available")
+        return engine
+
+    def _build(self, commit=None):
+        engine = self._engine(self.source)
+        engine.index()
+        return engine.export_artifact(str(self.artifact), commit=commit)
+
+    def _checkout(self):
+        # A developer's copy of the CI checkout, without its index
+        local = self.test_dir / "local"
+        shutil.copytree(self.source, local, ignore=shutil.ignore_patterns(".opencode"))
+        return local
+
+    def test_manifest(self):
+        """Test that the artifact records model, dimensions, rows and file hashes."""
+        manifest = self._build(commit="abc123")
+        self.assertEqual(manifest["embedding_model"], "nomic-embed-text")
+        self.assertEqual(manifest["dimensions"], 8)
+        self.assertEqual(manifest["commit"], "abc123")
+        self.assertEqual(sorted(manifest["files"]), sorted(SOURCES))
+
+        read_manifest, data = read_artifact(str(self.artifact))
+        self.assertEqual(read_manifest["rows"], data.num_rows)
+        self.assertEqual(data.num_rows, 3)
+
+    def test_import_indexes_only_the_delta(self):
+        """Test that unchanged files are not embedded again after an import."""
+        self._build()
+        local = self._checkout()
+        (local / "app" / "users.py").write_text(SOURCES["app/users.py"].replace("KeyError", "LookupError"))
+        (local / "lib" / "math.py").unlink()
+        (local / "lib" / "stats.py").write_text("def median(values):\n    values = sorted(values)\n    middle = len(values) // 2\n    return values[middle]\n")
+
+        embedder = FakeEmbeddingBackend()
+        engine = self._engine(local, embedder)
+        result = engine.import_artifact(str(self.artifact))
+
+        self.assertEqual(sorted(result["changed"]), [str(Path("app/users.py")), str(Path("lib/stats.py"))])
+        self.assertEqual(result["removed"], [str(Path("lib/math.py"))])
+        self.assertEqual(len(embedder.texts), 2)
+        self.assertTrue(all("LookupError" in text or "median" in text for text in embedder.texts))
+        files = sorted(hit["file_path"] for hit in engine.search("user order median", top_k=10))
+        self.assertEqual(files, [str(Path(p)) for p in ("app/orders.py", "app/users.py", "lib/stats.py")])
+
+    def test_import_uses_git_diff(self):
+        """Test the delta against the artifact's commit in a git checkout."""
+        (self.source / ".gitignore").write_text(".opencode/\n")
+        try:
+            _git(self.source, "init", "-q")
+            _git(self.source, "add", ".")
+            _git(self.source, "-c", "user.name=ci", "-c", "user.email=ci@example.com", "commit", "-q", "-m", "init")
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest("git not available")
+        manifest = self._build()
+        self.assertEqual(len(manifest["commit"]), 40)
+
+        local = self.test_dir / "local"
+        _git(self.test_dir, "clone", "-q", str(self.source), str(local))
+        (local / "app" / "orders.py").write_text(SOURCES["app/orders.py"] + "\n# reviewed\n")
+        engine = self._engine(local)
+        self.assertEqual(engine.import_artifact(str(self.artifact))["changed"], [str(Path("app/orders.py"))])
+
+    def test_files_changed_after_indexing_are_reindexed(self):
+        """Test that the manifest does not vouch for files edited after indexing."""
+        engine = self._engine(self.source)
+        engine.index()
+        path = self.source / "app" / "orders.py"
+        path.write_text(SOURCES["app/orders.py"].replace("notify", "announce"))
+        stat = path.stat()
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        manifest = engine.export_artifact(str(self.artifact))
+        self.assertIsNone(manifest["files"]["app/orders.py"])
+
+        result = self._engine(self._checkout()).import_artifact(str(self.artifact))
+        self.assertEqual(result["changed"], [str(Path("app/orders.py"))])
+
+    def test_model_mismatch(self):
+        """Test that an artifact of another embedding model is rejected."""
+        self._build()
+        engine = self._engine(self._checkout(), model="other-model")
+        with self.assertRaises(ValueError):
+            engine.import_artifact(str(self.artifact))
+        with self.assertRaises(ValueError):
+            engine.import_artifact(str(self.test_dir / "missing.tar"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests for token-budgeted context assembly.
+"""
+import unittest
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.orchestrator.context import ContextBuilder
+    from core.indexer.tokens import count_tokens
+    CONTEXT_AVAILABLE = True
+except ImportError as e:
+    CONTEXT_AVAILABLE = False
+    print(f"Warning: Could not import ContextBuilder: {e}")
+
+
+def _hit(path, start, end, content, distance, symbol=None):
+    return {
+        "file_path": path,
+        "start_line": start,
+        "end_line": end,
+        "content": content,
+        "_distance": distance,
+        "metadata": {"symbol": symbol},
+    }
+
+
+class TestContextBuilder(unittest.TestCase):
+    """Test cases for ContextBuilder."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not CONTEXT_AVAILABLE:
+            self.skipTest("Context builder dependencies not available")
+
+    def test_respects_budget_and_keeps_signature(self):
+        """An oversized top hit is cut at a line boundary, keeping its head."""
+        body = "def handle_login(user, password):\n" + "    x = compute(user)\n" * 200
+        builder = ContextBuilder(token_budget=150)
+        text = builder.build([_hit("auth.py", 1, 201, body, 0.1, "handle_login")])
+        self.assertIn("def handle_login(user, password):", text)
+        self.assertLessEqual(count_tokens(text), 150)
+
+    def test_overlapping_ranges_deduplicated(self):
+        """A method inside an already selected class is not repeated."""
+        builder = ContextBuilder(token_budget=1000)
+        items = builder.select([
+            _hit("a.py", 1, 20, "class A:\n    def run(self):\n        pass\n", 0.1, "A"),
+            _hit("a.py", 2, 3, "    def run(self):\n        pass\n", 0.2, "run"),
+            _hit("b.py", 1, 3, "def other():\n    pass\n", 0.3, "other"),
+        ])
+        self.assertEqual([(i.file_path, i.start_line) for i in items], [("a.py", 1), ("b.py", 1)])
+
+    def test_symbol_neighbours_preferred(self):
+        """A hit defining a function the top hit calls beats an unrelated hit."""
+        builder = ContextBuilder(token_budget=1000)
+        builder.ANCHORS = 1
+        hits = [
+            _hit("api.py", 1, 5, "def route():\n    return load_user()\n", 0.1, "route"),
+            _hit("misc.py", 1, 5, "def unrelated():\n    return 1\n", 0.5, "unrelated"),
+            _hit("users.py", 1, 5, "def load_user():\n    return 2\n", 0.6, "load_user"),
+        ]
+        items = builder.select(hits)
+        self.assertEqual(items[1].file_path, "users.py")
+        self.assertTrue(items[1].neighbour)
+
+
+if __name__ == "__main__":
+    unittest.main()
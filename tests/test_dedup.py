@@ -0,0 +1,141 @@
+"""
+Tests for near-duplicate chunk detection.
+"""
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer import IndexingEngine
+    from core.indexer.dedup import MinHasher, group_near_duplicates, similarity
+    from tests.fakes import FakeEmbeddingBackend
+    DEDUP_AVAILABLE = True
+except ImportError as e:
+    DEDUP_AVAILABLE = False
+    print(f"Warning: Could not import dedup: {e}")
+
+
+HANDLER = '''def handle_{name}(request, session):
+    """Load the {name} and render it."""
+    record = session.query(Record).filter_by(id=request.args["id"]).first()
+    if record is None:
+        return error_response(404, "not found")
+    payload = serialize(record, fields=["id", "name", "created_at", "owner"])
+    audit_log.write(request.user, "view", record.id)
+    return json_response(payload, status=200)
+'''
+
+OTHER = '''class Cache:
+    def __init__(self, size):
+        self.size = size
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+'''
+
+
+class TestGrouping(unittest.TestCase):
+    """Test cases for MinHash/LSH grouping."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not DEDUP_AVAILABLE:
+            self.skipTest("Dedup dependencies not available")
+
+    def test_similarity_estimates(self):
+        """Test that signatures estimate the similarity of the token shingles."""
+        hasher = MinHasher()
+        handler = hasher.signature(HANDLER.format(name="user"))
+        self.assertEqual(similarity(handler, hasher.signature(HANDLER.format(name="user"))), 1.0)
+        self.assertGreater(similarity(handler, hasher.signature(HANDLER.format(name="team"))), 0.8)
+        self.assertLess(similarity(handler, hasher.signature(OTHER)), 0.2)
+
+    def test_groups(self):
+        """Test that near-duplicates share a group led by the first of them."""
+        texts = [OTHER, HANDLER.format(name="user"), HANDLER.format(name="team"), HANDLER.format(name="user")]
+        self.assertEqual(group_near_duplicates(texts, threshold=0.8), [[0], [1, 2, 3]])
+        self.assertEqual(group_near_duplicates(texts, threshold=1.0), [[0], [1, 3], [2]])
+        self.assertEqual(group_near_duplicates([]), [])
+
+
+class TestIndexDeduplication(unittest.TestCase):
+    """Test cases for indexing with near-duplicate folding."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not DEDUP_AVAILABLE:
+            self.skipTest("Dedup dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        self.workspace = Path(self.test_dir) / "workspace"
+        (self.workspace / "app").mkdir(parents=True)
+        (self.workspace / "vendor").mkdir()
+        (self.workspace / "app" / "handlers.py").write_text(HANDLER.format(name="user") + "\n\n" + OTHER)
+        (self.workspace / "vendor" / "copy.py").write_text(HANDLER.format(name="user"))
+        (self.workspace / "vendor" / "variant.py").write_text(HANDLER.format(name="team"))
+        self.embedder = FakeEmbeddingBackend()
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _engine(self, threshold):
+        engine = IndexingEngine(
+            workspace_path=str(self.workspace),
+            vector_db_path=str(Path(self.test_dir) / "index"),
+            embedder=self.embedder
+        )
+        if "python" not in engine.parsers:
+            self.skipTest("tree-sitter-python not available")
+        engine.DEDUP_THRESHOLD = threshold
+        return engine
+
+    def test_duplicates_are_embedded_and_stored_once(self):
+        """Test one row per group, listing the other locations."""
+        engine = self._engine(0.8)
+        engine.index()
+        self.assertEqual(engine.open_table().count_rows(), 2)
+        self.assertEqual(len(self.embedder.texts), 2)
+
+        hits = engine.search("load the record and render it", top_k=10)
+        self.assertEqual(len(hits), 2)
+        handler = next(hit for hit in hits if hit["symbol"] == "handle_user")
+        self.assertEqual(handler["file_path"], str(Path("app") / "handlers.py"))
+        self.assertEqual(
+            sorted(location["file_path"] for location in handler["locations"]),
+            [str(Path("vendor") / "copy.py"), str(Path("vendor") / "variant.py")]
+        )
+        self.assertEqual(handler["locations"][0]["start_line"], 1)
+
+    def test_update_keeps_copies_of_a_changed_representative(self):
+        """Test that editing the file holding a group's row keeps its copies searchable."""
+        engine = self._engine(0.8)
+        engine.index()
+        (self.workspace / "app" / "handlers.py").write_text(OTHER)
+        engine.update_files([self.workspace / "app" / "handlers.py"])
+
+        handlers = [hit for hit in engine.search("load the record and render it", top_k=10) if hit["symbol"] == "handle_user"]
+        self.assertEqual(len(handlers), 1)
+        self.assertEqual(handlers[0]["file_path"], str(Path("vendor") / "copy.py"))
+        # No location points at the edited file any more
+        self.assertEqual(
+            [location["file_path"] for location in handlers[0]["locations"]],
+            [str(Path("vendor") / "variant.py")]
+        )
+        self.assertEqual(engine.open_table().count_rows(), 2)
+
+    def test_disabled(self):
+        """Test that DEDUP_THRESHOLD = None stores every chunk."""
+        engine = self._engine(None)
+        engine.index()
+        self.assertEqual(engine.open_table().count_rows(), 4)
+        self.assertTrue(all(hit["locations"] == [] for hit in engine.search("record", top_k=10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Tests for the batched edit engine.
+"""
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.orchestrator.agent import EditInstruction
+    from core.orchestrator.edits import EditEngine
+    EDITS_AVAILABLE = True
+except ImportError as e:
+    EDITS_AVAILABLE = False
+    print(f"Warning: Could not import EditEngine: {e}")
+
+
+class TestEditEngine(unittest.TestCase):
+    """Test cases for EditEngine."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not EDITS_AVAILABLE:
+            self.skipTest("Edit engine dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        self.root = Path(self.test_dir)
+        (self.root / "a.py").write_text("l1\nl2\nl3\nl4\nl5\n")
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _modify(self, start, end, replacement, path="a.py"):
+        return EditInstruction(file_path=path, operation="modify", start_line=start, end_line=end, replacement=replacement)
+
+    def test_range_edits_use_original_line_numbers(self):
+        """Several range edits to one file don't shift each other."""
+        result = EditEngine(self.root).apply([
+            self._modify(1, 1, "first\nextra"),
+            self._modify(4, 5, "tail"),
+        ])
+        self.assertTrue(result.success)
+        self.assertEqual((self.root / "a.py").read_text(), "first\nextra\nl2\nl3\ntail\n")
+        self.assertIn("-l4", result.diff)
+        self.assertIn("+tail", result.diff)
+
+    def test_overlapping_ranges_rejected(self):
+        """An edit overlapping another range edit fails instead of corrupting the file."""
+        result = EditEngine(self.root).apply([
+            self._modify(2, 3, "x"),
+            self._modify(3, 4, "y"),
+        ])
+        self.assertEqual(len(result.applied), 1)
+        self.assertEqual(len(result.failed), 1)
+
+    def test_search_replace(self):
+        """Anchored search/replace picks the occurrence closest to the hint."""
+        (self.root / "b.py").write_text("x = 1\ny = 2\nx = 1\n")
+        edit = EditInstruction(file_path="b.py", operation="modify", search="x = 1", replacement="x = 3", start_line=3)
+        EditEngine(self.root).apply([edit])
+        self.assertEqual((self.root / "b.py").read_text(), "x = 1\ny = 2\nx = 3\n")
+
+    def test_search_wins_over_stale_line_range(self):
+        """An edit with both a search anchor and a line range replaces the searched text."""
+        (self.root / "b.py").write_text("x = 1\ny = 2\nz = 3\n")
+        edit = EditInstruction(
+            file_path="b.py", operation="modify", search="z = 3", replacement="z = 4", start_line=1, end_line=1
+        )
+        result = EditEngine(self.root).apply([edit])
+        self.assertTrue(result.success)
+        self.assertEqual((self.root / "b.py").read_text(), "x = 1\ny = 2\nz = 4\n")
+
+    def test_dry_run_and_failed_write_leave_files_untouched(self):
+        """Nothing is written on dry run, or if staging any file fails."""
+        engine = EditEngine(self.root)
+        result = engine.apply([self._modify(1, 1, "changed")], dry_run=True)
+        self.assertEqual(result.updated["a.py"], "changed\nl2\nl3\nl4\nl5\n")
+        self.assertEqual((self.root / "a.py").read_text(), "l1\nl2\nl3\nl4\nl5\n")
+
+        def fail_on_second(rel):
+            if rel == "c.py":
+                raise OSError("disk full")
+
+        engine = EditEngine(self.root, before_write=fail_on_second)
+        with self.assertRaises(OSError):
+            engine.apply([
+                self._modify(1, 1, "changed"),
+                EditInstruction(file_path="c.py", operation="create", content="new"),
+            ])
+        self.assertEqual((self.root / "a.py").read_text(), "l1\nl2\nl3\nl4\nl5\n")
+        self.assertEqual([p.name for p in self.root.iterdir()], ["a.py"])
+
+
+    def test_paths_outside_the_root_fail(self):
+        """Absolute and escaping paths fail for their file; other files still apply."""
+        root = self.root / "workspace"
+        root.mkdir()
+        (root / "a.py").write_text("l1\n")
+        outside = self.root / "outside.py"
+        result = EditEngine(root).apply([
+            EditInstruction(file_path=str(outside), operation="create", content="x"),
+            EditInstruction(file_path="../outside.py", operation="create", content="x"),
+            EditInstruction(file_path="../a.py", operation="delete"),
+            self._modify(1, 1, "changed"),
+        ])
+        self.assertEqual(len(result.failed), 3)
+        self.assertTrue(all("outside the workspace" in reason or "relative" in reason for _, reason in result.failed))
+        self.assertEqual(len(result.applied), 1)
+        self.assertFalse(outside.exists())
+        self.assertTrue((self.root / "a.py").exists())
+        self.assertEqual((root / "a.py").read_text(), "changed\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
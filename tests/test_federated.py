@@ -0,0 +1,148 @@
+"""
+Tests for federated search across workspace indexes.
+"""
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer import IndexingEngine
+    from core.indexer.federated import SharedIndex, federated_search, merge_results
+    from tests.fakes import FakeEmbeddingBackend
+    FEDERATED_AVAILABLE = True
+except ImportError as e:
+    FEDERATED_AVAILABLE = False
+    print(f"Warning: Could not import federated search: {e}")
+
+
+class TestMergeResults(unittest.TestCase):
+    """Test cases for merge_results."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not FEDERATED_AVAILABLE:
+            self.skipTest("Federated search dependencies not available")
+
+    def test_merges_by_distance(self):
+        """Test that hits from all repos are ranked by distance."""
+        merged = merge_results({
+            "a": [{"id": "a1", "_distance": 0.1}, {"id": "a2", "_distance": 2.0}],
+            "b": [{"id": "b1", "_distance": 0.5}],
+        }, top_k=2)
+        self.assertEqual([hit["id"] for hit in merged], ["a1", "b1"])
+        self.assertEqual(merged[1]["repo"], "b")
+
+    def test_minmax_normalizes_per_repo(self):
+        """Test that minmax puts every repo's best hit at 1.0."""
+        merged = merge_results({
+            "a": [{"id": "a1", "_distance": 0.1}, {"id": "a2", "_distance": 0.2}],
+            "b": [{"id": "b1", "_distance": 5.0}, {"id": "b2", "_distance": 9.0}],
+        }, top_k=4, normalize="minmax")
+        best = {hit["repo"]: hit["score"] for hit in merged if hit["id"] in ("a1", "b1")}
+        self.assertEqual(best, {"a": 1.0, "b": 1.0})
+
+    def test_unknown_normalization(self):
+        """Test that an unknown normalization is rejected."""
+        with self.assertRaises(ValueError):
+            merge_results({}, top_k=1, normalize="zscore")
+
+
+class TestFederatedSearch(unittest.TestCase):
+    """Test cases for federated_search and SharedIndex."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not FEDERATED_AVAILABLE:
+            self.skipTest("Federated search dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        self.embedder = FakeEmbeddingBackend()
+        self.engines = {}
+        for name in ("billing", "gateway", "search"):
+            workspace = Path(self.test_dir) / name
+            workspace.mkdir()
+            (workspace / "service.py").write_text(
+                f"def {name}_rate_limiter(request):\n"
+                "    limit = request.get('limit')\n"
+                "    if limit is None:\n"
+                "        return 100\n"
+                "    return limit\n"
+            )
+            engine = IndexingEngine(
+                workspace_path=str(workspace),
+                vector_db_path=str(workspace / ".opencode" / "index"),
+                embedder=self.embedder
+            )
+            engine.index()
+            self.engines[name] = engine
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_results_are_tagged_with_repo(self):
+        """Test that one query returns hits from every repo."""
+        result = federated_search(self.engines, "rate limiter", top_k=10)
+        self.assertEqual(result["errors"], {})
+        self.assertEqual({hit["repo"] for hit in result["results"]}, set(self.engines))
+        scores = [hit["score"] for hit in result["results"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_missing_index_is_reported(self):
+        """Test that an unindexed workspace does not fail the query."""
+        empty = Path(self.test_dir) / "empty"
+        empty.mkdir()
+        engines = dict(self.engines, empty=IndexingEngine(
+            workspace_path=str(empty),
+            vector_db_path=str(empty / ".opencode" / "index"),
+            embedder=self.embedder
+        ))
+        result = federated_search(engines, "rate limiter", top_k=10)
+        self.assertIn("empty", result["errors"])
+        self.assertEqual(len(result["results"]), 3)
+
+    def test_shared_index_filters_by_repo(self):
+        """Test the shared multi-repo table and its repo partitions."""
+        shared = SharedIndex(str(Path(self.test_dir) / "shared"))
+        for name, engine in self.engines.items():
+            self.assertEqual(shared.sync(name, engine), 1)
+        # Re-syncing replaces the partition instead of duplicating it
+        shared.sync("gateway", self.engines["gateway"])
+        self.assertEqual(shared.repos(), ["billing", "gateway", "search"])
+
+        vector = self.engines["billing"].embed_query("rate limiter")
+        self.assertEqual(len(shared.search(vector, top_k=10)), 3)
+        hits = shared.search(vector, top_k=10, repos=["gateway"])
+        self.assertEqual([hit["repo"] for hit in hits], ["gateway"])
+
+    def test_shared_index_separates_embedding_models(self):
+        """Test that shared searches only match rows of the query's model."""
+        embedder = FakeEmbeddingBackend(dimensions={"nomic-embed-text": 8, "other-embed": 8, "wide-embed": 16})
+        engines = {}
+        for name, model in (("billing", "nomic-embed-text"), ("gateway", "other-embed"), ("search", "wide-embed")):
+            workspace = Path(self.test_dir) / name
+            engines[name] = IndexingEngine(
+                workspace_path=str(workspace),
+                vector_db_path=str(workspace / ".opencode" / model),
+                embedding_model=model,
+                embedder=embedder
+            )
+            engines[name].index()
+        shared = SharedIndex(str(Path(self.test_dir) / "shared"))
+        shared.sync("billing", engines["billing"])
+        shared.sync("gateway", engines["gateway"])
+
+        vector = engines["gateway"].embed_query("rate limiter")
+        hits = shared.search(vector, top_k=10, embedding_model="other-embed")
+        self.assertEqual([hit["repo"] for hit in hits], ["gateway"])
+        # Vectors of another size cannot share the table
+        with self.assertRaises(ValueError):
+            shared.sync("search", engines["search"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+"""
+Tests for the in-memory flat search backend.
+"""
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+from unittest import mock
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    import lancedb
+    from core.indexer import IndexingEngine
+    from core.indexer.flat import FlatIndex
+    from tests.fakes import FakeEmbeddingBackend
+    FLAT_AVAILABLE = True
+except ImportError as e:
+    FLAT_AVAILABLE = False
+    print(f"Warning: Could not import FlatIndex: {e}")
+
+
+class TestFlatIndex(unittest.TestCase):
+    """Test cases for FlatIndex."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not FLAT_AVAILABLE:
+            self.skipTest("Flat index dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(size=(200, 16)).astype(np.float32)
+        db = lancedb.connect(str(Path(self.test_dir) / "db"))
+        self.table = db.create_table("t", [
+            {"id": str(i), "content": f"chunk {i}", "vector": vector.tolist()}
+            for i, vector in enumerate(self.vectors)
+        ])
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _expected(self, query, top_k):
+        unit = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        scores = unit @ (query / np.linalg.norm(query))
+        return [str(i) for i in np.argsort(-scores)[:top_k]]
+
+    def test_search_matches_brute_force(self):
+        """Test top-k by cosine similarity, best first."""
+        flat = FlatIndex(str(Path(self.test_dir) / "flat"))
+        flat.build(self.table, self.table.version)
+        query = np.random.default_rng(1).normal(size=16).astype(np.float32)
+        hits = flat.search(query, top_k=5)
+        self.assertEqual([hit["id"] for hit in hits], self._expected(query, 5))
+        self.assertNotIn("vector", hits[0])
+        distances = [hit["_distance"] for hit in hits]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_search_many_matches_single_searches(self):
+        """Test that the matrix-matrix product gives the same hits."""
+        flat = FlatIndex(str(Path(self.test_dir) / "flat"))
+        flat.build(self.table, self.table.version)
+        queries = list(np.random.default_rng(2).normal(size=(3, 16)).astype(np.float32))
+        grouped = flat.search_many(queries, top_k=4)
+        for query, hits in zip(queries, grouped):
+            self.assertEqual([hit["id"] for hit in hits], [hit["id"] for hit in flat.search(query, top_k=4)])
+
+    def test_load_maps_the_current_version(self):
+        """Test that another instance (or process) maps the built matrix."""
+        path = str(Path(self.test_dir) / "flat")
+        FlatIndex(path).build(self.table, self.table.version)
+        flat = FlatIndex(path)
+        self.assertTrue(flat.load())
+        self.assertTrue(flat.is_current(self.table.version))
+        self.assertIsInstance(flat.vectors, np.memmap)
+        self.assertFalse(FlatIndex(path, dtype="float16").load())
+
+    def test_update_matches_build(self):
+        """Test that patching the changed files gives the same index as a rebuild."""
+        db = lancedb.connect(str(Path(self.test_dir) / "db"))
+        rng = np.random.default_rng(3)
+        table = db.create_table("files", [
+            {"id": str(i), "file_path": f"f{i % 10}.py", "content": f"chunk {i}", "vector": rng.normal(size=16).tolist()}
+            for i in range(100)
+        ])
+        flat = FlatIndex(str(Path(self.test_dir) / "flat"))
+        flat.build(table, table.version)
+        self.assertEqual(flat.rows.column_names, ["id", "file_path"])
+
+        table.delete("file_path IN ('f1.py', 'f2.py')")
+        table.add([
+            {"id": f"new{i}", "file_path": "f1.py", "content": "new", "vector": rng.normal(size=16).tolist()}
+            for i in range(3)
+        ])
+        self.assertTrue(flat.update(table, table.version, ["f1.py", "f2.py"]))
+        rebuilt = FlatIndex(str(Path(self.test_dir) / "rebuilt"))
+        rebuilt.build(table, table.version)
+
+        self.assertTrue(flat.is_current(table.version))
+        self.assertEqual(len(flat), 83)
+        query = rng.normal(size=16).astype(np.float32)
+        self.assertEqual([hit["id"] for hit in flat.search(query, top_k=20)],
+                         [hit["id"] for hit in rebuilt.search(query, top_k=20)])
+        hits = flat.fetch_rows(table, flat.search(query, top_k=5))
+        self.assertTrue(all(hit["content"] for hit in hits))
+        self.assertNotIn("vector", hits[0])
+
+    def test_float16(self):
+        """Test that half precision returns the same nearest neighbour."""
+        flat = FlatIndex(str(Path(self.test_dir) / "flat16"), dtype="float16")
+        flat.build(self.table, self.table.version)
+        query = self.vectors[7]
+        self.assertEqual(flat.search(query, top_k=1)[0]["id"], "7")
+
+
+class TestFlatBackend(unittest.TestCase):
+    """Test cases for IndexingEngine with the flat backend."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not FLAT_AVAILABLE:
+            self.skipTest("Flat index dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        self.workspace = Path(self.test_dir) / "workspace"
+        self.workspace.mkdir()
+        for name in ("alpha", "beta", "gamma", "delta"):
+            (self.workspace / f"{name}.py").write_text(
+                f"def {name}(items):\n"
+                "    total = 0\n"
+                "    for item in items:\n"
+                "        total += item\n"
+                "    return total\n"
+            )
+        self.embedder = FakeEmbeddingBackend(dimensions=16, unit=True)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _engine(self, backend):
+        engine = IndexingEngine(
+            workspace_path=str(self.workspace),
+            vector_db_path=str(Path(self.test_dir) / "index"),
+            embedder=self.embedder,
+            search_backend=backend
+        )
+        if "python" not in engine.parsers:
+            self.skipTest("tree-sitter-python not available")
+        return engine
+
+    def test_flat_matches_lancedb(self):
+        """Test that both backends rank unit vectors the same way."""
+        flat = self._engine("flat")
+        flat.index()
+        self.assertTrue(flat.flat.is_current(flat.read_version))
+        lance = self._engine("lancedb")
+
+        for query in ("alpha", "sum of items"):
+            expected = [hit["id"] for hit in lance.search(query, top_k=3)]
+            self.assertEqual([hit["id"] for hit in flat.search(query, top_k=3)], expected)
+        self.assertEqual(
+            [[hit["id"] for hit in hits] for hits in flat.search_many(["alpha", "beta"], top_k=2)],
+            [[hit["id"] for hit in hits] for hits in lance.search_many(["alpha", "beta"], top_k=2)]
+        )
+
+    def test_backends_return_the_same_columns(self):
+        """Test that hits have the same keys, without vectors, on both backends."""
+        flat = self._engine("flat")
+        flat.index()
+        lance = self._engine("lancedb")
+        self.assertEqual(set(flat.search("alpha", top_k=1)[0]), set(lance.search("alpha", top_k=1)[0]))
+        self.assertNotIn("vector", lance.search("alpha", top_k=1)[0])
+        self.assertEqual(
+            set(flat.search_many(["alpha", "beta"], top_k=1)[0][0]),
+            set(lance.search_many(["alpha", "beta"], top_k=1)[0][0])
+        )
+
+    def test_flat_follows_reindex(self):
+        """Test that the matrix is rebuilt when the table changes."""
+        engine = self._engine("auto")
+        engine.index()
+        (self.workspace / "delta.py").unlink()
+        engine.index()
+        self.assertEqual(len(engine.flat), 3)
+        self.assertTrue(engine.flat.is_current(engine.read_version))
+
+    def test_update_files_patches_the_matrix(self):
+        """Test that a one-file update does not rebuild from the whole table."""
+        engine = self._engine("flat")
+        engine.index()
+        (self.workspace / "beta.py").write_text("def beta():\n    return 'changed'\n")
+        with mock.patch.object(FlatIndex, "build", side_effect=AssertionError("full rebuild")):
+            engine.update_files([self.workspace / "beta.py"])
+        self.assertTrue(engine.flat.is_current(engine.read_version))
+        self.assertEqual(len(engine.flat), 4)
+        hit = engine.search("beta changed", top_k=4)
+        self.assertIn("return 'changed'", next(h["content"] for h in hit if h["file_path"] == "beta.py"))
+
+    def test_auto_skips_large_indexes(self):
+        """Test that auto mode leaves large indexes to LanceDB."""
+        engine = self._engine("auto")
+        engine.FLAT_MAX_ROWS = 2
+        engine.index()
+        self.assertEqual(len(engine.flat), 0)
+        self.assertEqual(len(engine.search("alpha", top_k=2)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+"""
+Tests for coarse-to-fine (directory -> file -> chunk) search.
+"""
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+from unittest import mock
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    from core.indexer import IndexingEngine
+    from core.indexer.filters import SearchFilters
+    from core.indexer.hierarchy import HierarchyIndex
+    from tests.fakes import FakeEmbeddingBackend
+    HIERARCHY_AVAILABLE = True
+except ImportError as e:
+    HIERARCHY_AVAILABLE = False
+    print(f"Warning: Could not import HierarchyIndex: {e}")
+
+
+class TestHierarchyIndex(unittest.TestCase):
+    """Test cases for HierarchyIndex."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not HIERARCHY_AVAILABLE:
+            self.skipTest("Hierarchy dependencies not available")
+        axes = np.eye(4, dtype=np.float32)
+        self.paths = ["pay/api.py", "pay/api.py", "pay/db.py", "ui/view.py", "ui/view.py", "main.py"]
+        self.vectors = np.stack([axes[0], axes[0], axes[0] + axes[1], axes[2], axes[2], axes[3]])
+        self.hierarchy = HierarchyIndex(self.paths, self.vectors, version=3)
+
+    def test_summaries(self):
+        """Test one pooled vector per file and per ancestor directory."""
+        self.assertEqual(self.hierarchy.files, ["main.py", "pay/api.py", "pay/db.py", "ui/view.py"])
+        self.assertEqual(sorted(self.hierarchy.directories), ["pay", "ui"])
+        norms = np.linalg.norm(self.hierarchy.file_vectors, axis=1)
+        np.testing.assert_allclose(norms, 1.0, rtol=1e-6)
+        self.assertEqual(self.hierarchy.stats(), {"files": 4, "directories": 2, "version": 3})
+
+    def test_top_files_and_directories(self):
+        """Test ranking by summary similarity, optionally inside directories."""
+        query = np.array([1, 0, 0, 0], dtype=np.float32)
+        self.assertEqual(self.hierarchy.top_directories(query, 1), ["pay"])
+        self.assertEqual(self.hierarchy.top_files(query, 2), ["pay/api.py", "pay/db.py"])
+        self.assertEqual(self.hierarchy.top_files(query, 2, directories=["ui"]), ["ui/view.py"])
+
+    def test_narrow_falls_back_outside_directories(self):
+        """Test that too few files in the best directories are topped up from all files."""
+        query = np.array([0, 0, 1, 0], dtype=np.float32)
+        self.assertEqual(self.hierarchy.narrow(query, files=1, directories=1), ["ui/view.py"])
+        narrowed = self.hierarchy.narrow(query, files=3, directories=1)
+        self.assertEqual(narrowed[0], "ui/view.py")
+        self.assertEqual(len(narrowed), 3)
+
+
+class TestHierarchicalSearch(unittest.TestCase):
+    """Test cases for IndexingEngine with hierarchical search."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not HIERARCHY_AVAILABLE:
+            self.skipTest("Hierarchy dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        self.workspace = Path(self.test_dir) / "workspace"
+        for directory, topic in (("billing", "payment"), ("query", "search"), ("views", "render")):
+            (self.workspace / directory).mkdir(parents=True)
+            for i in range(3):
+                (self.workspace / directory / f"{topic}_{i}.py").write_text(
+                    f"def {topic}_{i}(items):\n"
+                    f"    # {topic} step {i}\n"
+                    "    for item in items:\n"
+                    "        yield item\n"
+                    "    return None\n"
+                )
+        # One payment function hidden in a file about rendering
+        (self.workspace / "views" / "render_3.py").write_text(
+            "def render_header(items):\n    # render step\n    for item in items:\n        yield item\n    return None\n\n"
+            "def render_footer(items):\n    # render step\n    for item in items:\n        yield item\n    return None\n\n"
+            "def payment_total(items):\n    # payment step\n    for item in items:\n        yield item\n    return None\n"
+        )
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _engine(self, backend):
+        engine = IndexingEngine(
+            workspace_path=str(self.workspace),
+            vector_db_path=str(Path(self.test_dir) / f"index-{backend}"),
+            embedder=FakeEmbeddingBackend(topics=("payment", "search", "render", "auth")),
+            search_backend=backend
+        )
+        if "python" not in engine.parsers:
+            self.skipTest("tree-sitter-python not available")
+        engine.HIERARCHY_FILES = 2
+        engine.HIERARCHY_DIRECTORIES = 1
+        engine.index()
+        return engine
+
+    def _count_narrowing(self, engine):
+        calls = []
+        narrow = engine._narrow
+        engine._narrow = lambda *args: calls.append(args) or narrow(*args)
+        return calls
+
+    def test_narrows_to_best_files(self):
+        """Test that only chunks of the best matching files are searched."""
+        for backend in ("flat", "lancedb"):
+            engine = self._engine(backend)
+            flat_files = {hit["file_path"] for hit in engine.search("payment", top_k=4, hierarchical=False)}
+            self.assertIn(str(Path("views") / "render_3.py"), flat_files)
+
+            hits = engine.search("payment", top_k=2, hierarchical=True)
+            self.assertEqual(len(hits), 2)
+            self.assertTrue(all(hit["file_path"].startswith("billing") for hit in hits))
+
+    def test_search_many_narrows_per_query(self):
+        """Test that every query of a batch narrows to its own files."""
+        engine = self._engine("auto")
+        grouped = engine.search_many(["payment", "search"], top_k=2, hierarchical=True)
+        self.assertTrue(all(hit["file_path"].startswith("billing") for hit in grouped[0]))
+        self.assertTrue(all(hit["file_path"].startswith("query") for hit in grouped[1]))
+
+    def test_auto_and_filters(self):
+        """Test the size threshold and that explicit filters disable narrowing."""
+        engine = self._engine("auto")
+        calls = self._count_narrowing(engine)
+        engine.search("payment", top_k=2)
+        self.assertEqual(len(calls), 0)
+        engine.HIERARCHY_MIN_ROWS = 1
+        engine.search("payment", top_k=2)
+        self.assertEqual(len(calls), 1)
+
+        hits = engine.search("payment", top_k=2, filters=SearchFilters(path_prefix="views"), hierarchical=True)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(hits)
+        self.assertTrue(all(hit["file_path"].startswith("views") for hit in hits))
+
+    def test_hierarchy_follows_reindex(self):
+        """Test that summaries are pooled again for a new index version."""
+        engine = self._engine("lancedb")
+        first = engine.hierarchy()
+        self.assertIs(engine.hierarchy(), first)
+        shutil.rmtree(self.workspace / "views")
+        engine.index()
+        self.assertEqual(len(engine.hierarchy().files), 6)
+
+    def test_update_repools_only_changed_files(self):
+        """Test that a small write re-pools the changed files and matches a full pooling."""
+        engine = self._engine("lancedb")
+        engine.hierarchy()
+        (self.workspace / "views" / "render_3.py").write_text(
+            "def payment_total(items):\n    # payment step\n    for item in items:\n        yield item\n    return None\n"
+        )
+        (self.workspace / "billing" / "payment_0.py").unlink()
+        engine.update_files([self.workspace / "views" / "render_3.py"], removed=[str(Path("billing") / "payment_0.py")])
+
+        reads = []
+        read = HierarchyIndex._read
+        with mock.patch.object(HierarchyIndex, "from_table", side_effect=AssertionError("full pooling")), \
+                mock.patch.object(HierarchyIndex, "_read", side_effect=lambda *args: reads.append(args[1:]) or read(*args)):
+            updated = engine.hierarchy()
+        self.assertEqual(len(reads), 1)
+        self.assertIn("render_3.py", reads[0][0])
+
+        snapshot = engine.open_table()
+        full = HierarchyIndex.from_table(snapshot, snapshot.version)
+        self.assertEqual(updated.version, snapshot.version)
+        self.assertEqual(updated.files, full.files)
+        np.testing.assert_allclose(updated.file_vectors, full.file_vectors, atol=1e-6)
+        self.assertEqual(updated.directories, full.directories)
+        np.testing.assert_allclose(updated.directory_vectors, full.directory_vectors, atol=1e-6)
+
+    def test_pooling_reads_only_paths_and_vectors(self):
+        """Test that summaries are pooled without loading the chunk content."""
+        engine = self._engine("lancedb")
+        snapshot = engine.open_table()
+        with mock.patch.object(type(snapshot), "to_arrow", side_effect=AssertionError("full table read")):
+            hierarchy = HierarchyIndex.from_table(snapshot, snapshot.version)
+        self.assertEqual(len(hierarchy.files), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
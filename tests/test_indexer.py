@@ -12,6 +12,10 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 try:
     from core.indexer import IndexingEngine, CodeChunk
+    from core.indexer.parse_cache import ParseCache
+    from core.indexer.filters import SearchFilters, glob_to_like
+    from core.indexer.rerank import Reranker, RerankStage
+    from tests.fakes import FakeEmbeddingBackend
     INDEXER_AVAILABLE = True
 except ImportError as e:
     INDEXER_AVAILABLE = False
@@ -103,6 +107,250 @@ class Test:
         # (exact count depends on tree-sitter availability)
         self.assertIsInstance(chunks, list)
 
+    
+    def test_chunk_file_reuses_parse_cache(self):
+        """Re-chunking an unchanged file is a cache hit; a small edit reparses incrementally."""
+        indexer = IndexingEngine(
+            workspace_path=str(self.workspace_path),
+            vector_db_path=str(self.index_path)
+        )
+        if "python" not in indexer.parsers:
+            self.skipTest("tree-sitter-python not available")
+        
+        test_file = self.workspace_path / "test.py"
+        test_file.write_text("def hello():\n    a = 1\n    b = 2\n    c = 3\n    return a\n")
+        first = indexer.chunk_file(test_file)
+        indexer.chunk_file(test_file)
+        self.assertEqual(indexer.parse_cache.hits, 1)
+        
+        indexer.notify_file_changed(test_file, test_file.read_bytes().replace(b"a = 1", b"a = 10"))
+        self.assertEqual(indexer.parse_cache.incremental, 1)
+        self.assertEqual(first[0].metadata["symbol"], "hello")
+
+    def test_chunk_file_covers_module_code(self):
+        """Top-level code between definitions becomes module chunks."""
+        indexer = IndexingEngine(
+            workspace_path=str(self.workspace_path),
+            vector_db_path=str(self.index_path)
+        )
+        if "python" not in indexer.parsers:
+            self.skipTest("tree-sitter-python not available")
+
+        test_file = self.workspace_path / "test.py"
+        test_file.write_text(
+            "import os\nLIMIT = 10\n\n"
+            "def hello():\n    a = 1\n    b = 2\n    c = 3\n    return a + b + c\n\n"
+            "if __name__ == '__main__':\n    hello()\n"
+        )
+        chunks = indexer.chunk_file(test_file)
+        self.assertEqual([c.node_type for c in chunks], ["function_definition", "module", "module"])
+        self.assertIn("LIMIT = 10", chunks[1].content)
+        self.assertIn("__main__", chunks[2].content)
+        self.assertEqual(chunks[2].start_line, 10)
+
+
+class TestParseCache(unittest.TestCase):
+    """Test cases for ParseCache."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        if not INDEXER_AVAILABLE:
+            self.skipTest("Indexer dependencies not available")
+        from core.indexer.engine import load_parsers
+        self.parsers = load_parsers()
+        if "python" not in self.parsers:
+            self.skipTest("tree-sitter-python not available")
+    
+    def test_incremental_tree_matches_full_parse(self):
+        """An incrementally updated tree equals a fresh parse of the new source."""
+        cache = ParseCache(self.parsers)
+        cache.parse("a.py", b"def f():\n    return 1\n", "python")
+        tree = cache.parse("a.py", b"def f():\n    x = 2\n    return x\n", "python")
+        fresh = self.parsers["python"].parse(b"def f():\n    x = 2\n    return x\n")
+        self.assertEqual(str(tree.root_node), str(fresh.root_node))
+        self.assertEqual(cache.stats()["incremental"], 1)
+    
+    def test_memory_budget_evicts_least_recently_used(self):
+        """Entries beyond the memory budget are evicted oldest first."""
+        source = b"x = 1\n" * 10
+        cache = ParseCache(self.parsers, max_bytes=len(source) * 11 * 2)
+        cache.parse("a.py", source, "python")
+        cache.parse("b.py", source, "python")
+        cache.parse("a.py", source, "python")
+        cache.parse("c.py", source, "python")
+        self.assertEqual(cache.stats()["entries"], 2)
+        cache.parse("a.py", source, "python")
+        self.assertEqual(cache.hits, 2)
+
+
+class TestSearch(unittest.TestCase):
+    """Test cases for single and batched search."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        if not INDEXER_AVAILABLE:
+            self.skipTest("Indexer dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        workspace = Path(self.test_dir) / "workspace"
+        for name, directory in (("alpha", "src/payments"), ("beta", "src"), ("gamma", "lib")):
+            (workspace / directory).mkdir(parents=True, exist_ok=True)
+            (workspace / directory / f"{name}.py").write_text(
+                f"def {name}(items):\n"
+                "    total = 0\n"
+                "    for item in items:\n"
+                "        total += item\n"
+                "    return total\n"
+            )
+        self.embedder = FakeEmbeddingBackend()
+        self.indexer = IndexingEngine(
+            workspace_path=str(workspace),
+            vector_db_path=str(Path(self.test_dir) / "index"),
+            embedder=self.embedder
+        )
+        if "python" not in self.indexer.parsers:
+            self.skipTest("tree-sitter-python not available")
+        self.indexer.index()
+    
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+    
+    def test_search_many_matches_single_searches(self):
+        """Batched search returns the same hits as one search per query."""
+        queries = ["sum items", "alpha", "loop over a list"]
+        calls = len(self.embedder.batches)
+        grouped = self.indexer.search_many(queries, top_k=2)
+        self.assertEqual(len(self.embedder.batches), calls + 1)
+        
+        self.assertEqual(len(grouped), len(queries))
+        for query, results in zip(queries, grouped):
+            single = self.indexer.search(query, top_k=2)
+            self.assertEqual([r["id"] for r in results], [r["id"] for r in single])
+            self.assertNotIn("query_index", results[0])
+    
+    def test_filters_are_applied_before_ranking(self):
+        """Scoped searches return every match in scope, not a filtered global top-k."""
+        hits = self.indexer.search("alpha", top_k=1, filters=SearchFilters(path_prefix="src/payments"))
+        self.assertEqual([h["file_path"] for h in hits], [str(Path("src/payments/alpha.py"))])
+        
+        hits = self.indexer.search("x", top_k=10, filters=SearchFilters(path_glob="src/**/*.py"))
+        self.assertEqual(len(hits), 2)
+        
+        # "**/" matches zero or more directories, never part of a file name
+        hits = self.indexer.search("x", top_k=10, filters=SearchFilters(path_glob="src/**/beta.py"))
+        self.assertEqual([h["file_path"] for h in hits], [str(Path("src/beta.py"))])
+        self.assertEqual(self.indexer.search("x", top_k=10, filters=SearchFilters(path_glob="src/**/eta.py")), [])
+        
+        hits = self.indexer.search("x", top_k=10, filters=SearchFilters(language="typescript"))
+        self.assertEqual(hits, [])
+        
+        hits = self.indexer.search("x", top_k=10, filters=SearchFilters(modified_since=0, node_type="function_definition"))
+        self.assertEqual(len(hits), 3)
+    
+    def test_metadata_is_stored_in_typed_columns(self):
+        """Symbol and byte offsets are columns instead of a JSON string."""
+        hit = self.indexer.search("gamma", top_k=1, filters=SearchFilters(path_prefix="lib"))[0]
+        self.assertEqual(hit["symbol"], "gamma")
+        self.assertEqual(hit["start_byte"], 0)
+        self.assertGreater(hit["mtime"], 0)
+        self.assertNotIn("metadata", hit)
+    
+    def test_reranker_reorders_candidate_pool(self):
+        """The reranker sees a larger pool and its best candidate wins."""
+        class SymbolReranker(Reranker):
+            name = "symbol"
+            
+            def score(self, query, passages):
+                return [1.0 if f"def {query}" in passage else 0.0 for passage in passages]
+        
+        self.indexer.reranker = RerankStage(SymbolReranker(), pool_factor=3)
+        hits = self.indexer.search("beta", top_k=1)
+        self.assertEqual(hits[0]["symbol"], "beta")
+        self.assertEqual(hits[0]["rerank_score"], 1.0)
+        self.assertNotIn("rerank_score", self.indexer.search("beta", top_k=1, rerank=False)[0])
+        
+        grouped = self.indexer.search_many(["alpha", "gamma"], top_k=1)
+        self.assertEqual([g[0]["symbol"] for g in grouped], ["alpha", "gamma"])
+    
+    def _append_chunks(self, times):
+        chunks = self.indexer.chunk_file(self.indexer.workspace_path / "lib" / "gamma.py")
+        for _ in range(times):
+            self.indexer._store_in_db(chunks, self.indexer.generate_embeddings(chunks))
+    
+    def test_reads_are_pinned_during_reindex(self):
+        """Searches see the previous index until a re-index is fully written."""
+        seen = []
+        create_indexes = self.indexer._create_scalar_indexes
+        
+        def create_indexes_and_search():
+            create_indexes()
+            seen.append(len(self.indexer.search("x", top_k=10)))
+        
+        self.indexer._create_scalar_indexes = create_indexes_and_search
+        self._append_chunks(1)
+        self.assertEqual(len(self.indexer.search("x", top_k=10)), 4)
+        
+        version = self.indexer.read_version
+        self.indexer.index()
+        self.assertEqual(seen, [4])
+        self.assertGreater(self.indexer.read_version, version)
+        self.assertEqual(len(self.indexer.search("x", top_k=10)), 3)
+    
+    def test_optimize_compacts_fragments(self):
+        """Maintenance merges small fragments and re-indexes new rows."""
+        self.indexer.OPTIMIZE_SMALL_FRAGMENTS = 100
+        self._append_chunks(4)
+        before = self.indexer.index_stats()
+        self.assertEqual(before["fragments"], 5)
+        self.assertLess(before["indices"]["language"]["coverage"], 1.0)
+        
+        after = self.indexer.optimize()
+        self.assertLess(after["fragments"], before["fragments"])
+        self.assertEqual(after["rows"], 7)
+        self.assertEqual(after["indices"]["language"]["coverage"], 1.0)
+        self.assertEqual(after["read_version"], after["latest_version"])
+    
+    def test_maintenance_runs_when_fragments_accumulate(self):
+        """maybe_optimize compacts once the small-fragment threshold is reached."""
+        self.indexer.OPTIMIZE_SMALL_FRAGMENTS = 3
+        self._append_chunks(2)
+        self.assertLess(self.indexer.index_stats()["fragments"], 3)
+        self.assertFalse(self.indexer.maybe_optimize())
+    
+    def test_search_many_empty(self):
+        """No queries means no work."""
+        self.assertEqual(self.indexer.search_many([]), [])
+
+
+class TestSearchFilters(unittest.TestCase):
+    """Test cases for SearchFilters."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        if not INDEXER_AVAILABLE:
+            self.skipTest("Indexer dependencies not available")
+    
+    def test_empty_filters(self):
+        self.assertTrue(SearchFilters().is_empty())
+        self.assertIsNone(SearchFilters().to_where())
+    
+    def test_where_clause(self):
+        where = SearchFilters(language=["python", "tsx"], path_prefix="./src/it's").to_where()
+        self.assertEqual(
+            where,
+            "language IN ('python', 'tsx') AND file_path LIKE 'src/it''s%' ESCAPE '\\'"
+        )
+    
+    def test_glob_to_like(self):
+        self.assertEqual(glob_to_like("src/*.ts"), ["src/%.ts"])
+        self.assertEqual(glob_to_like("src/**/*.ts"), ["src/%.ts", "src/%/%.ts"])
+        self.assertEqual(glob_to_like("**/test_?.py"), ["test\\__.py", "%/test\\__.py"])
+    
+    def test_double_star_does_not_match_file_name_suffixes(self):
+        """"**/" matches whole directories, not the start of a file name."""
+        where = SearchFilters(path_glob="src/**/foo.py").to_where()
+        self.assertEqual(where, "(file_path LIKE 'src/foo.py' ESCAPE '\\' OR file_path LIKE 'src/%/foo.py' ESCAPE '\\')")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for the backend load-test harness.
+"""
+import sys
+import unittest
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.benchmark import Latency, MockOllamaServer
+    from core.benchmark.load import Endpoint, drive, percentile, run_load_test
+    LOAD_AVAILABLE = True
+except ImportError as e:
+    LOAD_AVAILABLE = False
+    print(f"Warning: Could not import load-test harness: {e}")
+
+
+class TestLoadHarness(unittest.TestCase):
+    """Test cases for percentiles and the closed-loop request driver."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not LOAD_AVAILABLE:
+            self.skipTest("Load-test dependencies not available")
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = [i / 100 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 0.5)
+        self.assertEqual(percentile(values, 99), 0.99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_drive_reports_per_endpoint(self):
+        """Test request counts, status codes and latencies per endpoint."""
+        endpoints = {
+            "version": Endpoint("version", "GET", "/api/version"),
+            "embed": Endpoint("embed", "POST", "/api/embed", lambda n: {"model": "m", "input": [f"text {n}"]}),
+            "missing": Endpoint("missing", "GET", "/api/missing"),
+        }
+        with MockOllamaServer(latency=Latency(embed_seconds=0.01), dimensions=4) as server:
+            result = drive(server.url, endpoints, {"version": 1, "embed": 1, "missing": 1},
+                           concurrency=4, duration=10.0, requests=60)
+            stats = server.stats()
+
+        self.assertEqual(result["total"]["requests"], 60)
+        self.assertEqual(result["endpoints"]["embed"]["requests"], stats["embed_requests"])
+        self.assertEqual(result["endpoints"]["version"]["status"], {"200": result["endpoints"]["version"]["requests"]})
+        self.assertEqual(result["endpoints"]["missing"]["errors"], result["endpoints"]["missing"]["requests"])
+        embed = result["endpoints"]["embed"]
+        self.assertGreaterEqual(embed["p50_ms"], 10)
+        self.assertLessEqual(embed["p50_ms"], embed["p95_ms"])
+        self.assertLessEqual(embed["p95_ms"], embed["p99_ms"])
+        self.assertGreater(result["total"]["requests_per_second"], 0)
+
+    def test_rejects_unknown_endpoints(self):
+        """Test that an invalid mix fails before any server is started."""
+        with self.assertRaises(ValueError):
+            run_load_test(mix={"search": 1, "upload": 1})
+        with self.assertRaises(ValueError):
+            run_load_test(mix={"search": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Tests for online embedding-model migration.
+"""
+import json
+import unittest
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer import IndexingEngine
+    from core.api.registry import EngineRegistry
+    from tests.fakes import FakeEmbeddingBackend
+    MIGRATION_AVAILABLE = True
+except ImportError as e:
+    MIGRATION_AVAILABLE = False
+    print(f"Warning: Could not import migration: {e}")
+
+
+DIMENSIONS = {"old-model": 8, "new-model": 12}
+
+
+if MIGRATION_AVAILABLE:
+    class ModelBackend(FakeEmbeddingBackend):
+        """Per-model deterministic vectors; "new-model" calls can be held back."""
+
+        def __init__(self, **kwargs):
+            super().__init__(dimensions=DIMENSIONS, cache_entries=0, **kwargs)
+            self.release = threading.Event()
+            self.release.set()
+            self.blocked = threading.Event()
+
+        def embed(self, texts, model, use_ollama=True, **kwargs):
+            # Holds back the migration thread, not the shared embedding worker
+            if model == "new-model" and not self.release.is_set():
+                self.blocked.set()
+                self.release.wait(10)
+            return super().embed(texts, model, use_ollama, **kwargs)
+
+
+class TestEmbeddingMigration(unittest.TestCase):
+    """Test cases for IndexingEngine.migrate_embedding_model."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not MIGRATION_AVAILABLE:
+            self.skipTest("Migration dependencies not available")
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.workspace = self.test_dir / "workspace"
+        self.workspace.mkdir()
+        for name in ("alpha", "beta", "gamma"):
+            (self.workspace / f"{name}.py").write_text(
+                f"def {name}(items):\n    {name}_total = 0\n    for item in items:\n"
+                f"        {name}_total += item\n    return {name}_total\n"
+            )
+        self.index_path = self.test_dir / "index"
+        self.embedder = ModelBackend()
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.embedder.release.set()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _engine(self, model="old-model"):
+        engine = IndexingEngine(
+            workspace_path=str(self.workspace),
+            vector_db_path=str(self.index_path),
+            embedding_model=model,
+            embedder=self.embedder
+        )
+        if "python" not in engine.parsers:
+            self.skipTest("tree-sitter-python not available")
+        engine.MIGRATION_PAUSE_SECONDS = 0
+        return engine
+
+    def test_index_records_model_and_dimensions(self):
+        """Test the state file, the schema metadata and that reopening keeps the model."""
+        engine = self._engine()
+        engine.index()
+        state = json.loads((self.index_path / "index.json").read_text())
+        self.assertEqual((state["embedding_model"], state["dimensions"]), ("old-model", 8))
+        metadata = engine.open_table().schema.metadata
+        self.assertEqual(metadata[b"opencode.embedding_model"], b"old-model")
+
+        reopened = self._engine("new-model")
+        self.assertEqual(reopened.embedding_model, "old-model")
+        self.assertEqual(len(reopened.search("alpha", top_k=1)), 1)
+
+    def test_migration_cuts_over_when_complete(self):
+        """Test that searches use the old vectors until the new table is complete."""
+        engine = self._engine()
+        engine.index()
+        self.embedder.release.clear()
+        migration = engine.migrate_embedding_model("new-model")
+        self.assertTrue(self.embedder.blocked.wait(5))
+
+        self.assertEqual(engine.embedding_model, "old-model")
+        self.assertEqual(len(engine.search("alpha", top_k=3)), 3)
+        self.assertEqual(engine.index_stats()["migration"]["state"], "running")
+
+        self.embedder.release.set()
+        self.assertTrue(migration.wait(10))
+        self.assertEqual(migration.state, "complete")
+        self.assertEqual(engine.embedding_model, "new-model")
+        self.assertEqual(engine.index_stats()["dimensions"], 12)
+        self.assertEqual(len(engine.search("alpha", top_k=3)), 3)
+        self.assertEqual(len(engine.open_table().to_arrow().column("vector")[0]), 12)
+
+        old_table = json.loads((self.index_path / "index.json").read_text())["retired"][0]
+        engine.optimize()
+        self.assertNotIn(old_table, engine.db.list_tables().tables)
+
+    def test_writes_during_migration_are_carried_over(self):
+        """Test that rows written while migrating reach the new table."""
+        engine = self._engine()
+        engine.index()
+        self.embedder.release.clear()
+        migration = engine.migrate_embedding_model("new-model")
+        self.assertTrue(self.embedder.blocked.wait(5))
+
+        path = self.workspace / "beta.py"
+        path.write_text(path.read_text().replace("beta_total", "beta_sum"))
+        engine.update_files([path])
+        self.embedder.release.set()
+        self.assertTrue(migration.wait(10))
+
+        contents = engine.open_table().to_arrow().column("content").to_pylist()
+        self.assertEqual(len(contents), 3)
+        self.assertTrue(any("beta_sum" in content for content in contents))
+        self.assertFalse(any("beta_total" in content for content in contents))
+
+    def test_interrupted_migration_resumes(self):
+        """Test that a restarted engine only embeds the rows still missing."""
+        engine = self._engine()
+        engine.MIGRATION_BATCH_SIZE = 1
+        engine.index()
+        self.embedder.release.clear()
+        migration = engine.migrate_embedding_model("new-model")
+        self.assertTrue(self.embedder.blocked.wait(5))
+        migration.stop(wait=False)
+        self.embedder.release.set()
+        migration.wait(10)
+        self.assertEqual(migration.state, "stopped")
+        self.assertEqual(len(self.embedder.model_texts["new-model"]), 1)
+
+        restarted = self._engine()
+        self.assertEqual(restarted.pending_model, "new-model")
+        restarted.migrate_embedding_model("new-model", background=False)
+        self.assertEqual(restarted.embedding_model, "new-model")
+        self.assertEqual(len(self.embedder.model_texts["new-model"]), 3)
+
+    def test_registry_migrates_instead_of_replacing(self):
+        """Test that requesting another model keeps the loaded engine."""
+        registry = EngineRegistry(embedder=self.embedder)
+        indexer = registry.indexer(self.workspace, "old-model")
+        if "python" not in indexer.parsers:
+            self.skipTest("tree-sitter-python not available")
+        indexer.MIGRATION_PAUSE_SECONDS = 0
+        indexer.index()
+
+        self.assertIs(registry.indexer(self.workspace, "new-model"), indexer)
+        self.assertTrue(indexer.migration.wait(10))
+        self.assertEqual(indexer.embedding_model, "new-model")
+        registry.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,18 +6,61 @@ import tempfile
 import shutil
 from pathlib import Path
 import sys
+import time
+from unittest import mock
 
 # Add project root to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 try:
     from core.orchestrator import AgentOrchestrator, EditInstruction, TaskPlan, TaskStatus
+    from core.orchestrator.llm import LLMClient
     ORCHESTRATOR_AVAILABLE = True
 except ImportError as e:
     ORCHESTRATOR_AVAILABLE = False
     print(f"Warning: Could not import AgentOrchestrator: {e}")
 
 
+if ORCHESTRATOR_AVAILABLE:
+    class ScriptedClient(LLMClient):
+        """Answers chats with scripted JSON and records the requests."""
+        
+        provider = "scripted"
+        
+        def __init__(self, answers):
+            super().__init__()
+            self.answers = list(answers)
+            self.requests = []
+        
+        def _stream(self, model, messages, format_json, options, usage):
+            self.requests.append((messages, options))
+            yield self.answers.pop(0)
+    
+    class SlowLoserClient(LLMClient):
+        """Plans instantly for seeded candidates and streams endlessly otherwise."""
+        
+        provider = "scripted"
+        
+        def __init__(self, plan):
+            super().__init__()
+            self.plan = plan
+            self.streamed = 0
+            self.closed = False
+        
+        def _stream(self, model, messages, format_json, options, usage):
+            if options.get("seed"):
+                yield self.plan
+                return
+            try:
+                yield '{"steps": ['
+                for _ in range(400):
+                    time.sleep(0.05)
+                    self.streamed += 1
+                    yield " "
+            finally:
+                self.closed = True
+
+
 class TestOrchestrator(unittest.TestCase):
     """Test cases for AgentOrchestrator."""
     
@@ -126,6 +169,117 @@ class TestOrchestrator(unittest.TestCase):
         self.assertTrue(result)
         self.assertFalse(test_file.exists())
 
+    
+    def test_run_loop_speculative_keeps_first_passing_candidate(self):
+        """The first candidate to pass wins and slower candidates are cancelled."""
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace_path),
+            model_config=self.model_config
+        )
+        
+        def fake_plan(goal, context=None, options=None, cancel=None):
+            if options is None:
+                # Candidate 0: verification hangs until cancelled
+                return TaskPlan(
+                    goal=goal,
+                    steps=[EditInstruction(file_path="slow.txt", operation="create", content="slow")],
+                    test_command="sleep 30"
+                )
+            return TaskPlan(
+                goal=goal,
+                steps=[EditInstruction(file_path="fast.txt", operation="create", content="fast")],
+                test_command="test -f fast.txt"
+            )
+        
+        with mock.patch.object(orchestrator, "plan_task", side_effect=fake_plan):
+            start = time.monotonic()
+            result = orchestrator.run_loop("goal", max_iterations=1, candidates=2)
+            elapsed = time.monotonic() - start
+        
+        self.assertEqual(result["status"], TaskStatus.SUCCESS.value)
+        self.assertEqual(result["candidate"], 1)
+        self.assertLess(elapsed, 20)
+        self.assertEqual((self.workspace_path / "fast.txt").read_text(), "fast")
+        self.assertFalse((self.workspace_path / "slow.txt").exists())
+    
+    def test_run_loop_speculative_removes_shadows_of_failing_candidates(self):
+        """A candidate that raises still removes its shadow workspace."""
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace_path),
+            model_config=self.model_config
+        )
+        plan = TaskPlan(
+            goal="goal",
+            steps=[EditInstruction(file_path="a.txt", operation="create", content="a")],
+            test_command="true"
+        )
+        
+        with mock.patch.object(orchestrator, "plan_task", return_value=plan), \
+                mock.patch.object(orchestrator, "_execute_plan", side_effect=RuntimeError("broken")):
+            result = orchestrator.run_loop("goal", max_iterations=1, candidates=2)
+        
+        self.assertEqual(result["status"], TaskStatus.FAILED.value)
+        self.assertEqual(orchestrator.worktrees.live(), [])
+    
+    def test_run_loop_speculative_aborts_losing_generations(self):
+        """Losing candidates stop their generation and have stopped when the winner returns."""
+        client = SlowLoserClient(
+            '{"steps": [{"file_path": "fast.txt", "operation": "create", "content": "fast"}], "test_command": "test -f fast.txt"}'
+        )
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace_path),
+            model_config=self.model_config,
+            llm_client=client
+        )
+        
+        start = time.monotonic()
+        result = orchestrator.run_loop("goal", max_iterations=1, candidates=2)
+        elapsed = time.monotonic() - start
+        
+        self.assertEqual(result["status"], TaskStatus.SUCCESS.value)
+        self.assertEqual(result["candidate"], 1)
+        self.assertLess(elapsed, 10)
+        self.assertTrue(client.closed)
+        self.assertLess(client.streamed, 400)
+        self.assertEqual(orchestrator.worktrees.live(), [])
+    
+    def test_fix_requests_extend_the_job_conversation(self):
+        """Every request of a job starts with the previous request and its answer."""
+        def create(name):
+            return f'{{"steps": [{{"file_path": "{name}", "operation": "create", "content": "x"}}], "test_command": "test -f done.txt"}}'
+        client = ScriptedClient([create("first.txt"), create("second.txt"), create("done.txt")])
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace_path),
+            model_config={**self.model_config, "use_shadow_branch": False},
+            llm_client=client
+        )
+        
+        result = orchestrator.run_loop("create the done file", max_iterations=3)
+        
+        self.assertEqual(result["status"], TaskStatus.SUCCESS.value)
+        self.assertEqual(len(client.requests), 3)
+        (plan, _), (first_fix, _), (second_fix, options) = client.requests
+        self.assertTrue(plan[-1]["content"].endswith("Break this goal down into specific file edits."))
+        self.assertEqual(first_fix[:len(plan)], plan)
+        self.assertEqual(first_fix[len(plan)], {"role": "assistant", "content": create("first.txt")})
+        self.assertEqual(second_fix[:len(first_fix)], first_fix)
+        self.assertIn("test -f done.txt", second_fix[-1]["content"])
+        self.assertEqual(options, {"num_ctx": 8192})
+    
+    def test_verify_changes_cancelled(self):
+        """A set cancel event kills the running verification command."""
+        import threading
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace_path),
+            model_config=self.model_config
+        )
+        cancel = threading.Event()
+        threading.Timer(0.2, cancel.set).start()
+        
+        success, output = orchestrator.verify_changes(test_command="sleep 30", cancel=cancel)
+        self.assertFalse(success)
+        self.assertIn("cancelled", output)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,197 @@
+"""
+Tests for the shared embedding backend and the workspace engine registry.
+"""
+import unittest
+import tempfile
+import shutil
+import threading
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    from core.indexer.embeddings import EmbeddingBackend
+    from core.api.registry import EngineRegistry
+    from tests.fakes import FakeEmbeddingBackend
+    REGISTRY_AVAILABLE = True
+except ImportError as e:
+    REGISTRY_AVAILABLE = False
+    print(f"Warning: Could not import EngineRegistry: {e}")
+
+
+class TestEmbeddingBackend(unittest.TestCase):
+    """Test cases for EmbeddingBackend."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not REGISTRY_AVAILABLE:
+            self.skipTest("Registry dependencies not available")
+
+    def test_cache_avoids_repeated_embedding(self):
+        """Test that embedded texts are served from the cache."""
+        backend = FakeEmbeddingBackend()
+        first = backend.embed(["a", "b", "a"], model="m")
+        second = backend.embed(["b", "a"], model="m")
+
+        self.assertEqual(backend.batches, [["a", "b"]])
+        np.testing.assert_array_equal(first[0], first[2])
+        np.testing.assert_array_equal(first[1], second[0])
+
+    def test_cache_is_per_model(self):
+        """Test that the same text is embedded again for another model."""
+        backend = FakeEmbeddingBackend()
+        backend.embed(["a"], model="m1")
+        backend.embed(["a"], model="m2")
+        self.assertEqual(len(backend.batches), 2)
+
+    def test_concurrent_requests_are_batched(self):
+        """Test that concurrent callers share model requests."""
+        backend = FakeEmbeddingBackend(max_wait=0.2)
+        results = {}
+        barrier = threading.Barrier(6)
+
+        def worker(i):
+            barrier.wait()
+            results[i] = backend.embed([f"text {i}"], model="m")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 6)
+        self.assertLess(len(backend.batches), 6)
+        self.assertEqual(sum(len(batch) for batch in backend.batches), 6)
+
+    def test_errors_reach_the_caller(self):
+        """Test that a failing model request raises in embed."""
+        class FailingBackend(EmbeddingBackend):
+            def _embed_batch(self, model, texts):
+                raise RuntimeError("model not found")
+
+        with self.assertRaises(RuntimeError):
+            FailingBackend().embed(["a"], model="m")
+
+
+class TestEngineRegistry(unittest.TestCase):
+    """Test cases for EngineRegistry."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not REGISTRY_AVAILABLE:
+            self.skipTest("Registry dependencies not available")
+        self.test_dir = tempfile.mkdtemp()
+        self.workspaces = []
+        for name in ("one", "two", "three"):
+            workspace = Path(self.test_dir) / name
+            workspace.mkdir()
+            (workspace / "module.py").write_text(
+                f"def {name}_handler(request):\n"
+                "    value = request.get('value')\n"
+                "    if value is None:\n"
+                "        return 0\n"
+                "    return value * 2\n"
+            )
+            self.workspaces.append(workspace)
+        self.embedder = FakeEmbeddingBackend()
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_indexer_is_reused(self):
+        """Test that switching back to a workspace reuses its engine."""
+        registry = EngineRegistry(embedder=self.embedder)
+        first = registry.indexer(self.workspaces[0])
+        registry.indexer(self.workspaces[1])
+        self.assertIs(registry.indexer(self.workspaces[0]), first)
+
+    def test_indexers_share_embedder(self):
+        """Test that all workspaces embed through one backend."""
+        registry = EngineRegistry(embedder=self.embedder)
+        one = registry.indexer(self.workspaces[0])
+        two = registry.indexer(self.workspaces[1])
+        self.assertIs(one.embedder, self.embedder)
+        self.assertIs(two.embedder, self.embedder)
+
+    def test_least_recently_used_workspace_is_evicted(self):
+        """Test LRU eviction beyond max_workspaces."""
+        registry = EngineRegistry(max_workspaces=2, embedder=self.embedder)
+        registry.indexer(self.workspaces[0])
+        registry.indexer(self.workspaces[1])
+        registry.indexer(self.workspaces[0])
+        registry.indexer(self.workspaces[2])
+
+        self.assertIsNotNone(registry.get(self.workspaces[0]))
+        self.assertIsNone(registry.get(self.workspaces[1]))
+        self.assertIsNotNone(registry.get(self.workspaces[2]))
+
+    def test_leased_workspace_is_not_evicted(self):
+        """Test that a workspace in use survives eviction."""
+        registry = EngineRegistry(max_workspaces=1, embedder=self.embedder)
+        with registry.lease(self.workspaces[0]):
+            registry.indexer(self.workspaces[0])
+            registry.indexer(self.workspaces[1])
+            self.assertIsNotNone(registry.get(self.workspaces[0]))
+        registry.indexer(self.workspaces[2])
+        self.assertIsNone(registry.get(self.workspaces[0]))
+
+    def test_lease_is_taken_before_concurrent_evictions(self):
+        """Test that a workspace resolved right after a lease's lookup cannot evict it."""
+        other = self.workspaces[1]
+
+        class InterleavedRegistry(EngineRegistry):
+            def _entry(self, workspace_path, lease=False):
+                entry = super()._entry(workspace_path, lease=lease)
+                if lease:
+                    # Another request loads a workspace before the lease is used
+                    super()._entry(other)
+                return entry
+
+        registry = InterleavedRegistry(max_workspaces=1, embedder=self.embedder)
+        with registry.lease(self.workspaces[0]) as entry:
+            self.assertIs(registry.get(self.workspaces[0]), entry)
+            self.assertEqual(entry.active, 1)
+
+    def test_leasing_more_workspaces_than_the_limit(self):
+        """Test that a request over many workspaces does not rebuild their engines."""
+        for name in ("four", "five", "six"):
+            workspace = Path(self.test_dir) / name
+            workspace.mkdir()
+            self.workspaces.append(workspace)
+        registry = EngineRegistry(max_workspaces=4, embedder=self.embedder)
+
+        def resolve():
+            with registry.lease_all(self.workspaces):
+                return [registry.indexer(workspace) for workspace in self.workspaces]
+
+        first = resolve()
+        second = resolve()
+        for before, after in zip(first, second):
+            self.assertIs(before, after)
+
+        # The surplus is evicted once another workspace is used
+        registry.indexer(self.workspaces[0])
+        self.assertEqual(len(registry.status()), 4)
+
+    def test_index_and_search_per_workspace(self):
+        """Test that each workspace searches its own index."""
+        registry = EngineRegistry(embedder=self.embedder)
+        for workspace in self.workspaces[:2]:
+            registry.indexer(workspace).index()
+
+        results = registry.indexer(self.workspaces[1]).search("two_handler", top_k=5)
+        self.assertEqual(len(results), 1)
+        self.assertIn("two_handler", results[0]["content"])
+
+        # Re-indexing replaces the table instead of appending to it
+        registry.indexer(self.workspaces[1]).index()
+        self.assertEqual(len(registry.indexer(self.workspaces[1]).search("x", top_k=5)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Tests for the agent record/replay benchmark and the mock Ollama server.
+"""
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import ollama
+    from core.benchmark import Latency, MockOllamaServer, Recording, Reply, record, replay
+    from core.orchestrator import AgentOrchestrator
+    from core.orchestrator.llm import LLMClient
+    REPLAY_AVAILABLE = True
+except ImportError as e:
+    REPLAY_AVAILABLE = False
+    print(f"Warning: Could not import benchmark harness: {e}")
+
+
+if REPLAY_AVAILABLE:
+    class ScriptedClient(LLMClient):
+        """Answers chats with scripted JSON."""
+
+        provider = "scripted"
+
+        def __init__(self, answers):
+            super().__init__()
+            self.answers = list(answers)
+
+        def _stream(self, model, messages, format_json, options, usage):
+            yield self.answers.pop(0)
+
+
+PLAN = {
+    "steps": [{"file_path": "app.py", "operation": "modify", "search": "return 1", "replacement": "return 2"}],
+    "test_command": "check",
+}
+FIX = {
+    "steps": [{"file_path": "app.py", "operation": "modify", "search": "return 2", "replacement": "return 3"}],
+}
+
+
+class TestMockOllamaServer(unittest.TestCase):
+    """Test cases for MockOllamaServer with the ollama client."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not REPLAY_AVAILABLE:
+            self.skipTest("Benchmark dependencies not available")
+
+    def test_chat_and_embed(self):
+        """Test streamed and non-streamed chat, embeddings and exhausted replies."""
+        replies = [Reply(content='{"steps": []}'), Reply(content="hello there")]
+
+        def responder(request):
+            if not replies:
+                raise LookupError("no more replies")
+            return replies.pop(0)
+
+        with MockOllamaServer(responder, Latency(time_to_first_token=0.01), dimensions=8) as server:
+            client = ollama.Client(host=server.url)
+            streamed = "".join(
+                chunk["message"]["content"]
+                for chunk in client.chat(model="m", messages=[{"role": "user", "content": "x"}], stream=True)
+            )
+            self.assertEqual(json.loads(streamed), {"steps": []})
+            answer = client.chat(model="m", messages=[{"role": "user", "content": "y"}])
+            self.assertEqual(answer["message"]["content"], "hello there")
+            with self.assertRaises(ollama.ResponseError):
+                client.chat(model="m", messages=[{"role": "user", "content": "z"}])
+
+            vectors = client.embed(model="e", input=["a", "b", "a"])["embeddings"]
+            self.assertEqual(len(vectors[0]), 8)
+            self.assertEqual(vectors[0], vectors[2])
+            self.assertNotEqual(vectors[0], vectors[1])
+            stats = server.stats()
+        self.assertEqual(stats["chat_requests"], 3)
+        self.assertEqual(stats["embed_requests"], 1)
+        self.assertGreaterEqual(stats["injected_seconds"], 0.02)
+
+
+class TestAgentReplay(unittest.TestCase):
+    """Test cases for recording an agent run and replaying it."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not REPLAY_AVAILABLE:
+            self.skipTest("Benchmark dependencies not available")
+        self.workspace = Path(tempfile.mkdtemp())
+        (self.workspace / "app.py").write_text("def value():\n    return 1\n")
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+    def _record(self) -> "Recording":
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace),
+            model_config={"use_shadow_branch": False},
+            llm_client=ScriptedClient([json.dumps(PLAN), json.dumps(FIX)]),
+        )
+        results = [(False, "app.py:2: AssertionError: value() != 3"), (True, "ok")]
+        verify_changes = lambda *args, **kwargs: results.pop(0)
+        orchestrator.verify_changes = verify_changes
+        recording = record(orchestrator, "return 3", max_iterations=3)
+        self.assertIs(orchestrator.verify_changes, verify_changes)
+        return recording
+
+    def test_record(self):
+        """Test that a run's chats, edits, files and verifications are recorded."""
+        recording = self._record()
+        self.assertEqual(recording.result["status"], "success")
+        self.assertEqual(recording.result["iterations"], 2)
+        self.assertEqual([json.loads(e["content"]) for e in recording.exchanges], [PLAN, FIX])
+        self.assertEqual(recording.files, {"app.py": "def value():\n    return 1\n"})
+        self.assertEqual([e["applied"] for e in recording.edits], [1, 1])
+        self.assertEqual([v["success"] for v in recording.verifications], [False, True])
+
+        path = self.workspace / "recording.json"
+        recording.save(str(path))
+        self.assertEqual(Recording.load(str(path)), recording)
+
+    def test_replay_report(self):
+        """Test that a replay repeats the run and reports time per phase."""
+        recording = self._record()
+        report = replay(recording, runs=2, latency=Latency(time_to_first_token=0.05, tokens_per_second=1000))
+        json.dumps(report)
+
+        self.assertEqual(len(report["runs"]), 2)
+        self.assertEqual(report["summary"]["statuses"], ["success"])
+        for run in report["runs"]:
+            self.assertEqual(run["iterations"], 2)
+            self.assertEqual(run["llm_calls"], 2)
+            self.assertEqual(run["prompt_changes"], 0)
+            self.assertGreaterEqual(run["llm_injected_seconds"], 0.1)
+            self.assertGreaterEqual(run["llm_seconds"], run["llm_injected_seconds"])
+            self.assertGreater(run["phases"]["agent.apply"], 0)
+            self.assertAlmostEqual(
+                run["wall_seconds"], run["llm_seconds"] + run["verify_seconds"] + run["overhead_seconds"], places=4
+            )
+        # The recorded workspace is untouched by replays
+        self.assertIn("return 3", (self.workspace / "app.py").read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
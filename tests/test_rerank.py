@@ -0,0 +1,138 @@
+"""
+Tests for the search reranking stage.
+"""
+import unittest
+import threading
+from pathlib import Path
+import sys
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer.rerank import CrossEncoderReranker, Reranker, RerankStage, create_rerank_stage
+    RERANK_AVAILABLE = True
+except ImportError as e:
+    RERANK_AVAILABLE = False
+    print(f"Warning: Could not import RerankStage: {e}")
+
+
+if RERANK_AVAILABLE:
+    class KeywordReranker(Reranker):
+        """Scores passages by whether they contain the query."""
+
+        name = "keyword"
+
+        def __init__(self):
+            self.calls = []
+
+        def score(self, query, passages):
+            self.calls.append(list(passages))
+            return [1.0 if query in passage else 0.0 for passage in passages]
+
+    class SlowReranker(KeywordReranker):
+        """Blocks until released, to exceed the latency budget."""
+
+        def __init__(self):
+            super().__init__()
+            self.release = threading.Event()
+
+        def score(self, query, passages):
+            self.release.wait(5)
+            return super().score(query, passages)
+
+
+def _hits(*contents):
+    return [{"id": str(i), "content": content, "_distance": float(i)} for i, content in enumerate(contents)]
+
+
+class TestRerankStage(unittest.TestCase):
+    """Test cases for RerankStage."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not RERANK_AVAILABLE:
+            self.skipTest("Rerank dependencies not available")
+
+    def test_reorders_by_reranker_score(self):
+        """Test that the relevant candidate moves to the top."""
+        stage = RerankStage(KeywordReranker())
+        result = stage.rerank("limiter", _hits("a", "b", "rate limiter"), top_k=2)
+        self.assertEqual([hit["id"] for hit in result], ["2", "0"])
+        self.assertEqual(result[0]["rerank_score"], 1.0)
+
+    def test_scores_are_cached(self):
+        """Test that repeated queries do not rescore known chunks."""
+        reranker = KeywordReranker()
+        stage = RerankStage(reranker)
+        stage.rerank("limiter", _hits("a", "limiter"), top_k=2)
+        stage.rerank("limiter", _hits("a", "limiter", "c"), top_k=2)
+        self.assertEqual(reranker.calls, [["a", "limiter"], ["c"]])
+
+    def test_budget_falls_back_to_first_stage_order(self):
+        """Test that a slow reranker returns the first-stage hits in time."""
+        reranker = SlowReranker()
+        stage = RerankStage(reranker, budget_seconds=0.05)
+        hits = _hits("a", "limiter")
+        self.assertEqual(stage.rerank("limiter", hits, top_k=1), hits[:1])
+
+        # The scores computed in the background serve the next request
+        reranker.release.set()
+        stage._executor.submit(lambda: None).result()
+        self.assertEqual(stage.rerank("limiter", hits, top_k=1)[0]["id"], "1")
+
+    def test_changed_content_is_rescored(self):
+        """Test that a cached score is not reused after the chunk's content changed."""
+        reranker = KeywordReranker()
+        stage = RerankStage(reranker)
+        stage.rerank("limiter", _hits("a", "limiter"), top_k=2)
+        result = stage.rerank("limiter", _hits("a", "throttle"), top_k=2)
+        self.assertEqual(reranker.calls, [["a", "limiter"], ["throttle"]])
+        self.assertEqual(result[0]["rerank_score"], 0.0)
+
+    def test_busy_scorer_is_skipped(self):
+        """Test that abandoned scoring jobs do not pile up behind a slow reranker."""
+        reranker = SlowReranker()
+        stage = RerankStage(reranker, budget_seconds=0.01, max_pending=1)
+        hits = _hits("a", "limiter")
+        stage.rerank("limiter", hits, top_k=1)
+        for i in range(5):
+            self.assertEqual(stage.rerank(f"query {i}", hits, top_k=1), hits[:1])
+        self.assertEqual(stage._pending, 1)
+
+        reranker.release.set()
+        stage._executor.submit(lambda: None).result()
+        self.assertEqual(reranker.calls, [["a", "limiter"]])
+        self.assertEqual(stage._pending, 0)
+
+    def test_cross_encoder_scores_keep_the_logit_order(self):
+        """Test that logits inside and outside [0, 1] are squashed in order."""
+        reranker = CrossEncoderReranker()
+        logits = [0.9, 1.1, -0.5, 0.1, -800.0, 800.0]
+        reranker._model = SimpleNamespace(predict=lambda pairs, batch_size: logits)
+        scores = reranker.score("query", ["passage"] * len(logits))
+        self.assertEqual(
+            sorted(range(len(scores)), key=lambda i: scores[i]),
+            sorted(range(len(logits)), key=lambda i: logits[i])
+        )
+        self.assertTrue(all(0.0 <= score <= 1.0 for score in scores))
+
+    def test_candidate_pool(self):
+        """Test the size of the first-stage pool."""
+        stage = RerankStage(KeywordReranker(), pool_factor=4, max_pool=30)
+        self.assertEqual(stage.candidate_count(5), 20)
+        self.assertEqual(stage.candidate_count(10), 30)
+        self.assertEqual(stage.candidate_count(50), 50)
+
+    def test_create_rerank_stage(self):
+        """Test that reranking is off unless configured."""
+        self.assertIsNone(create_rerank_stage({}))
+        stage = create_rerank_stage({"rerank": "llm", "rerank_budget_ms": "150"})
+        self.assertEqual(stage.budget_seconds, 0.15)
+        with self.assertRaises(ValueError):
+            create_rerank_stage({"rerank": "bm25"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+"""
+Tests for the model-server request scheduler.
+"""
+import threading
+import time
+import unittest
+from pathlib import Path
+import sys
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import numpy as np
+    from core.scheduling import ModelScheduler, PriorityClass, SchedulerOverloaded
+    from core.indexer.embeddings import EmbeddingBackend
+    from core.orchestrator.llm import LLMClient
+    SCHEDULER_AVAILABLE = True
+except ImportError as e:
+    SCHEDULER_AVAILABLE = False
+    print(f"Warning: Could not import scheduler: {e}")
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+if SCHEDULER_AVAILABLE:
+    class BlockingBackend(EmbeddingBackend):
+        """Records batches; batches of "bulk" texts wait for ``release``."""
+
+        def __init__(self, **kwargs):
+            super().__init__(cache_entries=0, **kwargs)
+            self.batches = []
+            self.release = threading.Event()
+            self.blocked = threading.Event()
+
+        def _embed_batch(self, model, texts):
+            self.batches.append(list(texts))
+            if texts[0].startswith("bulk"):
+                self.blocked.set()
+                self.release.wait(5)
+            return [np.zeros(4, dtype=np.float32) for _ in texts]
+
+    class EchoClient(LLMClient):
+        provider = "echo"
+
+        def _stream(self, model, messages, format_json, options, usage):
+            yield "ok"
+
+
+class TestModelScheduler(unittest.TestCase):
+    """Test cases for ModelScheduler."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not SCHEDULER_AVAILABLE:
+            self.skipTest("Scheduler dependencies not available")
+        self.order = []
+        self.threads = []
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        for thread in self.threads:
+            thread.join(5)
+
+    def _request(self, scheduler, priority, key=None, name=None):
+        def run():
+            with scheduler.slot(priority, key):
+                self.order.append(name or priority)
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+
+    def _queue(self, scheduler, priority, key=None, name=None):
+        # Start a request and wait until it is queued behind the held slot
+        queued = scheduler.stats()["classes"][priority]["queued"]
+        self._request(scheduler, priority, key, name)
+        self.assertTrue(_wait_until(lambda: scheduler.stats()["classes"][priority]["queued"] == queued + 1))
+
+    def test_higher_class_is_served_first(self):
+        """Test that interactive requests overtake queued bulk and agent requests."""
+        scheduler = ModelScheduler(capacity=1)
+        with scheduler.slot("bulk"):
+            self._queue(scheduler, "bulk")
+            self._queue(scheduler, "agent")
+            self._queue(scheduler, "interactive")
+        for thread in self.threads:
+            thread.join(5)
+        self.assertEqual(self.order, ["interactive", "agent", "bulk"])
+
+    def test_class_limit_leaves_room_for_other_classes(self):
+        """Test that a class at its limit does not hold back other classes."""
+        scheduler = ModelScheduler(capacity=4)
+        with scheduler.slot("bulk"):
+            self._queue(scheduler, "bulk")
+            with scheduler.slot("interactive"):
+                with scheduler.slot("agent"):
+                    self.assertEqual(scheduler.stats()["active"], 3)
+            self.assertEqual(self.order, [])
+        for thread in self.threads:
+            thread.join(5)
+        self.assertEqual(self.order, ["bulk"])
+
+    def test_round_robin_within_class(self):
+        """Test that keys of one class take turns."""
+        scheduler = ModelScheduler(capacity=1)
+        with scheduler.slot("interactive"):
+            self._queue(scheduler, "bulk", "a", "a1")
+            self._queue(scheduler, "bulk", "a", "a2")
+            self._queue(scheduler, "bulk", "b", "b1")
+        for thread in self.threads:
+            thread.join(5)
+        self.assertEqual(self.order, ["a1", "b1", "a2"])
+
+    def test_bulk_load_is_shed(self):
+        """Test that bulk requests beyond max_queue fail fast and are counted."""
+        scheduler = ModelScheduler(capacity=2, classes={
+            "interactive": PriorityClass(limit=2),
+            "bulk": PriorityClass(limit=1, max_queue=1),
+        })
+        with scheduler.slot("bulk"):
+            self._queue(scheduler, "bulk")
+            self.assertTrue(scheduler.overloaded("bulk"))
+            with self.assertRaises(SchedulerOverloaded):
+                with scheduler.slot("bulk"):
+                    pass
+            with scheduler.slot("interactive"):
+                pass
+        for thread in self.threads:
+            thread.join(5)
+
+        stats = scheduler.stats()["classes"]
+        self.assertEqual(stats["bulk"]["shed"], 1)
+        self.assertEqual(stats["bulk"]["granted"], 2)
+        self.assertEqual(stats["bulk"]["queued"], 0)
+        self.assertGreater(stats["bulk"]["wait_seconds_max"], 0)
+
+    def test_unknown_class(self):
+        """Test that unknown priority classes are rejected."""
+        with self.assertRaises(ValueError):
+            with ModelScheduler().slot("urgent"):
+                pass
+
+
+class TestScheduledClients(unittest.TestCase):
+    """Test cases for the embedding backend and LLM clients under the scheduler."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not SCHEDULER_AVAILABLE:
+            self.skipTest("Scheduler dependencies not available")
+
+    def test_query_embedding_overtakes_bulk_indexing(self):
+        """Test that a query waits for at most one indexing batch."""
+        backend = BlockingBackend(batch_size=2, scheduler=ModelScheduler())
+        bulk_texts = [f"bulk {i}" for i in range(6)]
+        indexing = threading.Thread(target=backend.embed, args=(bulk_texts, "m"), kwargs={"priority": "bulk"})
+        indexing.start()
+        self.assertTrue(backend.blocked.wait(5))
+
+        query = threading.Thread(target=backend.embed, args=(["query"], "m"))
+        query.start()
+        self.assertTrue(_wait_until(lambda: backend._queue.qsize() == 1))
+        backend.release.set()
+        query.join(5)
+        indexing.join(5)
+
+        self.assertEqual(backend.batches, [["bulk 0", "bulk 1"], ["query"], ["bulk 2", "bulk 3"], ["bulk 4", "bulk 5"]])
+        classes = backend.scheduler.stats()["classes"]
+        self.assertEqual((classes["bulk"]["granted"], classes["interactive"]["granted"]), (3, 1))
+
+    def test_embedding_slots_use_the_callers_key(self):
+        """Test that batches are queued under the caller's workspace key."""
+        scheduler = ModelScheduler()
+        keys = []
+        slot = scheduler.slot
+
+        def recording_slot(priority, key=None):
+            keys.append((priority, key))
+            return slot(priority, key)
+
+        scheduler.slot = recording_slot
+        backend = BlockingBackend(batch_size=2, scheduler=scheduler)
+        backend.embed(["a", "b", "c"], "m", priority="agent", key="/ws/one")
+        self.assertEqual(keys, [("agent", "/ws/one"), ("agent", "/ws/one")])
+
+    def test_chat_holds_a_slot_of_its_class(self):
+        """Test that chats are scheduled as agent work unless told otherwise."""
+        scheduler = ModelScheduler()
+        client = EchoClient(scheduler=scheduler)
+        client.chat("m", [{"role": "user", "content": "hi"}])
+        client.chat("m", [{"role": "user", "content": "hi"}], priority="interactive")
+        self.assertEqual(client.chat("m", []).content, "ok")
+        EchoClient().chat("m", [])
+
+        classes = scheduler.stats()["classes"]
+        self.assertEqual((classes["agent"]["granted"], classes["interactive"]["granted"]), (2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
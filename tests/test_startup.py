@@ -0,0 +1,54 @@
+"""
+Tests for the lazy import path of the API server.
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+try:
+    import fastapi  # noqa: F401
+    FASTAPI_AVAILABLE = True
+except ImportError as e:
+    FASTAPI_AVAILABLE = False
+    print(f"Warning: Could not import fastapi: {e}")
+
+HEAVY_MODULES = ["lancedb", "pyarrow", "numpy", "ollama", "tree_sitter"]
+
+
+class TestStartup(unittest.TestCase):
+    """Importing the server must not load the indexer's heavy dependencies."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not FASTAPI_AVAILABLE:
+            self.skipTest("FastAPI not available")
+
+    def _probe(self, statement: str):
+        code = (
+            "import json, sys\n"
+            f"{statement}\n"
+            f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+        )
+        env = dict(os.environ, PYTHONPATH=str(PROJECT_ROOT))
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+    def test_server_import_is_lazy(self):
+        """Test that core.api.server imports none of the heavy modules."""
+        self.assertEqual(self._probe("import core.api.server"), [])
+
+    def test_packages_are_lazy(self):
+        """Test that importing the packages defers loading their modules."""
+        self.assertEqual(self._probe("import core.indexer, core.orchestrator"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Tests for the pre-verification syntax gate.
+"""
+import unittest
+import tempfile
+import shutil
+from pathlib import Path
+import sys
+import time
+from unittest import mock
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer.engine import load_parsers
+    from core.orchestrator import AgentOrchestrator, EditInstruction, TaskPlan, TaskStatus
+    from core.indexer.parse_cache import ParseCache, compute_input_edit
+    from core.orchestrator.syntax import SyntaxChecker
+    SYNTAX_AVAILABLE = True
+except ImportError as e:
+    SYNTAX_AVAILABLE = False
+    print(f"Warning: Could not import SyntaxChecker: {e}")
+
+
+class TestSyntaxChecker(unittest.TestCase):
+    """Test cases for SyntaxChecker."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not SYNTAX_AVAILABLE:
+            self.skipTest("Syntax checker dependencies not available")
+        self.parsers = load_parsers()
+        if "python" not in self.parsers:
+            self.skipTest("tree-sitter-python not available")
+        self.checker = self._checker()
+
+    def _checker(self):
+        return SyntaxChecker(
+            ParseCache(self.parsers),
+            language_for=lambda p: "python" if p.suffix == ".py" else None,
+            root=Path("/workspace")
+        )
+
+    def test_compute_input_edit(self):
+        """The edit spans exactly the bytes between common prefix and suffix."""
+        edit = compute_input_edit(b"a = 1\nb = 2\n", b"a = 1\nb = 23\n")
+        self.assertEqual(edit["start_byte"], 11)
+        self.assertEqual(edit["old_end_byte"], 11)
+        self.assertEqual(edit["new_end_byte"], 12)
+        self.assertEqual(edit["start_point"], (1, 5))
+        self.assertIsNone(compute_input_edit(b"x", b"x"))
+
+    def test_compute_input_edit_on_a_large_file(self):
+        """A small edit in a 1 MB file is located with block comparisons, not a byte loop."""
+        old = b"def f(x):\n    return x + 1\n" * 40000
+        middle = len(old) // 2
+        new = old[:middle] + b"# edited\n" + old[middle:]
+        start = time.perf_counter()
+        edit = compute_input_edit(old, new)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(edit["start_byte"], middle)
+        self.assertEqual(edit["old_end_byte"], middle)
+        self.assertEqual(edit["new_end_byte"], middle + len(b"# edited\n"))
+        self.assertLess(elapsed, 0.1)
+
+    def test_reports_errors_with_locations(self):
+        """Broken code is reported with file:line:column."""
+        self.assertEqual(self.checker.check("ok.py", b"def f(x):\n    return x\n"), [])
+        issues = self.checker.check("bad.py", b"def f(x):\n    return (x\n")
+        self.assertTrue(issues)
+        self.assertEqual(issues[0].file_path, "bad.py")
+        self.assertEqual(issues[0].line, 2)
+        self.assertIn("bad.py:2:", str(issues[0]))
+
+    def test_incremental_reparse_matches_full_parse(self):
+        """Re-checking an edited file reuses its tree and finds the same issues."""
+        self.checker.check("a.py", b"def f(x):\n    return x\n")
+        incremental = self.checker.check("a.py", b"def f(x):\n    return (x\n")
+        self.assertEqual(self.checker.parse_cache.incremental, 1)
+        full = self._checker().check("a.py", b"def f(x):\n    return (x\n")
+        self.assertEqual([str(i) for i in incremental], [str(i) for i in full])
+        self.assertEqual(self.checker.check("a.py", b"def f(x):\n    return (x)\n"), [])
+
+    def test_run_loop_skips_verification_for_syntax_errors(self):
+        """A plan with a syntax error goes back to the fix step without running tests."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir, True)
+        orchestrator = AgentOrchestrator(
+            workspace_path=test_dir,
+            model_config={"use_shadow_branch": False}
+        )
+        plan = TaskPlan(
+            goal="goal",
+            steps=[EditInstruction(file_path="a.py", operation="create", content="def f(:\n")],
+            test_command="true"
+        )
+        with mock.patch.object(orchestrator, "verify_changes") as verify:
+            result = orchestrator._execute_plan("goal", plan, max_iterations=1)
+        verify.assert_not_called()
+        self.assertEqual(result["status"], TaskStatus.FAILED.value)
+        self.assertIn("a.py:1:", result["last_error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+"""
+Tests for bounded verification output and failure extraction.
+"""
+import contextlib
+import io
+import shlex
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.indexer import IndexingEngine
+    from core.orchestrator import AgentOrchestrator
+    from core.orchestrator.verify import (
+        DiagnosticParser,
+        Failure,
+        OutputBuffer,
+        junit_command,
+        merge_failures,
+        source_spans,
+    )
+    from tests.fakes import FakeEmbeddingBackend
+    VERIFY_AVAILABLE = True
+except ImportError as e:
+    VERIFY_AVAILABLE = False
+    print(f"Warning: Could not import verification helpers: {e}")
+
+
+HELPERS = '''def check_total(values, expected):
+    total = sum(values)
+    assert total == expected, f"total {total} != {expected}"
+    return total
+'''
+
+TESTS = '''from helpers import check_total
+
+
+def test_small():
+    print("noise " * 200000)
+    check_total([1, 2], 4)
+
+
+def test_large():
+    check_total([10, 20], 40)
+
+
+def test_ok():
+    check_total([1], 1)
+'''
+
+
+class TestVerificationOutput(unittest.TestCase):
+    """Test cases for OutputBuffer, DiagnosticParser and source_spans."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not VERIFY_AVAILABLE:
+            self.skipTest("Verification dependencies not available")
+        self.root = Path(tempfile.mkdtemp())
+        for name in ("src/app.py", "src/lib.c", "src/main.rs"):
+            (self.root / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / name).write_text("\n".join(f"line {i}" for i in range(1, 61)) + "\n")
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_buffer_keeps_the_tail(self):
+        """Test that the buffer stays within its bound and reports dropped lines."""
+        buffer = OutputBuffer(max_chars=1000)
+        for i in range(10000):
+            buffer.append(f"line {i}\n")
+        self.assertLessEqual(buffer.chars, 1000)
+        text = buffer.text()
+        self.assertTrue(text.startswith("[... "))
+        self.assertTrue(text.endswith("line 9999\n"))
+        self.assertLess(len(buffer.text(100)), 150)
+
+    def test_diagnostics(self):
+        """Test compiler, linter, rustc and traceback locations inside the root."""
+        parser = DiagnosticParser(self.root)
+        for line in [
+            "src/app.py:3:1: F821 undefined name 'x'",
+            "src/lib.c:2:5: error: expected ';' before 'return'",
+            "/usr/lib/python3/os.py:1: not ours",
+            "missing.py:1: no such file",
+            "error[E0425]: cannot find value `x` in this scope",
+            "  --> src/main.rs:4:5",
+            "Traceback (most recent call last):",
+            f'  File "{self.root / "src" / "app.py"}", line 7, in <module>',
+            '  File "/usr/lib/python3/json/__init__.py", line 346, in loads',
+            "json.decoder.JSONDecodeError: Expecting value",
+            "src/app.py:3:1: F821 undefined name 'x'",
+        ]:
+            parser.feed(line + "\n")
+
+        failures = [str(failure) for failure in merge_failures(parser.failures)]
+        self.assertEqual(failures, [
+            "src/app.py:3: F821 undefined name 'x' (x2)",
+            "src/lib.c:2: error: expected ';' before 'return'",
+            "src/main.rs:4: error[E0425]: cannot find value `x` in this scope",
+            "src/app.py:7: json.decoder.JSONDecodeError: Expecting value",
+        ])
+
+    def test_source_spans_prefer_enclosing_chunk(self):
+        """Test that spans use the innermost small chunk, else a window around the line."""
+        chunks = [SimpleNamespace(start_line=1, end_line=60), SimpleNamespace(start_line=10, end_line=14)]
+        failures = [Failure("boom", "src/app.py", 12), Failure("again", "src/app.py", 13), Failure("c", "src/lib.c", 30)]
+        spans = source_spans(failures, self.root, chunker=lambda path, data: chunks if path.suffix == ".py" else [])
+        self.assertIn("--- src/app.py:10-14 ---\nline 10\n", spans)
+        self.assertIn("--- src/lib.c:25-35 ---", spans)
+        self.assertEqual(spans.count("---\n"), 2)
+
+    def test_junit_only_for_plain_pytest(self):
+        """Test that the report option is only added where it reaches pytest."""
+        report = Path("/tmp/report.xml")
+        self.assertIn("--junitxml=/tmp/report.xml", junit_command("python -m pytest tests/", report))
+        self.assertIsNone(junit_command("pytest && flake8", report))
+        self.assertIsNone(junit_command("make test", report))
+
+
+class TestVerifyChanges(unittest.TestCase):
+    """Test cases for AgentOrchestrator.verify_changes with a failing test suite."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not VERIFY_AVAILABLE:
+            self.skipTest("Verification dependencies not available")
+        self.workspace = Path(tempfile.mkdtemp())
+        (self.workspace / "helpers.py").write_text(HELPERS)
+        (self.workspace / "test_sample.py").write_text(TESTS)
+        self.orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace),
+            model_config={"use_shadow_branch": False}
+        )
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+    def test_failure_summary_is_compact(self):
+        """Test that a noisy pytest run yields a short, deduplicated summary with source."""
+        command = f"{shlex.quote(sys.executable)} -m pytest -q -p no:cacheprovider test_sample.py"
+        result = self.orchestrator.verify(test_command=command)
+        self.assertFalse(result.success)
+        self.assertEqual(result.returncode, 1)
+        self.assertLessEqual(result.output.chars, 64000)
+        self.assertEqual(len(result.failures), 2)
+        self.assertTrue(all(f.file_path == "helpers.py" and f.line == 3 for f in result.failures))
+        self.assertEqual(result.failures[0].tests, ["test_sample::test_small"])
+
+        success, output = self.orchestrator.verify_changes(test_command=command)
+        self.assertFalse(success)
+        self.assertLess(len(output), 3000)
+        self.assertIn("helpers.py:3: AssertionError: total 3 != 4", output)
+        self.assertIn("--- helpers.py:1-4 ---", output)
+        self.assertNotIn("noise noise", output)
+
+
+
+class TestVerifyInShadow(unittest.TestCase):
+    """Test cases for verify_changes in a shadow workspace."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not VERIFY_AVAILABLE:
+            self.skipTest("Verification dependencies not available")
+        self.workspace = Path(tempfile.mkdtemp())
+        helpers = HELPERS.replace("    return total", "    print(total)\n    return total")
+        (self.workspace / "helpers.py").write_text(helpers + "\n\ndef unused():\n    return 1\n" * 3)
+        (self.workspace / "test_sample.py").write_text(TESTS)
+        self.indexer = IndexingEngine(
+            workspace_path=str(self.workspace),
+            vector_db_path=str(self.workspace / ".opencode" / "index"),
+            embedder=FakeEmbeddingBackend()
+        )
+        if "python" not in self.indexer.parsers:
+            self.skipTest("tree-sitter-python not available")
+        self.orchestrator = AgentOrchestrator(workspace_path=str(self.workspace), model_config={}, indexer=self.indexer)
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        self.orchestrator.close()
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+    def test_shadow_files_are_chunked_as_workspace_files(self):
+        """Test that failures in a shadow use enclosing chunks keyed by workspace paths."""
+        shadow = self.orchestrator.worktrees.create("verify")
+        self.addCleanup(shadow.cleanup)
+        command = f"{shlex.quote(sys.executable)} -m pytest -q -p no:cacheprovider test_sample.py"
+
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            success, output = self.orchestrator.verify_changes(test_command=command, cwd=shadow.path)
+        self.assertFalse(success)
+        self.assertNotIn("Error parsing", printed.getvalue())
+        # The enclosing function, not a window of lines around the failure
+        self.assertIn("--- helpers.py:1-5 ---", output)
+        self.assertEqual(list(self.indexer.parse_cache._entries), [str(self.workspace / "helpers.py")])
+
+
+if __name__ == '__main__':
+    unittest.main()
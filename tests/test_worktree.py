@@ -0,0 +1,154 @@
+"""
+Tests for shadow workspaces used by the agent loop.
+"""
+import unittest
+import tempfile
+import shutil
+import subprocess
+from pathlib import Path
+import sys
+import gc
+import weakref
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from core.orchestrator import AgentOrchestrator, EditInstruction, WorktreeManager
+    ORCHESTRATOR_AVAILABLE = True
+except ImportError as e:
+    ORCHESTRATOR_AVAILABLE = False
+    print(f"Warning: Could not import WorktreeManager: {e}")
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=str(cwd), check=True, capture_output=True
+    )
+
+
+class TestWorktreeManager(unittest.TestCase):
+    """Test cases for WorktreeManager and ShadowWorkspace."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        if not ORCHESTRATOR_AVAILABLE:
+            self.skipTest("Orchestrator dependencies not available")
+
+        self.test_dir = tempfile.mkdtemp()
+        self.workspace_path = Path(self.test_dir) / "workspace"
+        self.workspace_path.mkdir()
+        (self.workspace_path / "app.py").write_text("x = 1\n")
+        self.shadow_root = Path(self.test_dir) / "shadows"
+
+    def tearDown(self):
+        """Clean up test fixtures."""
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _manager(self):
+        return WorktreeManager(str(self.workspace_path), root=str(self.shadow_root))
+
+    def test_discarded_manager_is_released(self):
+        """Test that the exit hook does not keep discarded managers alive."""
+        from core.orchestrator import worktree
+        manager = self._manager()
+        manager.create("job").cleanup()
+        self.assertIn(manager, worktree._managers)
+        ref = weakref.ref(manager)
+        del manager
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_copy_shadow_isolates_edits(self):
+        """Edits in a shadow do not touch the workspace until promoted."""
+        manager = self._manager()
+        shadow = manager.create("job")
+        self.assertEqual(shadow.kind, "copy")
+
+        shadow.track("app.py")
+        shadow.resolve("app.py").write_text("x = 2\n")
+        self.assertEqual((self.workspace_path / "app.py").read_text(), "x = 1\n")
+
+        result = shadow.promote()
+        self.assertEqual(result.promoted, ["app.py"])
+        self.assertEqual((self.workspace_path / "app.py").read_text(), "x = 2\n")
+
+        shadow.cleanup()
+        self.assertFalse(shadow.path.exists())
+
+    def test_promote_reports_conflicts(self):
+        """Files changed by the user after the shadow was created are not overwritten."""
+        manager = self._manager()
+        with manager.create("job") as shadow:
+            shadow.track("app.py")
+            shadow.resolve("app.py").write_text("x = 2\n")
+            (self.workspace_path / "app.py").write_text("x = 3\n")
+
+            result = shadow.promote()
+            self.assertEqual(result.conflicts, ["app.py"])
+            self.assertEqual((self.workspace_path / "app.py").read_text(), "x = 3\n")
+
+    def test_paths_outside_the_shadow_are_refused(self):
+        """Absolute and escaping paths never reach the workspace or the disk."""
+        manager = self._manager()
+        outside = Path(self.test_dir) / "outside.txt"
+        with manager.create("job") as shadow:
+            for path in (str(outside), "../outside.txt", "src/../../outside.txt"):
+                with self.assertRaises(ValueError):
+                    shadow.resolve(path)
+                with self.assertRaises(ValueError):
+                    shadow.track(path)
+            self.assertEqual(shadow.resolve("src/../app.py"), shadow.path / "src/../app.py")
+
+            # A touched path that escapes fails the whole promotion
+            shadow.track("app.py")
+            shadow.resolve("app.py").write_text("x = 2\n")
+            shadow.touched["../outside.txt"] = None
+            with self.assertRaises(ValueError):
+                shadow.promote()
+            self.assertFalse(outside.exists())
+            self.assertEqual((self.workspace_path / "app.py").read_text(), "x = 1\n")
+
+    def test_git_worktree_includes_uncommitted_changes(self):
+        """A worktree shadow starts from HEAD plus the user's uncommitted files."""
+        if shutil.which("git") is None:
+            self.skipTest("git not available")
+        _git(self.workspace_path, "init", "-q")
+        _git(self.workspace_path, "add", "app.py")
+        _git(self.workspace_path, "commit", "-q", "-m", "init")
+        (self.workspace_path / "app.py").write_text("x = 5\n")
+        (self.workspace_path / "new.py").write_text("y = 1\n")
+
+        manager = self._manager()
+        first = manager.create("job")
+        second = manager.create("job")
+        self.assertEqual(first.kind, "worktree")
+        self.assertEqual(first.resolve("app.py").read_text(), "x = 5\n")
+        self.assertEqual(first.resolve("new.py").read_text(), "y = 1\n")
+        self.assertEqual(len(manager.live("job")), 2)
+
+        manager.cleanup("job")
+        self.assertEqual(manager.live("job"), [])
+        self.assertFalse(first.path.exists())
+        self.assertFalse(second.path.exists())
+
+    def test_apply_edit_in_shadow(self):
+        """apply_edit writes into the shadow and records the touched file."""
+        orchestrator = AgentOrchestrator(
+            workspace_path=str(self.workspace_path),
+            model_config={"planning_model": "test-model"}
+        )
+        orchestrator._worktrees = self._manager()
+        shadow = orchestrator._open_shadow("job")
+
+        edit = EditInstruction(file_path="app.py", operation="create", content="x = 9\n")
+        self.assertTrue(orchestrator.apply_edit(edit, shadow=shadow))
+        self.assertIn("app.py", shadow.touched)
+        self.assertEqual(shadow.resolve("app.py").read_text(), "x = 9\n")
+        self.assertEqual((self.workspace_path / "app.py").read_text(), "x = 1\n")
+        shadow.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()